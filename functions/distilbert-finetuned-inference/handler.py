@@ -1,75 +1,340 @@
-from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
+from transformers import pipeline, AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+import contextlib
+import hashlib
 import json
+import logging
 import os
+import sys
 import time
-import traceback # Importiere das traceback Modul
 
-    # Korrigierter relativer Pfad zum Modellverzeichnis
-    # Das Skript (index.py) wird von /home/app ausgeführt,
-    # und die Funktionsdateien liegen in /home/app/function/
-LOCAL_MODEL_DIR = "./function/mein_finetuned_modell"
+from .inference_executor import (InferenceExecutor, InferenceRejectedError, container_cpu_limit, parse_duration,
+                                 rejected_response, request_deadline)
+from .log_pipeline import body_summary, configure_logging, debug_enabled, dropped_records, sample_request
+from .metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, add_headers, register_batcher, register_executor,
+                      response_status)
+from .micro_batcher import MicroBatcher
+from .mmap_weights import memory_usage
+from .result_cache import ResultCache
+
+# Konfiguration aus der Umgebung; im Multi-Modell-Host (host/model_host.py) übergibt der Host
+# die Umgebung jeder Funktion als Attribut ENVIRONMENT des Pakets, statt os.environ zu verändern
+ENV = getattr(sys.modules.get(__package__), "ENVIRONMENT", os.environ)
+
+# Strukturiertes, asynchrones Logging (siehe log_pipeline.py): LOG_LEVEL, LOG_SAMPLE_RATE, LOG_BODIES
+configure_logging(__package__)
+log = logging.getLogger(__name__)
+
+    # Pfad zum Modellverzeichnis: Das Skript (index.py) wird von /home/app ausgeführt,
+    # die Funktionsdateien liegen in /home/app/function/. Relativ zu dieser Datei statt
+    # zum Arbeitsverzeichnis, damit auch der Multi-Modell-Host (host/model_host.py) passt
+FUNC_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_MODEL_DIR = os.path.join(FUNC_DIR, "mein_finetuned_modell")
 CLASSIFIER_PIPELINE = None
 
+# Inferenz-Backend: "torch" (Standard, Tokenizer + Modell direkt), "torch-pipeline"
+# (transformers-Pipeline wie bisher), "onnx" oder "onnx-int8".
+# Die ONNX-Dateien erzeugt training/export_distilbert_onnx.py im Modellverzeichnis.
+INFERENCE_BACKEND = ENV.get("INFERENCE_BACKEND", "torch").strip().lower()
+TORCH_BACKENDS = ("torch", "torch-pipeline")
+ONNX_MODEL_FILES = {"onnx": "model.onnx", "onnx-int8": "model-int8.onnx"}
+# torch-Backends: Gewichte per mmap direkt aus model.safetensors nutzen ("1"), statt sie
+# mit from_pretrained in privaten Heap zu kopieren ("0"). Die Seiten liegen dann im
+# Page Cache und werden von allen Replicas auf demselben Node geteilt.
+MMAP_WEIGHTS = ENV.get("MMAP_WEIGHTS", "1") == "1"
+
+# Intra-Op-Threads: Standard ist das CPU-Limit des Containers (limits.cpu in der yml),
+# nicht die Kernzahl des Nodes, die torch und ONNX Runtime sonst verwenden würden.
+INFERENCE_THREADS = int(ENV.get("INFERENCE_THREADS", "0")) or container_cpu_limit()
+# Umschließt jeden Forward-Pass; im Multi-Modell-Host ersetzt durch eine mit den anderen
+# torch-Modellen geteilte Begrenzung gleichzeitiger Forward-Passes (host/model_host.py)
+FORWARD_GATE = contextlib.nullcontext()
+
+# Micro-Batching über gleichzeitige Requests (siehe distilbert-finetuned-inference.yml)
+# BATCH_MAX_SIZE <= 1 deaktiviert das Batching, jeder Request läuft dann einzeln.
+BATCH_MAX_SIZE = int(ENV.get("BATCH_MAX_SIZE", "1"))
+BATCH_WINDOW_MS = float(ENV.get("BATCH_WINDOW_MS", "5"))
+BATCH_MAX_QUEUE = int(ENV.get("BATCH_MAX_QUEUE", "64"))
+BATCHER = None
+
+# Begrenzter Inferenz-Executor: die Inferenz läuft in INFERENCE_WORKERS Threads,
+# höchstens INFERENCE_MAX_QUEUE Requests warten (darüber sofort 429 mit Retry-After).
+# Ohne Angabe ein Worker bzw. BATCH_MAX_SIZE Worker, damit sich ein Micro-Batch
+# füllen kann; die Intra-Op-Threads nutzen die CPUs bereits aus.
+INFERENCE_WORKERS = int(ENV.get("INFERENCE_WORKERS", "0")) or max(1, BATCH_MAX_SIZE)
+INFERENCE_MAX_QUEUE = int(ENV.get("INFERENCE_MAX_QUEUE", "32"))
+# Frist pro Request: REQUEST_TIMEOUT, sonst exec_timeout der Funktion; der Header
+# X-Request-Timeout-Ms kann sie verkürzen. Abgelaufene Requests werden nicht mehr
+# gerechnet und mit 503 und Retry-After beantwortet.
+REQUEST_TIMEOUT_S = parse_duration(ENV.get("REQUEST_TIMEOUT") or ENV.get("exec_timeout"))
+EXECUTOR = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_MAX_QUEUE, name="distilbert-inference")
+
+# Instrumentierung (siehe metrics.py): Histogramme je Verarbeitungsschritt, per GET auf
+# METRICS_PATH im Prometheus-Format abrufbar; SERVER_TIMING "1" hängt die Schritte des
+# Requests zusätzlich als Server-Timing-Header an die Antwort.
+METRICS_ENABLED = ENV.get("METRICS_ENABLED", "1") == "1"
+METRICS_PATH = ENV.get("METRICS_PATH", "/metrics")
+SERVER_TIMING = ENV.get("SERVER_TIMING", "0") == "1"
+METRICS = Metrics(enabled=METRICS_ENABLED)
+register_executor(METRICS, EXECUTOR)
+METRICS.register_value("log_dropped_total", "Wegen vollen Log-Puffers verworfene Log-Einträge.",
+                       lambda: dropped_records(__package__), "counter")
+
+# In-Process-LRU-Cache für wiederholte Texte (RESULT_CACHE_MAX_ENTRIES "0" = aus)
+RESULT_CACHE_MAX_ENTRIES = int(ENV.get("RESULT_CACHE_MAX_ENTRIES", "0"))
+RESULT_CACHE_MAX_BYTES = int(ENV.get("RESULT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(ENV.get("RESULT_CACHE_TTL_SECONDS", "0"))
+RESULT_CACHE = None
+MODEL_IDENTITY = None
+
+# Treffer, Fehlschläge, Verdrängungen und Größe des Caches auf dem Metrik-Endpunkt
+def result_cache_stat(name):
+        """Wert aus RESULT_CACHE.stats() für die Metriken (0, solange der Cache aus ist)."""
+        return RESULT_CACHE.stats()[name] if RESULT_CACHE is not None else 0
+
+METRICS.register_value("result_cache_hits_total", "Treffer im Ergebnis-Cache.",
+                       lambda: result_cache_stat("hits"), "counter")
+METRICS.register_value("result_cache_misses_total", "Fehlschläge im Ergebnis-Cache (auch abgelaufene Einträge).",
+                       lambda: result_cache_stat("misses"), "counter")
+METRICS.register_value("result_cache_evictions_total", "Wegen Einträge- oder Byte-Grenze verdrängte Cache-Einträge.",
+                       lambda: result_cache_stat("evictions"), "counter")
+METRICS.register_value("result_cache_expirations_total", "Wegen abgelaufener TTL verworfene Cache-Einträge.",
+                       lambda: result_cache_stat("expirations"), "counter")
+METRICS.register_value("result_cache_entries", "Einträge im Ergebnis-Cache.", lambda: result_cache_stat("entries"))
+METRICS.register_value("result_cache_bytes", "Geschätzte Größe des Ergebnis-Caches in Bytes.",
+                       lambda: result_cache_stat("bytes"))
+
+# Mehrere Texte pro Request ({"texts": [...]}): Texte werden nach Tokenlänge sortiert
+# und in Buckets gruppiert, deren gepaddete Größe (Anzahl * längste Sequenz)
+# MAX_TOKENS_PER_BATCH nicht überschreitet. Jeder Bucket wird nur auf seine
+# eigene längste Sequenz gepaddet.
+MAX_LENGTH = int(ENV.get("MAX_LENGTH", "512"))
+MAX_TOKENS_PER_BATCH = int(ENV.get("MAX_TOKENS_PER_BATCH", "8192"))
+MAX_TEXTS_PER_REQUEST = int(ENV.get("MAX_TEXTS_PER_REQUEST", "256"))
+
 def load_model_pipeline():
         """Lädt die Sentiment-Analyse-Pipeline aus dem lokalen Verzeichnis."""
         global CLASSIFIER_PIPELINE
         start_time = time.time()
+        memory_before = memory_usage()
         # Diese Debug-Ausgaben sind sehr nützlich, um das CWD zu bestätigen
-        print(f"--- DEBUG: Aktuelles Arbeitsverzeichnis (CWD): {os.getcwd()}", flush=True)
-        # Liste den Inhalt des "function"-Verzeichnisses, um zu sehen, ob "mein_finetuned_modell" dort ist
-        function_dir_content = []
-        if os.path.exists("./function"):
-            function_dir_content = os.listdir('./function')
-        print(f"--- DEBUG: Inhalt von ./function: {function_dir_content}", flush=True)
+        log.debug(f"Aktuelles Arbeitsverzeichnis (CWD): {os.getcwd()}")
+        # Liste den Inhalt des Funktionsverzeichnisses, um zu sehen, ob "mein_finetuned_modell" dort ist
+        log.debug(f"Inhalt von {FUNC_DIR}: {os.listdir(FUNC_DIR)}")
 
-        print(f"Versuche, Pipeline aus lokalem Verzeichnis '{LOCAL_MODEL_DIR}' zu laden...", flush=True)
+        log.info(f"Versuche, Pipeline aus lokalem Verzeichnis '{LOCAL_MODEL_DIR}' zu laden...")
 
         # Überprüfe, ob das Verzeichnis und wichtige Dateien existieren
         model_path_exists = os.path.exists(LOCAL_MODEL_DIR) and os.path.isdir(LOCAL_MODEL_DIR)
-        print(f"--- DEBUG: Prüfung '{LOCAL_MODEL_DIR}' (existiert & ist Verzeichnis): {model_path_exists}", flush=True)
+        log.debug(f"Prüfung '{LOCAL_MODEL_DIR}' (existiert & ist Verzeichnis): {model_path_exists}")
 
         config_path = os.path.join(LOCAL_MODEL_DIR, "config.json")
         config_exists = os.path.exists(config_path)
-        print(f"--- DEBUG: Prüfung '{config_path}' (existiert): {config_exists}", flush=True)
+        log.debug(f"Prüfung '{config_path}' (existiert): {config_exists}")
 
-        weights_path_safetensors = os.path.join(LOCAL_MODEL_DIR, "model.safetensors")
-        weights_path_pytorch_bin = os.path.join(LOCAL_MODEL_DIR, "pytorch_model.bin")
-        weights_exist = os.path.exists(weights_path_safetensors) or os.path.exists(weights_path_pytorch_bin)
-        print(f"--- DEBUG: Prüfung '{weights_path_safetensors}' (existiert): {os.path.exists(weights_path_safetensors)}", flush=True)
-        print(f"--- DEBUG: Prüfung '{weights_path_pytorch_bin}' (existiert): {os.path.exists(weights_path_pytorch_bin)}", flush=True)
-        print(f"--- DEBUG: Prüfung 'weights_exist' (mindestens eine Gewichtsdatei existiert): {weights_exist}", flush=True)
+        log.debug(f"Inferenz-Backend: '{INFERENCE_BACKEND}'")
+        if INFERENCE_BACKEND in ONNX_MODEL_FILES:
+            onnx_model_path = os.path.join(LOCAL_MODEL_DIR, ONNX_MODEL_FILES[INFERENCE_BACKEND])
+            weights_exist = os.path.exists(onnx_model_path)
+            log.debug(f"Prüfung '{onnx_model_path}' (existiert): {weights_exist}")
+        elif INFERENCE_BACKEND in TORCH_BACKENDS:
+            weights_path_safetensors = os.path.join(LOCAL_MODEL_DIR, "model.safetensors")
+            weights_path_pytorch_bin = os.path.join(LOCAL_MODEL_DIR, "pytorch_model.bin")
+            weights_exist = os.path.exists(weights_path_safetensors) or os.path.exists(weights_path_pytorch_bin)
+            log.debug(f"Prüfung '{weights_path_safetensors}' (existiert): {os.path.exists(weights_path_safetensors)}")
+            log.debug(f"Prüfung '{weights_path_pytorch_bin}' (existiert): {os.path.exists(weights_path_pytorch_bin)}")
+            log.debug(f"Prüfung 'weights_exist' (mindestens eine Gewichtsdatei existiert): {weights_exist}")
+        else:
+            log.error(f"Unbekanntes INFERENCE_BACKEND '{INFERENCE_BACKEND}' (erlaubt: torch, torch-pipeline, onnx, onnx-int8)")
+            CLASSIFIER_PIPELINE = None
+            return
 
         if model_path_exists and config_exists and weights_exist:
             try:
-                print(f"--- DEBUG: Versuche Modell und Tokenizer aus '{LOCAL_MODEL_DIR}' zu laden.", flush=True)
-                # Lade Modell und Tokenizer explizit, dann erstelle die Pipeline
-                model = AutoModelForSequenceClassification.from_pretrained(LOCAL_MODEL_DIR)
+                log.debug(f"Versuche Modell und Tokenizer aus '{LOCAL_MODEL_DIR}' zu laden.")
                 tokenizer = AutoTokenizer.from_pretrained(LOCAL_MODEL_DIR)
 
-                CLASSIFIER_PIPELINE = pipeline(
-                    "sentiment-analysis", # Oder "text-classification"
-                    model=model,
-                    tokenizer=tokenizer,
-                    device=-1  # Zwingt zur CPU-Nutzung
-                )
+                if INFERENCE_BACKEND in ONNX_MODEL_FILES:
+                    # Import erst hier, damit das torch-Backend ohne onnxruntime auskommt
+                    from .onnx_backend import OnnxSequenceClassifier
+                    config = AutoConfig.from_pretrained(LOCAL_MODEL_DIR)
+                    CLASSIFIER_PIPELINE = OnnxSequenceClassifier(onnx_model_path, tokenizer, config.id2label,
+                                                                 max_length=MAX_LENGTH,
+                                                                 intra_op_threads=INFERENCE_THREADS)
+                else:
+                    import torch
+                    torch.set_num_threads(INFERENCE_THREADS)
+                    try:
+                        torch.set_num_interop_threads(1)
+                    except RuntimeError:
+                        pass  # Nur vor der ersten parallelen Operation erlaubt
+
+                    # Lade Modell und Tokenizer explizit
+                    model = None
+                    if MMAP_WEIGHTS and os.path.exists(weights_path_safetensors):
+                        from .torch_backend import load_model_mmap
+                        try:
+                            model = load_model_mmap(LOCAL_MODEL_DIR)
+                            log.debug("Gewichte per mmap aus model.safetensors eingeblendet.")
+                        except Exception as e:
+                            log.warning(f"mmap-Laden fehlgeschlagen ({e}), lade mit from_pretrained.", exc_info=True)
+                    if model is None:
+                        model = AutoModelForSequenceClassification.from_pretrained(LOCAL_MODEL_DIR)
+
+                    if INFERENCE_BACKEND == "torch":
+                        # Direkter Pfad ohne Pipeline-Overhead (Argumentprüfung, Postprocessing pro Item)
+                        from .torch_backend import TorchSequenceClassifier
+                        CLASSIFIER_PIPELINE = TorchSequenceClassifier(model, tokenizer, max_length=MAX_LENGTH)
+                    else:
+                        CLASSIFIER_PIPELINE = pipeline(
+                            "sentiment-analysis", # Oder "text-classification"
+                            model=model,
+                            tokenizer=tokenizer,
+                            device=-1  # Zwingt zur CPU-Nutzung
+                        )
                 end_time = time.time()
-                print(f"Pipeline erfolgreich aus '{LOCAL_MODEL_DIR}' geladen. Dauer: {end_time - start_time:.2f} Sekunden.", flush=True)
+                log.info(f"Pipeline erfolgreich aus '{LOCAL_MODEL_DIR}' geladen. Dauer: {end_time - start_time:.2f} Sekunden. "
+                         f"Threads: {INFERENCE_THREADS}. Speicher vorher {memory_before}, nachher {memory_usage()}")
             except Exception as e:
-                print(f"FEHLER beim Laden der Pipeline aus '{LOCAL_MODEL_DIR}': {e}", flush=True)
-                print(traceback.format_exc(), flush=True) # Traceback beim Laden ausgeben
+                log.exception(f"Fehler beim Laden der Pipeline aus '{LOCAL_MODEL_DIR}': {e}")
                 CLASSIFIER_PIPELINE = None
         else:
-            print(f"FEHLER: Modellverzeichnis '{LOCAL_MODEL_DIR}' oder notwendige Dateien (config.json, model weights) darin nicht gefunden!", flush=True)
+            log.error(f"Modellverzeichnis '{LOCAL_MODEL_DIR}' oder notwendige Dateien (config.json, model weights) darin nicht gefunden!")
             CLASSIFIER_PIPELINE = None
 
+def model_identity():
+        """Identität des geladenen Modells für Cache-Schlüssel (Backend, Dateinamen, Größen, Zeitstempel)."""
+        parts = [INFERENCE_BACKEND, os.path.realpath(LOCAL_MODEL_DIR)]
+        for name in sorted(os.listdir(LOCAL_MODEL_DIR)):
+            stat = os.stat(os.path.join(LOCAL_MODEL_DIR, name))
+            parts.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+_load_start = time.perf_counter()
 load_model_pipeline()
+METRICS.set_loaded(time.perf_counter() - _load_start, CLASSIFIER_PIPELINE is not None)
+
+def classify_texts(texts):
+        """Klassifiziert eine Liste von Texten in einem gepaddeten Forward-Pass."""
+        classify_encoded = getattr(CLASSIFIER_PIPELINE, "classify_encoded", None)
+        if classify_encoded is None:
+            # transformers-Pipeline: Tokenisierung und Forward-Pass in einem Aufruf
+            with FORWARD_GATE, METRICS.stage("forward"):
+                results = CLASSIFIER_PIPELINE(texts, batch_size=len(texts), truncation=True, max_length=MAX_LENGTH)
+            return [result[0] if isinstance(result, list) else result for result in results]
+
+        # Direkte Backends: getrennt messbar, gepaddet wird auf die längste Sequenz wie beim Tokenizer
+        with METRICS.stage("tokenize"):
+            input_ids = CLASSIFIER_PIPELINE.tokenizer(texts, truncation=True, max_length=MAX_LENGTH)["input_ids"]
+        with FORWARD_GATE, METRICS.stage("forward"):
+            return classify_encoded(input_ids)
+
+def make_length_buckets(lengths, max_tokens_per_batch):
+        """Gruppiert Indizes nach aufsteigender Länge unter einem Token-Budget.
+
+        Ein Bucket kostet gepaddet len(bucket) * max(Länge) Tokens. Ein einzelner
+        Text, der allein schon über dem Budget liegt, bildet einen eigenen Bucket.
+        """
+        buckets = []
+        current = []
+        longest = 0
+        for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+            candidate_longest = max(longest, lengths[i])
+            if current and candidate_longest * (len(current) + 1) > max_tokens_per_batch:
+                buckets.append(current)
+                current = []
+                candidate_longest = lengths[i]
+            current.append(i)
+            longest = candidate_longest
+        if current:
+            buckets.append(current)
+        return buckets
+
+def classify_texts_bucketed(texts):
+        """Klassifiziert viele Texte in längensortierten Buckets, Ergebnisse in Originalreihenfolge."""
+        with METRICS.stage("tokenize"):
+            encodings = CLASSIFIER_PIPELINE.tokenizer(texts, truncation=True, max_length=MAX_LENGTH)
+        lengths = [len(ids) for ids in encodings["input_ids"]]
+
+        # Direkte Backends nehmen die Token-IDs unverändert, die Pipeline nur Texte
+        classify_encoded = getattr(CLASSIFIER_PIPELINE, "classify_encoded", None)
+
+        results = [None] * len(texts)
+        for bucket in make_length_buckets(lengths, MAX_TOKENS_PER_BATCH):
+            if classify_encoded is not None:
+                with FORWARD_GATE, METRICS.stage("forward"):
+                    bucket_results = classify_encoded([encodings["input_ids"][i] for i in bucket])
+            else:
+                bucket_results = classify_texts([texts[i] for i in bucket])
+            for i, result in zip(bucket, bucket_results):
+                results[i] = result
+        return results
+
+def classify_text(text):
+        """Einzelnen Text klassifizieren, über den Micro-Batcher, falls aktiv."""
+        if BATCHER is not None:
+            return BATCHER.submit(text).result()
+        results = classify_texts([text])
+        return results[0] if results else {"label": "ERROR", "score": 0.0}
+
+def handle_texts(texts, deadline=None):
+        """Verarbeitet {"texts": [...]}; bereits gecachte Texte werden nicht erneut berechnet."""
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t.strip() for t in texts):
+            return json.dumps({"error": "Schlüssel 'texts' muss eine nicht-leere Liste nicht-leerer Strings sein."}), 400
+        if len(texts) > MAX_TEXTS_PER_REQUEST:
+            return json.dumps({"error": f"Höchstens {MAX_TEXTS_PER_REQUEST} Texte pro Request erlaubt."}), 400
+
+        results = [None] * len(texts)
+        cache_keys = [None] * len(texts)
+        if RESULT_CACHE is not None:
+            with METRICS.stage("cache"):
+                for i, text in enumerate(texts):
+                    cache_keys[i] = ResultCache.make_key(text, MODEL_IDENTITY)
+                    results[i] = RESULT_CACHE.get(cache_keys[i])
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        log.debug("Führe Pipeline mit %d von %d Texten aus (Rest aus Cache)", len(missing), len(texts))
+        if missing:
+            computed = EXECUTOR.run(METRICS.queued(classify_texts_bucketed), [texts[i] for i in missing], deadline=deadline)
+            for i, result in zip(missing, computed):
+                results[i] = result
+                if cache_keys[i] is not None and result.get("label") != "ERROR":
+                    RESULT_CACHE.put(cache_keys[i], result)
+
+        with METRICS.stage("serialize"):
+            return json.dumps({"results": results}), 200
+
+if CLASSIFIER_PIPELINE is not None and BATCH_MAX_SIZE > 1:
+    BATCHER = MicroBatcher(classify_texts, max_batch_size=BATCH_MAX_SIZE,
+                           window_ms=BATCH_WINDOW_MS, max_queue=BATCH_MAX_QUEUE, metrics=METRICS)
+    register_batcher(METRICS, BATCHER)
+    log.info(f"Micro-Batching aktiv: max. Batchgröße={BATCH_MAX_SIZE}, Fenster={BATCH_WINDOW_MS} ms, "
+             f"max. Warteschlange={BATCH_MAX_QUEUE}")
+
+if CLASSIFIER_PIPELINE is not None and RESULT_CACHE_MAX_ENTRIES > 0:
+    MODEL_IDENTITY = model_identity()
+    RESULT_CACHE = ResultCache(max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES,
+                               ttl_seconds=RESULT_CACHE_TTL_SECONDS)
+    log.info(f"Ergebnis-Cache aktiv: max. {RESULT_CACHE_MAX_ENTRIES} Einträge, max. {RESULT_CACHE_MAX_BYTES} Bytes, "
+             f"TTL={RESULT_CACHE_TTL_SECONDS or 'keine'}, Modell-Identität={MODEL_IDENTITY}")
 
 def handle(event, context):
+        """Einstiegspunkt: GET auf METRICS_PATH liefert die Metriken, alles andere ist ein Analyse-Request."""
+        if getattr(event, 'path', None) == METRICS_PATH and getattr(event, 'method', 'GET') == 'GET':
+            return METRICS.render(), 200, {"Content-Type": METRICS_CONTENT_TYPE}
+        request = METRICS.start_request()
+        sample_request()
+        response = handle_request(event, context)
+        server_timing = METRICS.finish_request(request, response_status(response))
+        return add_headers(response, {"Server-Timing": server_timing}) if SERVER_TIMING and server_timing else response
+
+def handle_request(event, context):
         """Verarbeitet eine Anfrage zur Sentiment-Analyse."""
         global CLASSIFIER_PIPELINE
 
+        # Frist ab Eingang des Requests, nicht erst ab Beginn der Inferenz
+        deadline = request_deadline(getattr(event, 'headers', None), REQUEST_TIMEOUT_S)
         if CLASSIFIER_PIPELINE is None:
-            print("handle() aufgerufen, aber CLASSIFIER_PIPELINE ist None.", flush=True)
+            log.error("handle() aufgerufen, aber CLASSIFIER_PIPELINE ist None.")
             return json.dumps({"error": "Sentiment-Analyse-Pipeline ist nicht verfügbar."}), 500
 
         try:
@@ -78,51 +343,62 @@ def handle(event, context):
             # oder json.loads kann es direkt verarbeiten.
             request_body = None
             if hasattr(event, 'body'):
-                request_body = event.body
-                print(f"handle() aufgerufen. Event-Typ: {type(event)}, Body-Typ: {type(request_body)}", flush=True)
-                # Logge nur, wenn der Body bytes oder str ist und gesliced werden kann
-                if isinstance(request_body, (bytes, str)):
-                    print(f"Event body (Anfang): {request_body[:200]}...", flush=True)
-                else:
-                    print(f"Event body (als str): {str(request_body)[:200]}...", flush=True)
+                with METRICS.stage("read"):
+                    request_body = event.body
             else:
                 # Fallback, falls event direkt der Body ist (wie ursprünglich erwartet)
                 request_body = event
-                print(f"handle() aufgerufen. Event-Typ (direkt): {type(request_body)}", flush=True)
-                if isinstance(request_body, (bytes, str)):
-                     print(f"Event (direkt, Anfang): {request_body[:200]}...", flush=True)
-                else:
-                    print(f"Event (direkt, als str): {str(request_body)[:200]}...", flush=True)
-
+            # Body nur mit LOG_BODIES=1 (gekürzt), sonst nur seine Länge
+            if debug_enabled(log):
+                log.debug("handle() aufgerufen, Event-Typ %s, Body-Typ %s", type(event).__name__,
+                          type(request_body).__name__, extra=body_summary(request_body))
 
             # Verwende request_body für json.loads
-            input_data = json.loads(request_body)
+            with METRICS.stage("decode"):
+                input_data = json.loads(request_body)
+
+            if isinstance(input_data, dict) and 'texts' in input_data:
+                return handle_texts(input_data['texts'], deadline)
 
             if 'text' not in input_data or not isinstance(input_data['text'], str):
-                print("Fehler: 'text' nicht im JSON oder kein String.", flush=True)
+                log.debug("Fehler: 'text' nicht im JSON oder kein String.")
                 return json.dumps({"error": "JSON muss Schlüssel 'text' mit einem String enthalten."}), 400
 
             input_text = input_data['text']
             if not input_text.strip():
-                 print("Fehler: 'text' ist leer.", flush=True)
+                 log.debug("Fehler: 'text' ist leer.")
                  return json.dumps({"error": "Schlüssel 'text' darf nicht leer sein."}), 400
 
-            print(f"Führe Pipeline mit Text aus: '{input_text[:100]}...'", flush=True)
-            results = CLASSIFIER_PIPELINE(input_text)
-            print(f"Pipeline Ergebnis: {results}", flush=True)
+            cache_key = None
+            if RESULT_CACHE is not None:
+                with METRICS.stage("cache"):
+                    cache_key = ResultCache.make_key(input_text, MODEL_IDENTITY)
+                    cached = RESULT_CACHE.get(cache_key)
+                if cached is not None:
+                    log.debug("Cache-Treffer: %s", cached)
+                    return json.dumps(cached), 200
+
+            log.debug("Führe Pipeline mit Text aus (%d Zeichen)", len(input_text))
+            # Eine volle Batch-Warteschlange (QueueFullError) wird wie eine Executor-Ablehnung beantwortet
+            prediction = EXECUTOR.run(METRICS.queued(classify_text), input_text, deadline=deadline)
+            log.debug("Pipeline Ergebnis: %s", prediction)
+
+            if cache_key is not None and prediction.get("label") != "ERROR":
+                RESULT_CACHE.put(cache_key, prediction)
 
-            prediction = results[0] if results else {"label": "ERROR", "score": 0.0}
-            return json.dumps(prediction), 200
+            with METRICS.stage("serialize"):
+                return json.dumps(prediction), 200
 
+        except InferenceRejectedError as rejected:
+            # Einzelne Ablehnungen nur im DEBUG-Log, die Anzahl steht in den Metriken
+            log.debug("Request abgelehnt (%d): %s, Executor: %s", rejected.status, rejected, EXECUTOR.stats())
+            return rejected_response(rejected)
         except json.JSONDecodeError:
-            print(f"Fehler beim Parsen des JSON-Inputs. Verwendeter Body: {str(request_body)[:200]}...", flush=True)
-            print(traceback.format_exc(), flush=True) # Traceback ausgeben
+            log.warning("Fehler beim Parsen des JSON-Inputs", exc_info=True, extra=body_summary(request_body))
             return json.dumps({"error": "Ungültiger JSON Input."}), 400
         except AttributeError as ae: # Fängt Fehler ab, falls event.body nicht existiert und event kein str/bytes ist
-            print(f"AttributeError in handle() - wahrscheinlich Problem mit 'event' oder 'event.body': {ae}", flush=True)
-            print(traceback.format_exc(), flush=True)
+            log.exception("AttributeError in handle() - wahrscheinlich Problem mit 'event' oder 'event.body': %s", ae)
             return json.dumps({"error": "Interner Fehler bei der Verarbeitung des Request-Events."}), 500
         except Exception as e:
-            print(f"Ein unerwarteter Fehler ist in handle() aufgetreten: {e}", flush=True)
-            print(traceback.format_exc(), flush=True) # Traceback ausgeben
+            log.exception("Ein unerwarteter Fehler ist in handle() aufgetreten: %s", e)
             return json.dumps({"error": "Interner Serverfehler bei der Verarbeitung."}), 500
\ No newline at end of file
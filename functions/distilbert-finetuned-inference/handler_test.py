@@ -1,10 +1,329 @@
-from .handler import handle
+import json
+import threading
+import time
+
+from . import handler
+from .handler import handle, make_length_buckets
+from .inference_executor import rejected_response
+from .metrics import Metrics, register_batcher
+from .micro_batcher import MicroBatcher, QueueFullError
+from .result_cache import ResultCache
+from .mmap_weights import load_safetensors_mmap, save_safetensors
+from .torch_backend import TorchSequenceClassifier, load_model_mmap
 
 # Test your handler here
 
 # To disable testing, you can set the build_arg `TEST_ENABLED=false` on the CLI or in your stack.yml
 # https://docs.openfaas.com/reference/yaml/#function-build-args-build-args
 
-def test_handle():
-    # assert handle("input") == "input"
-    pass
+
+class FakeEvent:
+    def __init__(self, payload, headers=None, path="/", method="POST"):
+        self.body = json.dumps(payload)
+        self.headers = headers or {}
+        self.path = path
+        self.method = method
+
+
+def test_micro_batcher_groups_concurrent_requests():
+    batch_sizes = []
+
+    def process(items):
+        batch_sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=4, window_ms=50)
+    results = {}
+
+    def worker(i):
+        results[i] = batcher.submit(i).result(timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: i * 2 for i in range(8)}
+    assert max(batch_sizes) <= 4
+    assert len(batch_sizes) < 8
+    assert batcher.stats()["items"] == 8
+
+
+def test_micro_batcher_reports_batch_stages_in_each_request_timing():
+    metrics = Metrics()
+
+    def process(items):
+        with metrics.stage("forward"):
+            time.sleep(0.01)
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=2, window_ms=500)
+    timings = {}
+
+    def request(name):
+        measurement = metrics.start_request()
+        batcher.submit(name).result(timeout=5)
+        timings[name] = metrics.finish_request(measurement, 200)
+
+    threads = [threading.Thread(target=request, args=(name,)) for name in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(value.startswith("forward;dur=") for value in timings.values())
+    assert 'stage="forward"} 1' in metrics.render()  # ein gemeinsamer Forward-Pass
+
+
+def test_micro_batcher_exports_batch_size_and_wait_metrics():
+    metrics = Metrics()
+    batcher = MicroBatcher(lambda items: items, max_batch_size=2, window_ms=500, metrics=metrics)
+    register_batcher(metrics, batcher)
+
+    futures = [batcher.submit(i) for i in range(2)]
+    assert [future.result(timeout=5) for future in futures] == [0, 1]
+    batcher.shutdown()  # Statistik wird nach set_result() aktualisiert
+
+    body = metrics.render()
+    assert 'inference_batch_size_bucket{le="1.0"} 0' in body
+    assert 'inference_batch_size_bucket{le="2.0"} 1' in body
+    assert "inference_batch_wait_seconds_count 1" in body
+    assert "inference_batcher_items_total 2" in body and "inference_batcher_last_batch_size 2" in body
+
+
+def test_micro_batcher_propagates_errors_to_every_caller():
+    def process(items):
+        raise ValueError("kaputt")
+
+    batcher = MicroBatcher(process, max_batch_size=2, window_ms=20)
+    futures = [batcher.submit(i) for i in range(2)]
+
+    for future in futures:
+        assert isinstance(future.exception(timeout=5), ValueError)
+
+
+def test_micro_batcher_rejects_when_queue_full():
+    release = threading.Event()
+
+    def process(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=1, window_ms=0, max_queue=1)
+    batcher.submit("läuft")
+    time.sleep(0.05)  # Worker hat den ersten Eintrag übernommen
+    batcher.submit("wartet")
+
+    try:
+        batcher.submit("zu viel")
+        assert False, "QueueFullError erwartet"
+    except QueueFullError as rejected:
+        body, status, headers = rejected_response(rejected)
+        assert status == 429 and int(headers["Retry-After"]) >= 1
+    finally:
+        release.set()
+
+
+def test_result_cache_key_normalizes_text_and_includes_model():
+    assert ResultCache.make_key("  gut  gemacht\n", "m1") == ResultCache.make_key("gut gemacht", "m1")
+    assert ResultCache.make_key("gut gemacht", "m1") != ResultCache.make_key("gut gemacht", "m2")
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put(b"a", {"label": "POSITIVE", "score": 0.9})
+    cache.put(b"b", {"label": "NEGATIVE", "score": 0.8})
+    cache.get(b"a")
+    cache.put(b"c", {"label": "POSITIVE", "score": 0.7})
+
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is not None and cache.get(b"c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_result_cache_respects_byte_budget_and_ttl():
+    now = [0.0]
+    cache = ResultCache(max_entries=100, max_bytes=600, ttl_seconds=10, clock=lambda: now[0])
+    for key in (b"a", b"b", b"c", b"d"):
+        cache.put(key, {"label": "POSITIVE", "score": 0.5})
+    assert cache.stats()["bytes"] <= 600
+
+    now[0] = 11.0
+    assert cache.get(b"d") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_result_cache_is_thread_safe():
+    cache = ResultCache(max_entries=50)
+
+    def worker(offset):
+        for i in range(500):
+            key = str((offset + i) % 80).encode()
+            if cache.get(key) is None:
+                cache.put(key, {"label": "POSITIVE", "score": 0.5})
+
+    threads = [threading.Thread(target=worker, args=(i * 7,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = cache.stats()
+    assert stats["entries"] <= 50
+    assert stats["hits"] + stats["misses"] == 8 * 500
+
+
+def test_make_length_buckets_respects_token_budget():
+    lengths = [5, 300, 7, 120, 6, 512, 130, 8]
+
+    buckets = make_length_buckets(lengths, max_tokens_per_batch=512)
+
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    for bucket in buckets:
+        assert len(bucket) == 1 or len(bucket) * max(lengths[i] for i in bucket) <= 512
+    # Kurze Texte landen gemeinsam vor den langen
+    assert buckets[0] == [0, 4, 2, 7]
+
+
+def test_make_length_buckets_keeps_oversized_text_alone():
+    assert make_length_buckets([600, 10], max_tokens_per_batch=512) == [[1], [0]]
+
+
+def _tiny_classifier(tmp_path):
+    import torch
+    from transformers import BertTokenizerFast, DistilBertConfig, DistilBertForSequenceClassification
+
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "gut", "schlecht", "sehr", "film"]
+    (tmp_path / "vocab.txt").write_text("\n".join(vocab))
+    tokenizer = BertTokenizerFast(vocab_file=str(tmp_path / "vocab.txt"))
+    torch.manual_seed(0)
+    config = DistilBertConfig(vocab_size=len(vocab), dim=16, hidden_dim=32, n_layers=1, n_heads=2,
+                              id2label={0: "NEGATIVE", 1: "POSITIVE"}, label2id={"NEGATIVE": 0, "POSITIVE": 1})
+    return TorchSequenceClassifier(DistilBertForSequenceClassification(config), tokenizer)
+
+
+def test_torch_classifier_matches_model_and_encoded_path(tmp_path):
+    import torch
+
+    classifier = _tiny_classifier(tmp_path)
+    texts = ["gut", "sehr sehr schlecht film", "film"]
+
+    results = classifier(texts)
+
+    enc = classifier.tokenizer(texts, padding=True, return_tensors="pt")
+    with torch.no_grad():
+        probs = torch.softmax(classifier.model(**enc).logits, dim=-1)
+    for result, row in zip(results, probs):
+        assert result["label"] == ("POSITIVE" if row[1] > row[0] else "NEGATIVE")
+        assert abs(result["score"] - float(row.max())) < 1e-6
+
+    encoded = classifier.tokenizer(texts)["input_ids"]
+    for a, b in zip(results, classifier.classify_encoded(encoded)):
+        assert a["label"] == b["label"] and abs(a["score"] - b["score"]) < 1e-6
+
+
+def test_safetensors_roundtrip_through_mmap(tmp_path):
+    import torch
+
+    tensors = {"w": torch.rand(3, 4), "ids": torch.arange(5), "half": torch.rand(2).bfloat16()}
+    save_safetensors(tensors, str(tmp_path / "t.safetensors"))
+
+    loaded = load_safetensors_mmap(str(tmp_path / "t.safetensors"))
+
+    assert all(torch.equal(loaded[name], tensor) and loaded[name].dtype == tensor.dtype
+               for name, tensor in tensors.items())
+
+
+def test_load_model_mmap_matches_from_pretrained(tmp_path):
+    import torch
+
+    classifier = _tiny_classifier(tmp_path)
+    classifier.model.save_pretrained(str(tmp_path / "modell"))
+
+    model = load_model_mmap(str(tmp_path / "modell"))
+
+    ids = torch.tensor([[2, 5, 7, 3, 0]])
+    with torch.no_grad():
+        assert torch.allclose(model(input_ids=ids).logits, classifier.model(input_ids=ids).logits)
+    assert not any(tensor.is_meta for tensor in model.state_dict().values())
+
+
+def _install_classifier(monkeypatch, classifier, cache=True):
+    monkeypatch.setattr(handler, "CLASSIFIER_PIPELINE", classifier)
+    monkeypatch.setattr(handler, "BATCHER", None)
+    monkeypatch.setattr(handler, "MODEL_IDENTITY", "test-modell")
+    monkeypatch.setattr(handler, "RESULT_CACHE", ResultCache(max_entries=16) if cache else None)
+    return handler.RESULT_CACHE
+
+
+def _call(payload):
+    body, status = handle(FakeEvent(payload), None)[:2]
+    return json.loads(body), status
+
+
+def test_handle_serves_whitespace_variants_from_cache(tmp_path, monkeypatch):
+    cache = _install_classifier(monkeypatch, _tiny_classifier(tmp_path))
+
+    first, status = _call({"text": "sehr gut film"})
+    second, _ = _call({"text": "  sehr   gut\nfilm "})
+
+    assert status == 200 and second == first
+    assert cache.stats()["entries"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_metrics_route_exposes_result_cache_counters(tmp_path, monkeypatch):
+    _install_classifier(monkeypatch, _tiny_classifier(tmp_path))
+
+    _call({"text": "gut"})
+    _call({"text": "gut"})
+    body, status, headers = handle(FakeEvent(None, path="/metrics", method="GET"), None)
+
+    assert status == 200
+    assert "inference_result_cache_hits_total 1" in body and "inference_result_cache_misses_total 1" in body
+    assert "inference_result_cache_entries 1" in body and "inference_result_cache_evictions_total 0" in body
+
+
+def test_handle_does_not_cache_error_labels(tmp_path, monkeypatch):
+    cache = _install_classifier(monkeypatch, _tiny_classifier(tmp_path))
+    monkeypatch.setattr(handler, "classify_text", lambda text: {"label": "ERROR", "score": 0.0})
+
+    result, status = _call({"text": "gut"})
+
+    assert status == 200 and result["label"] == "ERROR"
+    assert cache.stats()["entries"] == 0
+
+
+def test_handle_texts_does_not_cache_error_labels(tmp_path, monkeypatch):
+    cache = _install_classifier(monkeypatch, _tiny_classifier(tmp_path))
+    monkeypatch.setattr(handler, "classify_texts_bucketed",
+                        lambda texts: [{"label": "ERROR", "score": 0.0} if text == "kaputt" else
+                                       {"label": "POSITIVE", "score": 0.9} for text in texts])
+
+    result, status = _call({"texts": ["kaputt", "gut"]})
+
+    assert status == 200 and [r["label"] for r in result["results"]] == ["ERROR", "POSITIVE"]
+    assert cache.stats()["entries"] == 1
+
+
+def test_handle_texts_keeps_request_order_with_partial_cache(tmp_path, monkeypatch):
+    classifier = _tiny_classifier(tmp_path)
+    cache = _install_classifier(monkeypatch, classifier)
+    texts = ["sehr sehr schlecht film", "gut", "film schlecht", "gut"]
+    _call({"text": "film schlecht"})  # füllt den Cache für einen der Texte
+
+    result, status = _call({"texts": texts})
+
+    assert status == 200
+    expected = [classifier([text])[0] for text in texts]
+    for actual, wanted in zip(result["results"], expected):
+        assert actual["label"] == wanted["label"] and abs(actual["score"] - wanted["score"]) < 1e-5
+    assert cache.stats()["hits"] == 1
+
+
+def test_handle_texts_rejects_empty_entries(tmp_path, monkeypatch):
+    _install_classifier(monkeypatch, _tiny_classifier(tmp_path), cache=False)
+
+    result, status = _call({"texts": ["gut", "  "]})
+
+    assert status == 400 and "texts" in result["error"]
@@ -0,0 +1,161 @@
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import traceback
+
+# Konfiguration aus der Umgebung; im Multi-Modell-Host (host/model_host.py) übergibt der Host
+# die Umgebung jeder Funktion als Attribut ENVIRONMENT ihres Pakets
+ENV = getattr(sys.modules.get(__package__ or ""), "ENVIRONMENT", os.environ)
+# LOG_LEVEL: DEBUG, INFO (Standard), WARNING, ERROR; unbekannte Werte fallen mit Warnung auf INFO zurück
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+LOG_LEVEL = ENV.get("LOG_LEVEL", "INFO").strip().upper()
+# Anteil der Requests, deren DEBUG-Zeilen geschrieben werden (nur bei LOG_LEVEL=DEBUG relevant)
+LOG_SAMPLE_RATE = float(ENV.get("LOG_SAMPLE_RATE", "0.01"))
+# Request-Bodies erscheinen nur mit LOG_BODIES=1 (gekürzt) im Log, sonst nur ihre Länge
+LOG_BODIES = ENV.get("LOG_BODIES", "0") == "1"
+# Höchstzahl gepufferter Log-Einträge; ist der Puffer voll, werden Einträge verworfen statt zu blockieren
+LOG_QUEUE_SIZE = int(ENV.get("LOG_QUEUE_SIZE", "10000"))
+
+# Ob die DEBUG-Zeilen des aktuellen Requests geschrieben werden; der Executor kopiert den Kontext
+_REQUEST_SAMPLED = contextvars.ContextVar("log_request_sampled", default=True)
+# Standardattribute eines LogRecord; alles andere stammt aus extra={...} und wird als Feld ausgegeben
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message"}
+_LISTENERS = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """Eine JSON-Zeile pro Eintrag: Zeit, Level, Logger, Nachricht, extra-Felder und ggf. Traceback."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_text:
+            entry["traceback"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, der bei vollem Puffer verwirft statt den Request-Thread zu blockieren."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Nachricht und Traceback im aufrufenden Thread fertigstellen, formatiert wird im Writer-Thread
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _RequestSampler(logging.Filter):
+    """Lässt DEBUG-Einträge nur für gesampelte Requests durch, alle anderen Level immer."""
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or _REQUEST_SAMPLED.get()
+
+
+def configure_logging(name, level=LOG_LEVEL, queue_size=LOG_QUEUE_SIZE, stream=None):
+    """Richtet den Logger `name` (z. B. das Paket der Funktion) mit asynchronem JSON-Writer ein.
+
+    Aufrufer legen Einträge nur in eine begrenzte Queue; ein Hintergrund-Thread
+    formatiert und schreibt sie nach stdout. Module darunter loggen über
+    logging.getLogger(__name__). Mehrfache Aufrufe sind wirkungslos.
+    """
+    logger = logging.getLogger(name)
+    if name in _LISTENERS:
+        return logger
+    invalid_level = None
+    if isinstance(level, str):
+        level = level.strip().upper()
+        if level not in LOG_LEVELS:
+            invalid_level, level = level, "INFO"
+    log_queue = queue.Queue(maxsize=max(1, int(queue_size)))
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(_RequestSampler())
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    logger.handlers[:] = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    _LISTENERS[name] = (listener, queue_handler)
+    atexit.register(listener.stop) # restliche Einträge beim Beenden noch schreiben
+    if invalid_level is not None: # ein Tippfehler im Log-Level soll die Funktion nicht am Laden hindern
+        logger.warning("Unbekanntes LOG_LEVEL '%s', verwende INFO (erlaubt: %s)", invalid_level, ", ".join(LOG_LEVELS))
+    return logger
+
+
+def shutdown_logging(name):
+    """Schreibt die restlichen Einträge, beendet den Writer-Thread und löst den Logger `name` von der Queue."""
+    entry = _LISTENERS.pop(name, None)
+    if entry is None:
+        return
+    listener, queue_handler = entry
+    atexit.unregister(listener.stop)
+    listener.stop()
+    logging.getLogger(name).removeHandler(queue_handler)
+
+
+def dropped_records(name):
+    """Anzahl wegen vollen Puffers verworfener Einträge des mit configure_logging eingerichteten Loggers."""
+    entry = _LISTENERS.get(name)
+    return entry[1].dropped if entry else 0
+
+
+def flush_logging(name):
+    """Wartet, bis der Writer alle gepufferten Einträge geschrieben hat (für Tests und Benchmarks)."""
+    entry = _LISTENERS.get(name)
+    if entry:
+        entry[0].queue.join()
+
+
+def sample_request(rate=None):
+    """Entscheidet zu Beginn eines Requests, ob seine DEBUG-Zeilen geschrieben werden."""
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    sampled = rate >= 1.0 or random.random() < rate
+    _REQUEST_SAMPLED.set(sampled)
+    return sampled
+
+
+def debug_enabled(logger):
+    """True, wenn DEBUG-Zeilen des aktuellen Requests geschrieben würden.
+
+    Verworfene Einträge kosten trotzdem das Erzeugen des LogRecord (einige
+    Mikrosekunden); teure DEBUG-Zeilen im Request-Pfad daher vorab prüfen.
+    """
+    return _REQUEST_SAMPLED.get() and logger.isEnabledFor(logging.DEBUG)
+
+
+def body_summary(body, limit=200):
+    """Log-Felder für einen Request-Body: Länge, mit LOG_BODIES=1 zusätzlich der gekürzte Anfang."""
+    if body is None:
+        return {"body_bytes": 0}
+    summary = {"body_bytes": len(body) if isinstance(body, (bytes, bytearray, str)) else None}
+    if LOG_BODIES:
+        summary["body"] = (body[:limit] if isinstance(body, (bytes, bytearray, str)) else str(body)[:limit])
+    return summary
@@ -0,0 +1,137 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .inference_executor import ExecutorQueueFullError
+from .metrics import shared_timings
+
+log = logging.getLogger(__name__)
+
+
+class QueueFullError(ExecutorQueueFullError):
+    """Die Warteschlange des Batchers ist voll: Ablehnung wie beim Executor (429 mit Retry-After)."""
+
+
+class MicroBatcher:
+    """Sammelt gleichzeitig eintreffende Requests zu einem gemeinsamen Forward-Pass.
+
+    Ein Hintergrund-Thread wartet auf den ersten Eintrag, sammelt danach bis zu
+    `window_ms` Millisekunden weitere Einträge (höchstens `max_batch_size`) und
+    ruft `process_batch(items)` einmal für alle auf. `process_batch` muss eine
+    Liste mit genau einem Ergebnis pro Eintrag in derselben Reihenfolge liefern;
+    jeder Aufrufer erhält sein Ergebnis über ein eigenes Future. Im Batch
+    gemessene Schritte erscheinen im Server-Timing jedes beteiligten Requests.
+    Mit `metrics` landen Größe und längste Wartezeit jedes Batches in dessen
+    Histogrammen batch_size und batch_wait_seconds (siehe register_batcher()).
+    """
+
+    def __init__(self, process_batch, max_batch_size=8, window_ms=5.0, max_queue=64, name="micro-batcher",
+                 metrics=None):
+        self.process_batch = process_batch
+        self.metrics = metrics
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.window_s = max(0.0, float(window_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "rejected": 0,
+            "last_batch_size": 0,
+            "last_max_wait_ms": 0.0,
+            "last_inference_ms": 0.0,
+        }
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Reiht `item` ein und gibt ein Future für dessen Ergebnis zurück."""
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter(), contextvars.copy_context()))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise QueueFullError(f"Batch-Warteschlange voll ({self._queue.maxsize} Einträge)",
+                                 retry_after_s=self.retry_after_s())
+        return future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def retry_after_s(self):
+        """Geschätzte Sekunden, bis die Warteschlange abgearbeitet ist (nach der Dauer des letzten Batches)."""
+        with self._stats_lock:
+            batch_s = self._stats["last_inference_ms"] / 1000.0
+        return max(1.0, (self.queue_depth() / self.max_batch_size + 1) * batch_s)
+
+    def shutdown(self, wait=True):
+        """Beendet den Batch-Thread, nachdem er die bereits eingereihten Einträge verarbeitet hat."""
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.queue_depth()
+        return stats
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None: # shutdown()
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.window_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Fenster abgelaufen: nur noch bereits Wartende mitnehmen
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if batch[-1] is None: # shutdown() während des Fensters: diesen Batch noch verarbeiten
+                batch.pop()
+                self._closing = True
+                break
+        return batch
+
+    def _run(self):
+        while not self._closing:
+            batch = self._collect()
+            if not batch:
+                return
+            start = time.perf_counter()
+            max_wait_ms = (start - min(enqueued for _, _, enqueued, _ in batch)) * 1000.0
+            try:
+                # Vor set_result(), solange die Aufrufer noch auf ihr Ergebnis warten
+                with shared_timings([context for _, _, _, context in batch]):
+                    results = self.process_batch([item for item, _, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"process_batch lieferte {len(results)} Ergebnisse für {len(batch)} Einträge")
+                for (_, future, _, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            inference_ms = (time.perf_counter() - start) * 1000.0
+
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["items"] += len(batch)
+                self._stats["last_batch_size"] = len(batch)
+                self._stats["last_max_wait_ms"] = max_wait_ms
+                self._stats["last_inference_ms"] = inference_ms
+            if self.metrics is not None:
+                self.metrics.observe_value("batch_size", len(batch))
+                self.metrics.observe_value("batch_wait_seconds", max_wait_ms / 1000.0)
+            log.debug("Batch verarbeitet: Größe=%d, max. Wartezeit=%.1f ms, Inferenz=%.1f ms, Warteschlange=%d",
+                      len(batch), max_wait_ms, inference_ms, self.queue_depth())
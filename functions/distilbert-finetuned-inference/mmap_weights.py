@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import torch
+
+# safetensors-Datentyp -> (numpy-Typ für die Sicht, torch-Typ falls numpy ihn nicht kennt)
+_DTYPES = {
+    "F64": (np.float64, None),
+    "F32": (np.float32, None),
+    "F16": (np.float16, None),
+    "BF16": (np.int16, torch.bfloat16),
+    "I64": (np.int64, None),
+    "I32": (np.int32, None),
+    "I16": (np.int16, None),
+    "I8": (np.int8, None),
+    "U8": (np.uint8, None),
+    "BOOL": (np.bool_, None),
+}
+_CODES = {
+    torch.float64: "F64", torch.float32: "F32", torch.float16: "F16", torch.bfloat16: "BF16",
+    torch.int64: "I64", torch.int32: "I32", torch.int16: "I16", torch.int8: "I8", torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+
+
+def save_safetensors(tensors, path):
+    """Schreibt ein {Name: Tensor}-Dict im safetensors-Format (ohne die safetensors-Bibliothek).
+
+    Der Header wird auf ein Vielfaches von 8 Bytes aufgefüllt, damit alle
+    Tensoren in der Datei ausgerichtet liegen und sich direkt einblenden lassen.
+    """
+    header, chunks, offset = {}, [], 0
+    for name, tensor in tensors.items():
+        tensor = tensor.detach().cpu().contiguous()
+        data = (tensor.view(torch.int16) if tensor.dtype == torch.bfloat16 else tensor).numpy().tobytes()
+        header[name] = {"dtype": _CODES[tensor.dtype], "shape": list(tensor.shape),
+                        "data_offsets": [offset, offset + len(data)]}
+        chunks.append(data)
+        offset += len(data)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+    with open(path, "wb") as f:
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for data in chunks:
+            f.write(data)
+
+
+def load_safetensors_mmap(path):
+    """Liest eine safetensors-Datei als Sichten auf eine einzige Speicherabbildung.
+
+    Die Tensoren zeigen direkt in die per mmap (copy-on-write) eingeblendete
+    Datei: Gelesene Seiten liegen im Page Cache und werden von allen Prozessen
+    auf demselben Node geteilt, statt pro Replica in privaten Heap kopiert zu
+    werden. Nur beschriebene Seiten würden privat, Inferenz liest aber nur.
+    """
+    with open(path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+
+    mapped = np.memmap(path, dtype=np.uint8, mode="c")
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        begin, end = info["data_offsets"]
+        np_dtype, torch_dtype = _DTYPES[info["dtype"]]
+        array = mapped[data_start + begin:data_start + end].view(np_dtype).reshape(info["shape"])
+        tensor = torch.from_numpy(array)
+        tensors[name] = tensor.view(torch_dtype) if torch_dtype is not None else tensor
+    return tensors
+
+
+def memory_usage():
+    """Speicher des Prozesses in MB: RSS, davon anonymer Heap und datei-gestützte Seiten.
+
+    Liest /proc/self/smaps_rollup (Linux). Datei-gestützte, nur gelesene Seiten
+    (z. B. per mmap geladene Gewichte) können von mehreren Prozessen geteilt
+    werden; anonyme Seiten sind privater Heap dieses Prozesses.
+    """
+    values = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    values[parts[0].rstrip(":")] = int(parts[1]) / 1024.0
+    except OSError:
+        return {}
+    return {
+        "rss_mb": round(values.get("Rss", 0.0), 1),
+        "anonymous_mb": round(values.get("Anonymous", 0.0), 1),
+        "file_backed_mb": round(values.get("Rss", 0.0) - values.get("Anonymous", 0.0), 1),
+    }
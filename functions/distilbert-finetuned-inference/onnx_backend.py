@@ -0,0 +1,48 @@
+import numpy as np
+import onnxruntime as ort
+
+
+class OnnxSequenceClassifier:
+    """ONNX-Runtime-Ersatz für die transformers-Pipeline "sentiment-analysis".
+
+    Wird mit demselben Tokenizer wie das PyTorch-Modell gefüttert und liefert
+    pro Text ein {"label", "score"}-Dict, genau wie die Pipeline.
+    """
+
+    def __init__(self, model_path, tokenizer, id2label, max_length=512, intra_op_threads=0):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads  # 0 = ONNX Runtime wählt selbst
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.tokenizer = tokenizer
+        self.labels = [id2label[i] for i in range(len(id2label))]
+        self.max_length = max_length
+        self.pad_token_id = tokenizer.pad_token_id or 0
+
+    def __call__(self, texts, batch_size=None, truncation=True, max_length=None):
+        if isinstance(texts, str):
+            texts = [texts]
+
+        enc = self.tokenizer(texts, padding=True, truncation=truncation, max_length=max_length or self.max_length,
+                             return_tensors="np")
+        return self._forward(enc["input_ids"].astype(np.int64), enc["attention_mask"].astype(np.int64))
+
+    def classify_encoded(self, input_ids):
+        """Klassifiziert bereits tokenisierte Sequenzen, gepaddet auf die längste davon."""
+        longest = max(len(ids) for ids in input_ids)
+        ids = np.full((len(input_ids), longest), self.pad_token_id, dtype=np.int64)
+        mask = np.zeros((len(input_ids), longest), dtype=np.int64)
+        for row, seq in enumerate(input_ids):
+            ids[row, :len(seq)] = seq
+            mask[row, :len(seq)] = 1
+        return self._forward(ids, mask)
+
+    def _forward(self, input_ids, attention_mask):
+        logits = self.session.run(["logits"], {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+        # Softmax über die Klassen, numerisch stabil
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        probs = exp / exp.sum(axis=-1, keepdims=True)
+        best = probs.argmax(axis=-1)
+        scores = probs[np.arange(len(best)), best]
+        return [{"label": self.labels[i], "score": s} for i, s in zip(best.tolist(), scores.tolist())]
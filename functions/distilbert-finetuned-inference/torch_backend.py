@@ -0,0 +1,71 @@
+import os
+
+import torch
+
+
+class TorchSequenceClassifier:
+    """Schlanker Ersatz für die transformers-Pipeline "sentiment-analysis".
+
+    Ruft Fast-Tokenizer und Modell direkt unter torch.inference_mode() auf;
+    Softmax und id2label-Zuordnung laufen vektorisiert für den ganzen Batch.
+    Liefert pro Text ein {"label", "score"}-Dict, genau wie die Pipeline.
+    """
+
+    def __init__(self, model, tokenizer, max_length=512):
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        id2label = model.config.id2label
+        self.labels = [id2label[i] for i in range(len(id2label))]
+        self.pad_token_id = tokenizer.pad_token_id or 0
+
+    def __call__(self, texts, batch_size=None, truncation=True, max_length=None):
+        if isinstance(texts, str):
+            texts = [texts]
+
+        enc = self.tokenizer(texts, padding=True, truncation=truncation, max_length=max_length or self.max_length,
+                             return_tensors="pt")
+        return self._forward(enc["input_ids"], enc["attention_mask"])
+
+    def classify_encoded(self, input_ids):
+        """Klassifiziert bereits tokenisierte Sequenzen, gepaddet auf die längste davon."""
+        longest = max(len(ids) for ids in input_ids)
+        ids = torch.full((len(input_ids), longest), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(input_ids), longest), dtype=torch.long)
+        for row, seq in enumerate(input_ids):
+            ids[row, :len(seq)] = torch.as_tensor(seq, dtype=torch.long)
+            mask[row, :len(seq)] = 1
+        return self._forward(ids, mask)
+
+    def _forward(self, input_ids, attention_mask):
+        with torch.inference_mode():
+            logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+            scores, best = torch.softmax(logits.float(), dim=-1).max(dim=-1)
+        labels = self.labels
+        return [{"label": labels[i], "score": s} for i, s in zip(best.tolist(), scores.tolist())]
+
+
+def load_model_mmap(model_dir, weights_file="model.safetensors"):
+    """Baut das Modell ohne eigene Gewichtskopie direkt über die per mmap eingeblendete safetensors-Datei.
+
+    Das Modell entsteht auf dem meta-Device (kein Speicher, keine
+    Zufallsinitialisierung), danach übernimmt load_state_dict(assign=True) die
+    mmap-Tensoren als Parameter. Nicht persistente Buffer (position_ids) stehen
+    nicht in der Datei und werden klein auf der CPU neu erzeugt.
+    """
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+    from .mmap_weights import load_safetensors_mmap
+
+    config = AutoConfig.from_pretrained(model_dir)
+    with torch.device("meta"):
+        model = AutoModelForSequenceClassification.from_config(config)
+    model.load_state_dict(load_safetensors_mmap(os.path.join(model_dir, weights_file)), strict=True, assign=True)
+
+    for module in model.modules():
+        buffer = module._buffers.get("position_ids")
+        if buffer is not None and buffer.is_meta:
+            module._buffers["position_ids"] = torch.arange(buffer.shape[-1]).expand(buffer.shape)
+    leftover = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers()) if tensor.is_meta]
+    if leftover:
+        raise RuntimeError(f"Nicht in '{weights_file}' enthalten: {', '.join(leftover)}")
+    return model.eval()
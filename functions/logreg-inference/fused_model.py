@@ -0,0 +1,73 @@
+"""Abhängigkeitsfreie Laufzeit für StandardScaler + LogisticRegression.
+
+Der Scaler wird beim Export in Koeffizienten und Intercept gefaltet:
+
+    ((x - mean) / scale) @ coef + b  ==  x @ (coef / scale) + (b - mean @ (coef / scale))
+
+Das Ergebnis ist ein kleines, versioniertes .npz-Artefakt, das zur Laufzeit
+nur NumPy braucht. Diese Datei wird auch von training/train_logreg.py
+importiert und darf daher keine relativen Importe enthalten.
+"""
+import numpy as np
+
+FUSED_FORMAT_VERSION = 1
+
+
+def fuse_scaler_and_logreg(scaler, clf):
+    """Faltet einen angepassten StandardScaler in eine binäre LogisticRegression."""
+    if len(clf.classes_) != 2:
+        raise ValueError(f"Nur binäre Modelle werden unterstützt, erhalten {len(clf.classes_)} Klassen")
+
+    n_features = clf.coef_.shape[1]
+    mean  = scaler.mean_  if getattr(scaler, "with_mean", True) and scaler.mean_  is not None else np.zeros(n_features)
+    scale = scaler.scale_ if getattr(scaler, "with_std", True)  and scaler.scale_ is not None else np.ones(n_features)
+
+    coef = clf.coef_[0] / scale
+    intercept = float(clf.intercept_[0] - np.dot(coef, mean))
+    return coef.astype(np.float64), intercept, np.asarray(clf.classes_)
+
+
+def save_fused_model(path, scaler, clf):
+    """Schreibt das gefaltete Modell als .npz-Artefakt nach `path`."""
+    coef, intercept, classes = fuse_scaler_and_logreg(scaler, clf)
+    np.savez(
+        path,
+        format_version=np.int64(FUSED_FORMAT_VERSION),
+        coef=coef,
+        intercept=np.float64(intercept),
+        classes=classes,
+    )
+
+
+class FusedLogisticModel:
+    """Binäre logistische Regression auf unskalierten Merkmalen, nur mit NumPy."""
+
+    def __init__(self, coef, intercept, classes):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = self.coef.shape[0]
+
+    @classmethod
+    def from_sklearn(cls, scaler, clf):
+        return cls(*fuse_scaler_and_logreg(scaler, clf))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data["format_version"])
+            if version != FUSED_FORMAT_VERSION:
+                raise ValueError(f"Unbekannte Artefakt-Version {version} in '{path}' (erwartet {FUSED_FORMAT_VERSION})")
+            return cls(data["coef"], data["intercept"], data["classes"])
+
+    def decision_function(self, X):
+        return X @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        z = self.decision_function(X)
+        # Numerisch stabile Sigmoid-Funktion: 1 / (1 + exp(-z))
+        p1 = np.exp(-np.logaddexp(0.0, -z))
+        return np.column_stack((1.0 - p1, p1))
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(np.intp)]
@@ -1,42 +1,202 @@
 import os
+import sys
 import json
-import joblib
+import logging
+import time
 import numpy as np
 
-# Arbeitsverzeichnis im Container ist /home/app
-# function/ liegt also unter /home/app/function
-BASE_DIR = os.getcwd()                  # "/home/app"
-FUNC_DIR = os.path.join(BASE_DIR, "function")
+from .fused_model import FusedLogisticModel
+from .inference_executor import InferenceExecutor, InferenceRejectedError, parse_duration, rejected_response, request_deadline
+from .log_pipeline import body_summary, configure_logging, debug_enabled, dropped_records, sample_request
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, add_headers, register_executor, response_status
 
-# Lade Modell und Scaler global
+# Konfiguration aus der Umgebung; im Multi-Modell-Host (host/model_host.py) übergibt der Host
+# die Umgebung jeder Funktion als Attribut ENVIRONMENT des Pakets, statt os.environ zu verändern
+ENV = getattr(sys.modules.get(__package__), "ENVIRONMENT", os.environ)
+
+# Strukturiertes, asynchrones Logging (siehe log_pipeline.py): LOG_LEVEL, LOG_SAMPLE_RATE, LOG_BODIES
+configure_logging(__package__)
+log = logging.getLogger(__name__)
+
+# Arbeitsverzeichnis im Container ist /home/app, function/ liegt unter /home/app/function.
+# Pfade relativ zu dieser Datei, damit auch der Multi-Modell-Host (host/model_host.py)
+# mit anderem Arbeitsverzeichnis die Artefakte findet
+FUNC_DIR = os.path.dirname(os.path.abspath(__file__))   # "/home/app/function"
+
+# Bevorzugt: gefaltetes NumPy-Artefakt (siehe training/train_logreg.py)
+FUSED_MODEL_PATH = os.path.join(FUNC_DIR, "logistic_diabetes_model.npz")
+# Legacy: getrennte joblib-Pickles, brauchen scikit-learn zur Laufzeit
 MODEL_PATH  = os.path.join(FUNC_DIR, "logistic_diabetes_model.joblib")
 SCALER_PATH = os.path.join(FUNC_DIR, "scaler.joblib")
 
-MODEL  = joblib.load(MODEL_PATH)
-SCALER = joblib.load(SCALER_PATH)
+# MODEL arbeitet auf unskalierten Merkmalen und bietet
+# predict_proba(), classes_ und n_features_in_
+MODEL = None
+
+# Begrenzter Inferenz-Executor: INFERENCE_WORKERS Threads, höchstens
+# INFERENCE_MAX_QUEUE wartende Requests (darüber sofort 429 mit Retry-After).
+INFERENCE_WORKERS = int(ENV.get("INFERENCE_WORKERS", "1"))
+INFERENCE_MAX_QUEUE = int(ENV.get("INFERENCE_MAX_QUEUE", "64"))
+# Frist pro Request: REQUEST_TIMEOUT, sonst exec_timeout der Funktion; der Header
+# X-Request-Timeout-Ms kann sie verkürzen. Abgelaufene Requests werden nicht mehr
+# gerechnet und mit 503 und Retry-After beantwortet.
+REQUEST_TIMEOUT_S = parse_duration(ENV.get("REQUEST_TIMEOUT") or ENV.get("exec_timeout"))
+EXECUTOR = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_MAX_QUEUE, name="logreg-inference")
+
+# Instrumentierung (siehe metrics.py): Histogramme je Verarbeitungsschritt, per GET auf
+# METRICS_PATH im Prometheus-Format abrufbar; SERVER_TIMING "1" hängt die Schritte des
+# Requests zusätzlich als Server-Timing-Header an die Antwort.
+METRICS_ENABLED = ENV.get("METRICS_ENABLED", "1") == "1"
+METRICS_PATH = ENV.get("METRICS_PATH", "/metrics")
+SERVER_TIMING = ENV.get("SERVER_TIMING", "0") == "1"
+METRICS = Metrics(enabled=METRICS_ENABLED)
+register_executor(METRICS, EXECUTOR)
+METRICS.register_value("log_dropped_total", "Wegen vollen Log-Puffers verworfene Log-Einträge.",
+                       lambda: dropped_records(__package__), "counter")
+
+def load_model():
+    """Lädt das Modell einmalig beim Import.
+
+    scikit-learn wird nur importiert, wenn ausschließlich die
+    joblib-Dateien vorhanden sind.
+    """
+    global MODEL
+    start_time = time.time()
+    try:
+        if os.path.exists(FUSED_MODEL_PATH):
+            MODEL = FusedLogisticModel.load(FUSED_MODEL_PATH)
+            source = FUSED_MODEL_PATH
+        else:
+            import joblib
+            from sklearn.pipeline import make_pipeline
+            MODEL = make_pipeline(joblib.load(SCALER_PATH), joblib.load(MODEL_PATH))
+            source = f"{SCALER_PATH} + {MODEL_PATH}"
+        log.info(f"Modell aus '{source}' geladen. Dauer: {time.time() - start_time:.3f} Sekunden.")
+    except Exception as e:
+        log.exception(f"Fehler beim Laden des Modells aus '{FUNC_DIR}': {e}")
+        MODEL = None
+
+_load_start = time.perf_counter()
+load_model()
+METRICS.set_loaded(time.perf_counter() - _load_start, MODEL is not None)
+
+def parse_instances(instances, n_features):
+    """Wandelt eine Liste von Zeilen in eine (n, n_features)-Matrix um.
+
+    Gibt die Matrix, eine Maske der gültigen Zeilen und ein Dict
+    {Zeilenindex: Fehlermeldung} zurück. Ungültige Zeilen bleiben in der
+    Matrix mit Nullen belegt und werden beim Scoring übersprungen.
+    """
+    # Schneller Pfad: rechteckige, rein numerische Eingabe
+    try:
+        X = np.asarray(instances, dtype=np.float64)
+        if X.ndim == 2 and X.shape[1] == n_features and np.isfinite(X).all():
+            return X, np.ones(len(X), dtype=bool), {}
+    except (TypeError, ValueError):
+        pass
+
+    # Langsamer Pfad: Zeile für Zeile prüfen, um Fehler einzeln zu melden
+    X = np.zeros((len(instances), n_features), dtype=np.float64)
+    valid = np.zeros(len(instances), dtype=bool)
+    errors = {}
+    for i, row in enumerate(instances):
+        try:
+            values = np.asarray(row, dtype=np.float64)
+        except (TypeError, ValueError):
+            errors[i] = "Zeile enthält nicht-numerische Werte"
+            continue
+        if values.shape != (n_features,):
+            errors[i] = f"Erwartet {n_features} Merkmale, erhalten {values.size}"
+        elif not np.isfinite(values).all():
+            errors[i] = "Zeile enthält NaN oder Inf"
+        else:
+            X[i] = values
+            valid[i] = True
+    return X, valid, errors
+
+def predict_matrix(X):
+    """Bewertet alle Zeilen in einem vektorisierten Durchlauf.
+
+    Die Labels werden aus denselben Wahrscheinlichkeiten abgeleitet,
+    statt das Modell ein zweites Mal über predict() laufen zu lassen.
+    """
+    with METRICS.stage("forward"):
+        proba  = MODEL.predict_proba(X)
+        labels = MODEL.classes_[proba.argmax(axis=1)]
+    return labels, proba[:, 1]
+
+def handle_batch(instances):
+    """Bewertet {"instances": [[...], ...]}; Fehler einzelner Zeilen brechen den Batch nicht ab."""
+    if not isinstance(instances, list) or not instances:
+        raise ValueError("'instances' muss eine nicht-leere Liste von Zeilen sein")
+
+    with METRICS.stage("preprocess"):
+        X, valid, errors = parse_instances(instances, MODEL.n_features_in_)
+
+    predictions   = [None] * len(instances)
+    probabilities = [None] * len(instances)
+    if valid.any():
+        labels, proba = predict_matrix(X[valid])
+        for i, label, p in zip(np.flatnonzero(valid).tolist(), labels.tolist(), proba.tolist()):
+            predictions[i]   = int(label)
+            probabilities[i] = p
+
+    return {
+        "predictions": predictions,
+        "probabilities_of_class_1": probabilities,
+        "errors": [{"index": i, "error": msg} for i, msg in sorted(errors.items())],
+    }
 
 def handle(event, context):
+    """Einstiegspunkt: GET auf METRICS_PATH liefert die Metriken, alles andere ist ein Vorhersage-Request."""
+    if getattr(event, "path", None) == METRICS_PATH and getattr(event, "method", "GET") == "GET":
+        return METRICS.render(), 200, {"Content-Type": METRICS_CONTENT_TYPE}
+    request = METRICS.start_request()
+    sample_request()
+    response = handle_request(event, context)
+    server_timing = METRICS.finish_request(request, response_status(response))
+    return add_headers(response, {"Server-Timing": server_timing}) if SERVER_TIMING and server_timing else response
+
+def handle_request(event, context):
+    # Frist ab Eingang des Requests, nicht erst ab Beginn der Inferenz
+    deadline = request_deadline(getattr(event, "headers", None), REQUEST_TIMEOUT_S)
     try:
-        # Debug-Ausgabe (optional, um Body zu sehen)
-        print("BODY:", event.body)
+        with METRICS.stage("read"):
+            body = event.body
+
+        # Body nur mit LOG_BODIES=1 (gekürzt), sonst nur seine Länge
+        if debug_enabled(log):
+            log.debug("Request erhalten", extra=body_summary(body))
 
-        data = json.loads(event.body)
-        features = np.array([data["features"]])
+        with METRICS.stage("decode"):
+            data = json.loads(body)
 
-        # Sicherheits-Check (eigentlich redundant, MODEL ist geladen)
-        if MODEL is None or SCALER is None:
-            raise RuntimeError("Modell oder Scaler fehlt")
+        # Sicherheits-Check
+        if MODEL is None:
+            raise RuntimeError("Modell fehlt")
+
+        # Batch-Modus: viele Zeilen in einem Aufruf
+        if "instances" in data:
+            result = EXECUTOR.run(METRICS.queued(handle_batch), data["instances"], deadline=deadline)
+            with METRICS.stage("serialize"):
+                return json.dumps(result)
+
+        with METRICS.stage("preprocess"):
+            features = np.array([data["features"]], dtype=np.float64)
 
         # Inferenz
-        X_scaled = SCALER.transform(features)
-        pred     = MODEL.predict(X_scaled)[0]
-        proba    = MODEL.predict_proba(X_scaled)[0][1]
-
-        return json.dumps({
-            "prediction": int(pred),
-            "probability_of_class_1": float(proba)
-        })
+        labels, proba = EXECUTOR.run(METRICS.queued(predict_matrix), features, deadline=deadline)
+
+        with METRICS.stage("serialize"):
+            return json.dumps({
+                "prediction": int(labels[0]),
+                "probability_of_class_1": float(proba[0])
+            })
+    except InferenceRejectedError as rejected:
+        # Einzelne Ablehnungen nur im DEBUG-Log, die Anzahl steht in den Metriken
+        log.debug("Request abgelehnt (%d): %s, Executor: %s", rejected.status, rejected, EXECUTOR.stats())
+        return rejected_response(rejected)
     except Exception as e:
-        # Logs ausgeben und Fehler zurückgeben
-        print("EXCEPTION:", str(e))
+        # Logs (mit Traceback) ausgeben und Fehler zurückgeben
+        log.exception("EXCEPTION: %s", e)
         return json.dumps({"error": str(e)})
@@ -1,10 +1,228 @@
+import io
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from . import handler
+from .fused_model import FusedLogisticModel, save_fused_model
 from .handler import handle
+from .inference_executor import (DeadlineExceededError, ExecutorQueueFullError, InferenceExecutor,
+                                 rejected_response)
+from .log_pipeline import body_summary, configure_logging, flush_logging, sample_request
+from .metrics import Metrics
 
 # Test your handler here
 
 # To disable testing, you can set the build_arg `TEST_ENABLED=false` on the CLI or in your stack.yml
 # https://docs.openfaas.com/reference/yaml/#function-build-args-build-args
 
-def test_handle():
-    # assert handle("input") == "input"
-    pass
+
+class FakeEvent:
+    def __init__(self, payload, headers=None, path="/", method="POST"):
+        self.body = json.dumps(payload)
+        self.headers = headers or {}
+        self.path = path
+        self.method = method
+
+
+def _fit_pipeline(n_features=8, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, n_features)) * 10 + 50
+    y = (X[:, 1] + rng.normal(size=200) > 50).astype(int)
+    scaler = StandardScaler().fit(X)
+    clf = LogisticRegression(max_iter=1000).fit(scaler.transform(X), y)
+    return scaler, clf, X
+
+
+def _install(monkeypatch, scaler, clf):
+    monkeypatch.setattr(handler, "MODEL", make_pipeline(scaler, clf))
+
+
+def test_handle_single_features(monkeypatch):
+    scaler, clf, X = _fit_pipeline()
+    _install(monkeypatch, scaler, clf)
+
+    result = json.loads(handle(FakeEvent({"features": X[0].tolist()}), None))
+
+    X_scaled = scaler.transform(X[:1])
+    assert result["prediction"] == int(clf.predict(X_scaled)[0])
+    assert np.isclose(result["probability_of_class_1"], clf.predict_proba(X_scaled)[0][1])
+
+
+def test_handle_batch_matches_per_row(monkeypatch):
+    scaler, clf, X = _fit_pipeline()
+    _install(monkeypatch, scaler, clf)
+
+    result = json.loads(handle(FakeEvent({"instances": X[:50].tolist()}), None))
+
+    X_scaled = scaler.transform(X[:50])
+    assert result["errors"] == []
+    assert result["predictions"] == clf.predict(X_scaled).tolist()
+    assert np.allclose(result["probabilities_of_class_1"], clf.predict_proba(X_scaled)[:, 1])
+
+
+def test_handle_batch_reports_row_errors(monkeypatch):
+    scaler, clf, X = _fit_pipeline()
+    _install(monkeypatch, scaler, clf)
+    rows = [X[0].tolist(), [1.0, 2.0], ["a"] * 8, X[1].tolist()]
+
+    result = json.loads(handle(FakeEvent({"instances": rows}), None))
+
+    assert [e["index"] for e in result["errors"]] == [1, 2]
+    assert result["predictions"][1] is None and result["predictions"][2] is None
+    assert result["predictions"][0] is not None and result["predictions"][3] is not None
+
+
+def test_fused_model_matches_sklearn_pipeline(tmp_path):
+    scaler, clf, X = _fit_pipeline(n_features=10, seed=1)
+    path = tmp_path / "model.npz"
+    save_fused_model(path, scaler, clf)
+
+    fused = FusedLogisticModel.load(path)
+
+    X_scaled = scaler.transform(X)
+    assert np.array_equal(fused.predict(X), clf.predict(X_scaled))
+    assert np.allclose(fused.predict_proba(X), clf.predict_proba(X_scaled), rtol=0, atol=1e-12)
+
+
+def test_handle_with_fused_model(monkeypatch):
+    scaler, clf, X = _fit_pipeline()
+    monkeypatch.setattr(handler, "MODEL", FusedLogisticModel.from_sklearn(scaler, clf))
+
+    result = json.loads(handle(FakeEvent({"instances": X[:20].tolist()}), None))
+
+    assert result["predictions"] == clf.predict(scaler.transform(X[:20])).tolist()
+
+
+def _blocked_executor(max_queue):
+    """Executor mit einem Worker, der bis release.set() blockiert ist."""
+    executor = InferenceExecutor(workers=1, max_queue=max_queue)
+    release, started = threading.Event(), threading.Event()
+    executor.submit(lambda: (started.set(), release.wait()))
+    started.wait(timeout=5)
+    return executor, release
+
+
+def test_executor_rejects_with_429_when_queue_full():
+    executor, release = _blocked_executor(max_queue=1)
+    executor.submit(lambda: None)
+
+    with pytest.raises(ExecutorQueueFullError) as rejected:
+        executor.submit(lambda: None)
+    release.set()
+    body, status, headers = rejected_response(rejected.value)
+
+    assert status == 429
+    assert int(headers["Retry-After"]) >= 1
+    assert executor.stats()["rejected"] == 1
+
+
+def test_executor_drops_work_whose_deadline_expired_in_queue():
+    executor, release = _blocked_executor(max_queue=4)
+    calls = []
+    future = executor.submit(calls.append, "lief", deadline=time.monotonic() + 0.01)
+    time.sleep(0.05)
+    release.set()
+
+    with pytest.raises(DeadlineExceededError):
+        future.result(timeout=5)
+    assert calls == []
+    assert executor.stats()["expired"] == 1
+
+
+def test_executor_shutdown_finishes_queued_work_and_stops_workers():
+    executor, release = _blocked_executor(max_queue=4)
+    future = executor.submit(lambda: "fertig")
+    release.set()
+    executor.shutdown()
+
+    assert future.result(timeout=0) == "fertig"
+    assert not any(thread.is_alive() for thread in executor._threads)
+
+
+def test_handle_returns_503_for_expired_request_deadline(monkeypatch):
+    scaler, clf, X = _fit_pipeline()
+    _install(monkeypatch, scaler, clf)
+    executor, release = _blocked_executor(max_queue=4)
+    monkeypatch.setattr(handler, "EXECUTOR", executor)
+
+    try:
+        body, status, headers = handle(FakeEvent({"features": X[0].tolist()}, {"X-Request-Timeout-Ms": "20"}), None)
+    finally:
+        release.set()
+
+    assert status == 503
+    assert "Retry-After" in headers and "error" in json.loads(body)
+
+
+def test_metrics_route_exposes_stage_histograms(monkeypatch):
+    scaler, clf, X = _fit_pipeline()
+    _install(monkeypatch, scaler, clf)
+    metrics = Metrics()
+    metrics.set_loaded(0.25, True)
+    monkeypatch.setattr(handler, "METRICS", metrics)
+
+    handle(FakeEvent({"instances": X[:5].tolist()}), None)
+    body, status, headers = handle(FakeEvent(None, path="/metrics", method="GET"), None)
+
+    assert status == 200 and headers["Content-Type"].startswith("text/plain")
+    assert "inference_model_ready 1" in body
+    assert "inference_model_load_seconds 0.250000" in body
+    assert 'inference_responses_total{status="200"} 1' in body
+    for stage in ("read", "decode", "queue", "preprocess", "forward", "serialize"):
+        assert f'inference_stage_duration_seconds_count{{stage="{stage}"}} 1' in body
+    assert 'inference_stage_duration_seconds_bucket{stage="forward",le="+Inf"} 1' in body
+
+
+def test_server_timing_header_lists_stages(monkeypatch):
+    scaler, clf, X = _fit_pipeline()
+    _install(monkeypatch, scaler, clf)
+    monkeypatch.setattr(handler, "METRICS", Metrics())
+    monkeypatch.setattr(handler, "SERVER_TIMING", True)
+
+    body, status, headers = handle(FakeEvent({"features": X[0].tolist()}), None)
+
+    stages = [entry.split(";")[0] for entry in headers["Server-Timing"].split(", ")]
+    assert status == 200 and "prediction" in json.loads(body)
+    assert stages[-1] == "total" and {"queue", "forward", "serialize"} <= set(stages)
+
+
+def test_log_pipeline_samples_debug_and_keeps_tracebacks():
+    stream = io.StringIO()
+    log = configure_logging("log-pipeline-test", level="DEBUG", stream=stream)
+
+    sample_request(rate=0.0)
+    log.debug("nicht gesampelt")
+    sample_request(rate=1.0)
+    log.debug("gesampelt", extra=body_summary(b'{"features": [1, 2]}'))
+    try:
+        raise ValueError("kaputt")
+    except ValueError:
+        log.exception("Fehler")
+    flush_logging("log-pipeline-test")
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [entry["msg"] for entry in entries] == ["gesampelt", "Fehler"]
+    assert entries[0]["body_bytes"] == 20 and "body" not in entries[0]
+    assert entries[1]["level"] == "ERROR" and "ValueError: kaputt" in entries[1]["traceback"]
+    assert logging.getLogger("log-pipeline-test").propagate is False
+
+
+def test_log_pipeline_falls_back_to_info_for_unknown_level():
+    stream = io.StringIO()
+    log = configure_logging("log-pipeline-level-test", level="verbose", stream=stream)
+
+    log.debug("unterdrückt")
+    log.info("sichtbar")
+    flush_logging("log-pipeline-level-test")
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert entries[0]["level"] == "WARNING" and "VERBOSE" in entries[0]["msg"]
+    assert [entry["msg"] for entry in entries[1:]] == ["sichtbar"]
@@ -0,0 +1,198 @@
+import contextvars
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class InferenceRejectedError(Exception):
+    """Basisklasse: der Request wird ohne Inferenz mit `status` und Retry-After beantwortet."""
+
+    status = 503
+
+    def __init__(self, message, retry_after_s=1):
+        super().__init__(message)
+        self.retry_after_s = max(1, int(math.ceil(retry_after_s)))
+
+
+class ExecutorQueueFullError(InferenceRejectedError):
+    """Die Warteschlange des Executors ist voll (429, damit der Autoscaler hochskaliert)."""
+
+    status = 429
+
+
+class DeadlineExceededError(InferenceRejectedError):
+    """Die Frist des Requests ist abgelaufen, bevor seine Inferenz starten konnte."""
+
+    status = 503
+
+
+def rejected_response(error):
+    """Antwort-Tupel (Body, Status, Header) für eine abgelehnte Anfrage."""
+    return (json.dumps({"error": str(error), "retry_after_s": error.retry_after_s}), error.status,
+            {"Retry-After": str(error.retry_after_s)})
+
+
+def parse_duration(value):
+    """Dauer im Format der OpenFaaS-Timeouts ("120s", "2m", "500ms", "30") in Sekunden; leer -> None."""
+    value = (value or "").strip().lower()
+    if not value:
+        return None
+    for suffix, factor in (("ms", 0.001), ("s", 1.0), ("m", 60.0), ("h", 3600.0)):
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * factor
+    return float(value)
+
+
+def container_cpu_limit():
+    """CPU-Limit des Containers aus der cgroup (v2, sonst v1), sonst os.cpu_count()."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return max(1, math.ceil(quota / period))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+def request_deadline(headers, default_timeout_s=None, header="X-Request-Timeout-Ms"):
+    """Absolute Frist (time.monotonic()) eines Requests oder None (keine Frist).
+
+    Der Header `header` (Millisekunden) kann die Standardfrist nur verkürzen,
+    nicht über den Timeout des Gateways hinaus verlängern.
+    """
+    timeouts = [default_timeout_s] if default_timeout_s else []
+    value = None
+    if headers:
+        value = headers.get(header) or headers.get(header.lower())
+    if value:
+        try:
+            timeouts.append(float(value) / 1000.0)
+        except ValueError:
+            pass
+    return time.monotonic() + min(timeouts) if timeouts else None
+
+
+class InferenceExecutor:
+    """Begrenzter Thread-Pool für Inferenz mit fester Warteschlange und Fristen.
+
+    `workers` Threads arbeiten Aufträge aus einer Warteschlange mit höchstens
+    `max_queue` Einträgen ab. Ist sie voll, lehnt submit() sofort mit
+    ExecutorQueueFullError ab, statt den Request bis zum Gateway-Timeout
+    warten zu lassen. Aufträge, deren Frist beim Herausnehmen abgelaufen ist,
+    werden verworfen, ohne zu rechnen. Retry-After wird aus Warteschlangenlänge,
+    mittlerer Bearbeitungszeit und Anzahl der Worker geschätzt. Aufträge laufen
+    im contextvars-Kontext des einreichenden Threads (z. B. für Request-Metriken).
+    """
+
+    def __init__(self, workers=1, max_queue=16, name="inference-executor"):
+        self.workers = max(1, int(workers))
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stats_lock = threading.Lock()
+        self._avg_service_s = None
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "expired": 0, "busy": 0}
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, deadline=None):
+        """Reiht fn(*args) ein und gibt ein Future zurück; `deadline` ist ein time.monotonic()-Zeitpunkt."""
+        future = Future()
+        try:
+            self._queue.put_nowait((fn, args, future, deadline, contextvars.copy_context()))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise ExecutorQueueFullError(f"Inferenz-Warteschlange voll ({self._queue.maxsize} Einträge)",
+                                         self.retry_after_s())
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+        return future
+
+    def run(self, fn, *args, deadline=None):
+        """submit() und auf das Ergebnis warten, höchstens bis zur Frist.
+
+        Läuft die Frist ab, während der Auftrag noch wartet, wird er
+        zurückgezogen. Hat er bereits begonnen, rechnet er zu Ende, sein
+        Ergebnis wird aber verworfen (torch lässt sich nicht unterbrechen).
+        """
+        future = self.submit(fn, *args, deadline=deadline)
+        try:
+            return future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            if future.cancel():
+                with self._stats_lock:
+                    self._stats["expired"] += 1
+            raise DeadlineExceededError("Frist des Requests abgelaufen", self.retry_after_s())
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def shutdown(self, wait=True):
+        """Beendet die Worker, nachdem sie die bereits eingereihten Aufträge abgearbeitet haben."""
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def retry_after_s(self):
+        """Geschätzte Sekunden, bis die aktuelle Warteschlange abgearbeitet ist (mindestens 1)."""
+        with self._stats_lock:
+            service_s = self._avg_service_s or 0.0
+        return max(1.0, (self.queue_depth() + self.workers) * service_s / self.workers)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["avg_service_ms"] = (self._avg_service_s or 0.0) * 1000.0
+        stats["queue_depth"] = self.queue_depth()
+        stats["workers"] = self.workers
+        return stats
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None: # shutdown()
+                return
+            fn, args, future, deadline, context = job
+            if not future.set_running_or_notify_cancel():
+                continue # vom wartenden Request bereits zurückgezogen
+            if deadline is not None and time.monotonic() >= deadline:
+                with self._stats_lock:
+                    self._stats["expired"] += 1
+                future.set_exception(DeadlineExceededError("Frist vor Beginn der Inferenz abgelaufen",
+                                                           self.retry_after_s()))
+                continue
+
+            with self._stats_lock:
+                self._stats["busy"] += 1
+            start = time.perf_counter()
+            try:
+                future.set_result(context.run(fn, *args))
+                outcome = "completed"
+            except Exception as e:
+                future.set_exception(e)
+                outcome = "failed"
+            service_s = time.perf_counter() - start
+
+            with self._stats_lock:
+                self._stats["busy"] -= 1
+                self._stats[outcome] += 1
+                # Gleitender Mittelwert für die Retry-After-Schätzung
+                self._avg_service_s = service_s if self._avg_service_s is None else \
+                    0.8 * self._avg_service_s + 0.2 * service_s
@@ -0,0 +1,96 @@
+import json
+import os
+
+import torch
+
+try:
+    from .mmap_weights import load_safetensors_mmap, save_safetensors
+except ImportError:  # als Top-Level-Modul importiert (training/export_yolov5_torchscript.py)
+    from mmap_weights import load_safetensors_mmap, save_safetensors
+
+# Version 2: Graph ohne Gewichte als TorchScript, Gewichte daneben als safetensors (mmap)
+FROZEN_FORMAT_VERSION = 2
+# Metadaten (Klassennamen, Stride, Export-Größe) liegen als JSON im TorchScript-Archiv
+_META_FILE = "meta.json"
+
+
+def weights_path(path):
+    """Pfad der safetensors-Gewichte zu einem TorchScript-Artefakt."""
+    return os.path.splitext(path)[0] + ".safetensors"
+
+
+def _set_tensor(module, name, tensor):
+    *parents, leaf = name.split(".")
+    for parent in parents:
+        module = getattr(module, parent)
+    setattr(module, leaf, tensor)
+
+
+class _InferenceOutput(torch.nn.Module):
+    """Gibt nur die Inferenz-Ausgabe (B, N, 5 + nc) zurück, als 1-Tupel wie MODEL(x)[0] es erwartet."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return (self.model(x)[0],)
+
+
+def freeze_detection_model(model, imgsz=640):
+    """Erzeugt aus einem eager DetectionModel ein getractes TorchScript-Modul mit festem Graph.
+
+    Conv+BN werden über model.fuse() zusammengelegt (sofern vorhanden). Detect-
+    Köpfe werden auf dynamic gesetzt, damit das Grid zur Laufzeit aus der
+    Eingabegröße entsteht und das Artefakt auch für andere Vielfache des
+    Strides als imgsz funktioniert. Auf torch.jit.freeze wird verzichtet: es
+    würde die Gewichte als Konstanten in den Graph einbetten, so bleiben sie
+    Attribute und können getrennt per mmap geladen werden (bei gleicher Latenz).
+    """
+    model = model.float().eval()
+    if hasattr(model, "fuse"):
+        model = model.fuse()
+    for module in model.modules():
+        if hasattr(module, "dynamic"):
+            module.dynamic = True
+
+    example = torch.zeros((1, 3, imgsz, imgsz))
+    with torch.no_grad():
+        return torch.jit.trace(_InferenceOutput(model).eval(), example, strict=False)
+
+
+def save_frozen_model(frozen, path, names, stride, imgsz):
+    """Schreibt den Graph nach `path` und die Gewichte nach weights_path(path)."""
+    meta = {
+        "format_version": FROZEN_FORMAT_VERSION,
+        "names": names if isinstance(names, list) else [names[i] for i in sorted(names)],
+        "stride": int(stride),
+        "imgsz": int(imgsz),
+    }
+    state = {name: tensor.detach().clone() for name, tensor in frozen.state_dict().items()}
+    save_safetensors(state, weights_path(path))
+
+    # Gewichte nur für das Speichern leeren, damit sie nicht zusätzlich im Archiv landen
+    for name in state:
+        _set_tensor(frozen, name, torch.empty(0))
+    try:
+        torch.jit.save(frozen, path, _extra_files={_META_FILE: json.dumps(meta)})
+    finally:
+        for name, tensor in state.items():
+            _set_tensor(frozen, name, tensor)
+
+
+def load_frozen_model(path):
+    """Lädt ein mit save_frozen_model gespeichertes Artefakt; gibt (Modell, Metadaten) zurück.
+
+    Die Gewichte werden nicht kopiert, sondern zeigen in die per mmap
+    eingeblendete safetensors-Datei (geteilt über den Page Cache).
+    """
+    extra_files = {_META_FILE: ""}
+    model = torch.jit.load(path, map_location="cpu", _extra_files=extra_files)
+    meta = json.loads(extra_files[_META_FILE])
+    if meta.get("format_version") != FROZEN_FORMAT_VERSION:
+        raise ValueError(f"Nicht unterstützte Artefakt-Version {meta.get('format_version')} in '{path}'")
+    for name, tensor in load_safetensors_mmap(weights_path(path)).items():
+        _set_tensor(model, name, tensor)
+    return model.eval(), meta
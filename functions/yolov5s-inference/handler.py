@@ -1,74 +1,193 @@
 import torch
 import json
 import base64
-from io import BytesIO
-from PIL import Image
+import binascii
+import contextlib
+import logging
 import os
 import time
-import traceback
 import sys
-from torchvision import transforms
 
-# Importiere NMS und andere Utilities direkt aus dem lokalen YOLOv5-Repo
-# Dies setzt voraus, dass LOCAL_YOLO_REPO_PATH korrekt zu sys.path hinzugefügt wurde
-# und die utils/general.py etc. im Repo vorhanden sind.
-# Der Import muss nach der sys.path-Modifikation in load_model_pipeline erfolgen,
-# daher verschieben wir ihn dorthin oder machen ihn dynamisch.
+from .frozen_model import load_frozen_model, weights_path
+from .image_upload import BufferReader, extract_multipart_file, extract_multipart_files, get_content_type, media_type
+from .inference_executor import (InferenceExecutor, InferenceRejectedError, container_cpu_limit, parse_duration,
+                                 rejected_response, request_deadline)
+from .log_pipeline import body_summary, configure_logging, debug_enabled, dropped_records, sample_request
+from .metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, add_headers, register_batcher, register_executor,
+                      response_status)
+from .micro_batcher import MicroBatcher
+from .mmap_weights import memory_usage
+from .nms import non_max_suppression as standalone_nms
+from .postprocessing import OUTPUT_FORMATS, build_class_name_table, scale_boxes_to_original, serialize_detections
+from .preprocessing import batch_buffer, preprocess_image, preprocess_into
+from .resolution_policy import ResolutionPolicy, parse_sizes, parse_thresholds
+
+# Konfiguration aus der Umgebung; im Multi-Modell-Host (host/model_host.py) übergibt der Host
+# die Umgebung jeder Funktion als Attribut ENVIRONMENT des Pakets, statt os.environ zu verändern
+ENV = getattr(sys.modules.get(__package__), "ENVIRONMENT", os.environ)
+
+# Strukturiertes, asynchrones Logging (siehe log_pipeline.py): LOG_LEVEL, LOG_SAMPLE_RATE, LOG_BODIES
+configure_logging(__package__)
+log = logging.getLogger(__name__)
+
+# NMS: im TorchScript-Backend die eigenständige Implementierung aus nms.py, im
+# Hub-Backend utils.general.non_max_suppression aus dem lokalen YOLOv5-Repo. Der
+# Repo-Import muss nach der sys.path-Modifikation in load_hub_model erfolgen.
 non_max_suppression = None # Wird in load_model_pipeline initialisiert
 
 MODEL = None
+CLASS_NAMES = [] # class_id -> Name, einmalig beim Laden aus MODEL.names erzeugt
 MODEL_VARIANT_NAME = 'yolov5s'
-EXPECTED_IMG_SIZE = 640
+EXPECTED_IMG_SIZE = 640 # Standardgröße, wenn der Request kein imgsz angibt
+MODEL_STRIDE = 32 # größter Stride des Modells, wird beim Laden gesetzt
 
 _HANDLER_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 _YOLO_REPO_SUBDIR_NAME = 'yolov5_local_repo'
 LOCAL_YOLO_REPO_PATH = os.path.join(_HANDLER_SCRIPT_DIR, _YOLO_REPO_SUBDIR_NAME)
 MODEL_WEIGHTS_NAME = f'{MODEL_VARIANT_NAME}.pt'
 MODEL_WEIGHTS_PATH = os.path.join(LOCAL_YOLO_REPO_PATH, MODEL_WEIGHTS_NAME)
+# Eingefrorenes TorchScript-Modell (Conv+BN fusioniert), erzeugt mit training/export_yolov5_torchscript.py;
+# die Gewichte liegen daneben als yolov5s.safetensors und werden per mmap eingeblendet
+FROZEN_MODEL_PATH = os.path.join(_HANDLER_SCRIPT_DIR, f'{MODEL_VARIANT_NAME}.torchscript')
+
+# Laufzeit: "torchscript" lädt nur FROZEN_MODEL_PATH plus die eigenständige NMS aus nms.py
+# (fehlt das Artefakt, wird auf "hub" zurückgefallen); "hub" baut das Modell wie
+# bisher eager über torch.hub aus dem lokalen YOLOv5-Repo.
+INFERENCE_BACKEND = ENV.get("INFERENCE_BACKEND", "torchscript")
+
+
+# Intra-Op-Threads: Standard ist das CPU-Limit des Containers (limits.cpu in der yml),
+# nicht die Kernzahl des Nodes, die torch sonst verwenden würde.
+INFERENCE_THREADS = int(ENV.get("INFERENCE_THREADS", "0")) or container_cpu_limit()
+# Umschließt jeden Forward-Pass; im Multi-Modell-Host ersetzt durch eine mit den anderen
+# torch-Modellen geteilte Begrenzung gleichzeitiger Forward-Passes (host/model_host.py)
+FORWARD_GATE = contextlib.nullcontext()
+
+# Parameter für NMS (können angepasst werden, dies sind gängige Defaults)
+CONF_THRES = 0.25    # Konfidenz-Schwellenwert
+IOU_THRES = 0.45     # IoU-Schwellenwert für NMS
+CLASSES = None       # Filtere nach bestimmten Klassen (None für alle)
+AGNOSTIC_NMS = False # Klassen-agnostisches NMS
+MAX_DET = 1000       # Maximale Anzahl Detektionen pro Bild
+
+# Mehrere Bilder pro Request ({"images": [...]} bzw. mehrere multipart-Felder "images")
+MAX_IMAGES_PER_REQUEST = int(ENV.get("MAX_IMAGES_PER_REQUEST", "8"))
+
+# Micro-Batching über gleichzeitige Einzelbild-Requests (siehe yolov5s-inference.yml)
+# BATCH_MAX_SIZE <= 1 deaktiviert das Batching, jeder Request läuft dann einzeln.
+BATCH_MAX_SIZE = int(ENV.get("BATCH_MAX_SIZE", "1"))
+BATCH_WINDOW_MS = float(ENV.get("BATCH_WINDOW_MS", "5"))
+BATCH_MAX_QUEUE = int(ENV.get("BATCH_MAX_QUEUE", "64"))
+BATCHER = None
+
+# Begrenzter Inferenz-Executor: Dekodieren und Inferenz laufen in INFERENCE_WORKERS
+# Threads, höchstens INFERENCE_MAX_QUEUE Requests warten (darüber sofort 429 mit
+# Retry-After). Ohne Angabe ein Worker bzw. BATCH_MAX_SIZE Worker, damit sich ein
+# Micro-Batch füllen kann; die Intra-Op-Threads nutzen die CPUs bereits aus.
+INFERENCE_WORKERS = int(ENV.get("INFERENCE_WORKERS", "0")) or max(1, BATCH_MAX_SIZE)
+INFERENCE_MAX_QUEUE = int(ENV.get("INFERENCE_MAX_QUEUE", "16"))
+# Frist pro Request: REQUEST_TIMEOUT, sonst exec_timeout der Funktion; der Header
+# X-Request-Timeout-Ms kann sie verkürzen. Abgelaufene Requests werden nicht mehr
+# gerechnet und mit 503 und Retry-After beantwortet.
+REQUEST_TIMEOUT_S = parse_duration(ENV.get("REQUEST_TIMEOUT") or ENV.get("exec_timeout"))
+EXECUTOR = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_MAX_QUEUE, name="yolo-inference")
+
+# Instrumentierung (siehe metrics.py): Histogramme je Verarbeitungsschritt, per GET auf
+# METRICS_PATH im Prometheus-Format abrufbar; SERVER_TIMING "1" hängt die Schritte des
+# Requests zusätzlich als Server-Timing-Header an die Antwort.
+METRICS_ENABLED = ENV.get("METRICS_ENABLED", "1") == "1"
+METRICS_PATH = ENV.get("METRICS_PATH", "/metrics")
+SERVER_TIMING = ENV.get("SERVER_TIMING", "0") == "1"
+METRICS = Metrics(enabled=METRICS_ENABLED)
+register_executor(METRICS, EXECUTOR)
+METRICS.register_value("log_dropped_total", "Wegen vollen Log-Puffers verworfene Log-Einträge.",
+                       lambda: dropped_records(__package__), "counter")
+
+# Eingabegrößen, die ein Request per imgsz (Query oder JSON-Feld) wählen darf;
+# nur Vielfache von MODEL_STRIDE werden übernommen
+IMG_SIZES = parse_sizes(ENV.get("IMG_SIZES", "320,416,512,640"))
+# Lastabhängige Auflösung: jede erreichte Schwelle senkt die Größe um eine Stufe aus
+# IMG_SIZES. Leer = Kriterium aus (siehe yolov5s-inference.yml).
+ADAPTIVE_QUEUE_DEPTHS = parse_thresholds(ENV.get("ADAPTIVE_QUEUE_DEPTHS", ""))
+ADAPTIVE_LATENCY_MS = parse_thresholds(ENV.get("ADAPTIVE_LATENCY_MS", ""))
+ADAPTIVE_LATENCY_WINDOW = int(ENV.get("ADAPTIVE_LATENCY_WINDOW", "20"))
+RESOLUTION_POLICY = None
+
+def load_frozen_runtime():
+    """Lädt das eingefrorene TorchScript-Modell; kein YOLOv5-Repo, kein torch.hub, kein sys.path."""
+    global MODEL, CLASS_NAMES, MODEL_STRIDE, non_max_suppression
+    start_time = time.time()
+    memory_before = memory_usage()
+    try:
+        MODEL, meta = load_frozen_model(FROZEN_MODEL_PATH)
+        CLASS_NAMES = build_class_name_table(meta["names"])
+        MODEL_STRIDE = meta["stride"]
+        non_max_suppression = standalone_nms
+        log.info(f"YOLOv5 Modell '{MODEL_VARIANT_NAME}' als TorchScript aus '{FROZEN_MODEL_PATH}' geladen "
+                 f"(Export-Größe {meta['imgsz']}, Stride {meta['stride']}, {len(CLASS_NAMES)} Klassen). "
+                 f"Dauer: {time.time() - start_time:.2f} Sekunden, Threads: {INFERENCE_THREADS}. "
+                 f"Speicher vorher {memory_before}, nachher {memory_usage()}")
+    except Exception as e:
+        log.exception(f"Fehler beim Laden des TorchScript-Modells '{FROZEN_MODEL_PATH}': {e}")
+        MODEL = None
 
-preprocess_transform = transforms.Compose([
-    transforms.Resize((EXPECTED_IMG_SIZE, EXPECTED_IMG_SIZE)),
-    transforms.ToTensor(),
-])
 
 def load_model_pipeline():
-    global MODEL, non_max_suppression
+    torch.set_num_threads(INFERENCE_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Nur vor der ersten parallelen Operation erlaubt
+
+    if INFERENCE_BACKEND == "torchscript":
+        if os.path.exists(FROZEN_MODEL_PATH) and os.path.exists(weights_path(FROZEN_MODEL_PATH)):
+            load_frozen_runtime()
+            return
+        log.info(f"TorchScript-Modell '{FROZEN_MODEL_PATH}' nicht gefunden, lade eager über torch.hub.")
+    elif INFERENCE_BACKEND != "hub":
+        log.error(f"Unbekanntes INFERENCE_BACKEND '{INFERENCE_BACKEND}' (erlaubt: torchscript, hub)")
+        return
+    load_hub_model()
+
+
+def load_hub_model():
+    global MODEL, CLASS_NAMES, MODEL_STRIDE, non_max_suppression
     start_time = time.time()
-    print(f"--- DEBUG: Aktuelles Arbeitsverzeichnis (CWD) des Python-Prozesses: {os.getcwd()}", flush=True)
-    print(f"--- DEBUG: Erwarteter Pfad zum YOLO-Repo (LOCAL_YOLO_REPO_PATH): {LOCAL_YOLO_REPO_PATH}", flush=True)
-    print(f"--- DEBUG: Erwarteter Pfad zu den Gewichten (MODEL_WEIGHTS_PATH): {MODEL_WEIGHTS_PATH}", flush=True)
+    log.debug(f"Aktuelles Arbeitsverzeichnis (CWD) des Python-Prozesses: {os.getcwd()}")
+    log.debug(f"Erwarteter Pfad zum YOLO-Repo (LOCAL_YOLO_REPO_PATH): {LOCAL_YOLO_REPO_PATH}")
+    log.debug(f"Erwarteter Pfad zu den Gewichten (MODEL_WEIGHTS_PATH): {MODEL_WEIGHTS_PATH}")
 
     if not os.path.exists(LOCAL_YOLO_REPO_PATH) or not os.path.isdir(LOCAL_YOLO_REPO_PATH):
-        print(f"FEHLER: Lokales YOLOv5 Repository-Verzeichnis '{LOCAL_YOLO_REPO_PATH}' nicht gefunden oder kein Verzeichnis!", flush=True)
+        log.error(f"Lokales YOLOv5 Repository-Verzeichnis '{LOCAL_YOLO_REPO_PATH}' nicht gefunden oder kein Verzeichnis!")
         MODEL = None
         return
 
     if LOCAL_YOLO_REPO_PATH not in sys.path:
         sys.path.insert(0, LOCAL_YOLO_REPO_PATH)
-        print(f"--- DEBUG: '{LOCAL_YOLO_REPO_PATH}' zum sys.path hinzugefügt.", flush=True)
+        log.debug(f"'{LOCAL_YOLO_REPO_PATH}' zum sys.path hinzugefügt.")
 
     try:
         # Importiere NMS erst, nachdem der Pfad hinzugefügt wurde
         from utils.general import non_max_suppression as nms_func
         non_max_suppression = nms_func # Weise der globalen Variable zu
-        print(f"--- DEBUG: Inhalt von '{LOCAL_YOLO_REPO_PATH}': {os.listdir(LOCAL_YOLO_REPO_PATH)}", flush=True)
-        print(f"--- DEBUG: non_max_suppression Funktion erfolgreich importiert.", flush=True)
+        log.debug(f"Inhalt von '{LOCAL_YOLO_REPO_PATH}': {os.listdir(LOCAL_YOLO_REPO_PATH)}")
+        log.debug(f"non_max_suppression Funktion erfolgreich importiert.")
     except ImportError as ie:
-        print(f"--- DEBUG: Fehler beim Importieren von utils.general: {ie}", flush=True)
-        print(f"--- DEBUG: sys.path: {sys.path}", flush=True)
+        log.error(f"Fehler beim Importieren von utils.general: {ie}")
+        log.debug(f"sys.path: {sys.path}")
         MODEL = None
         return
     except FileNotFoundError:
-        print(f"--- DEBUG: Konnte Inhalt von '{LOCAL_YOLO_REPO_PATH}' nicht auflisten, da es nicht existiert.", flush=True)
+        log.debug(f"Konnte Inhalt von '{LOCAL_YOLO_REPO_PATH}' nicht auflisten, da es nicht existiert.")
         MODEL = None
         return
 
     if not os.path.exists(MODEL_WEIGHTS_PATH):
-        print(f"FEHLER: Modelldatei '{MODEL_WEIGHTS_PATH}' nicht im lokalen YOLOv5 Repository-Verzeichnis gefunden!", flush=True)
+        log.error(f"Modelldatei '{MODEL_WEIGHTS_PATH}' nicht im lokalen YOLOv5 Repository-Verzeichnis gefunden!")
         MODEL = None
         return
 
-    print(f"Versuche, YOLOv5 Modell '{MODEL_VARIANT_NAME}' aus lokalem Repo '{LOCAL_YOLO_REPO_PATH}' mit Gewichten '{MODEL_WEIGHTS_PATH}' zu laden (via torch.hub.load)...", flush=True)
+    log.info(f"Versuche, YOLOv5 Modell '{MODEL_VARIANT_NAME}' aus lokalem Repo '{LOCAL_YOLO_REPO_PATH}' mit Gewichten '{MODEL_WEIGHTS_PATH}' zu laden (via torch.hub.load)...")
 
     try:
         MODEL = torch.hub.load(
@@ -80,126 +199,303 @@ def load_model_pipeline():
             trust_repo=True
         )
         MODEL.eval()
-        print(f"--- DEBUG: Type of loaded MODEL object: {type(MODEL)}", flush=True)
+        log.debug(f"Type of loaded MODEL object: {type(MODEL)}")
         # MODEL.names enthält die Klassennamen, MODEL.nc die Anzahl der Klassen
-        print(f"--- DEBUG: Modell Klassennamen: {MODEL.names}", flush=True)
-        print(f"--- DEBUG: Modell Anzahl Klassen (nc): {MODEL.nc}", flush=True)
+        log.debug(f"Modell Klassennamen: {MODEL.names}")
+        log.debug(f"Modell Anzahl Klassen (nc): {MODEL.nc}")
+        # Klassennamen holen wir aus MODEL.names (oder MODEL.module.names, falls vorhanden)
+        CLASS_NAMES = build_class_name_table(
+            MODEL.module.names if hasattr(MODEL, 'module') and hasattr(MODEL.module, 'names') else MODEL.names)
+        if hasattr(MODEL, 'stride'):
+            MODEL_STRIDE = int(torch.as_tensor(MODEL.stride).max())
 
 
         end_time = time.time()
-        print(f"YOLOv5 Modell '{MODEL_VARIANT_NAME}' erfolgreich aus lokalen Dateien geladen. Dauer: {end_time - start_time:.2f} Sekunden.", flush=True)
+        log.info(f"YOLOv5 Modell '{MODEL_VARIANT_NAME}' erfolgreich aus lokalen Dateien geladen. Dauer: {end_time - start_time:.2f} Sekunden. "
+                 f"Speicher nachher {memory_usage()}")
 
     except Exception as e:
-        print(f"FEHLER beim Laden des lokalen YOLOv5 Modells '{MODEL_VARIANT_NAME}': {e}", flush=True)
-        print(traceback.format_exc(), flush=True)
+        log.exception(f"Fehler beim Laden des lokalen YOLOv5 Modells '{MODEL_VARIANT_NAME}': {e}")
         MODEL = None
 
+_load_start = time.perf_counter()
 load_model_pipeline()
+METRICS.set_loaded(time.perf_counter() - _load_start, MODEL is not None)
+
+def setup_resolution_policy():
+    global IMG_SIZES, RESOLUTION_POLICY
+    invalid = [size for size in IMG_SIZES if size % MODEL_STRIDE]
+    if invalid:
+        log.warning(f"Eingabegrößen {invalid} sind keine Vielfachen des Strides {MODEL_STRIDE} und werden ignoriert.")
+    IMG_SIZES = [size for size in IMG_SIZES if size % MODEL_STRIDE == 0] or [EXPECTED_IMG_SIZE]
+    RESOLUTION_POLICY = ResolutionPolicy(IMG_SIZES, ADAPTIVE_QUEUE_DEPTHS, ADAPTIVE_LATENCY_MS, ADAPTIVE_LATENCY_WINDOW)
+    log.info(f"Eingabegrößen: {IMG_SIZES} (Standard {EXPECTED_IMG_SIZE}), lastabhängige Reduktion bei "
+             f"Warteschlange {ADAPTIVE_QUEUE_DEPTHS or '-'} / Latenz-Median ms {ADAPTIVE_LATENCY_MS or '-'}")
+
+setup_resolution_policy()
+
+def detect(img_batch):
+    """Ein Forward-Pass und ein gebatchter NMS-Aufruf für einen (B, 3, S, S)-Tensor.
+
+    Gibt pro Bild einen (N, 6)-Tensor zurück (x1, y1, x2, y2, conf, cls) in
+    Koordinaten des Modell-Inputs.
+    """
+    with torch.no_grad(): # Wichtig für Inferenz
+        # DetectionModel.forward gibt (prediction, ...) mit den rohen Head-Outputs
+        # für den ganzen Batch zurück; NMS muss darauf noch angewendet werden.
+        with FORWARD_GATE, METRICS.stage("forward"):
+            raw_predictions = MODEL(img_batch)[0]
+
+    # pred ist eine Liste von Tensoren, für jedes Bild im Batch einen Tensor
+    with METRICS.stage("nms"):
+        pred = non_max_suppression(raw_predictions, CONF_THRES, IOU_THRES, CLASSES, AGNOSTIC_NMS, max_det=MAX_DET)
+    return [det if det is not None else torch.zeros((0, 6)) for det in pred]
+
+
+def detect_batched(img_tensors):
+    """Verarbeitungsfunktion für den MicroBatcher: (1, 3, S, S)-Tensoren mehrerer Requests stapeln.
+
+    Requests mit unterschiedlicher Eingabegröße laufen als getrennte Forward-Passes.
+    """
+    log.debug("Batch-Inferenz über %d Requests", len(img_tensors))
+    groups = {}
+    for index, tensor in enumerate(img_tensors):
+        groups.setdefault(tensor.shape[-1], []).append(index)
+
+    results = [None] * len(img_tensors)
+    for indices in groups.values():
+        for index, det in zip(indices, detect(torch.cat([img_tensors[i] for i in indices]))):
+            results[index] = det
+    return results
+
+
+def to_response(det, ratio, pad, original_size, output_format):
+    # Spalten: x1, y1, x2, y2, conf, cls -> Boxen in Koordinaten des Originalbilds
+    det = scale_boxes_to_original(det, ratio, pad, original_size)
+    response = serialize_detections(det, CLASS_NAMES, output_format)
+    response["image_size"] = list(original_size)
+    return response
+
+
+def detect_images(image_buffers, output_format, img_size=EXPECTED_IMG_SIZE):
+    """Mehrere Bilder eines Requests in einem gemeinsamen Batch-Puffer verarbeiten.
+
+    Nicht lesbare Bilder erhalten einen eigenen Fehlereintrag, die übrigen
+    laufen trotzdem gemeinsam durch einen Forward-Pass und einen NMS-Aufruf.
+    Gibt {"results": [...]} in Request-Reihenfolge zurück.
+    """
+    results = [None] * len(image_buffers)
+    batch = batch_buffer(img_size, len(image_buffers))
+    slots = [] # (Index im Request, ratio, pad, original_size) je belegtem Batch-Platz
+    for index, image_buffer in enumerate(image_buffers):
+        if image_buffer is None or not len(image_buffer):
+            results[index] = {"error": "Bilddaten dürfen nicht leer sein."}
+            continue
+        try:
+            # Ein fehlgeschlagenes Bild hinterlässt nur Reste im selben Platz, der
+            # vom nächsten Bild vollständig überschrieben wird
+            with METRICS.stage("preprocess"):
+                meta = preprocess_into(BufferReader(image_buffer), img_size, batch[len(slots)])
+        except OSError: # umfasst UnidentifiedImageError und abgeschnittene Dateien
+            results[index] = {"error": "Bilddaten konnten nicht gelesen werden."}
+            continue
+        slots.append((index, *meta))
+
+    if slots:
+        log.debug("Führe Batch-Inferenz mit YOLOv5 Modell '%s' für %d Bilder aus", MODEL_VARIANT_NAME, len(slots))
+        detections = detect(batch[:len(slots)])
+        with METRICS.stage("postprocess"):
+            for det, (index, ratio, pad, original_size) in zip(detections, slots):
+                results[index] = to_response(det, ratio, pad, original_size, output_format)
+    return {"results": results}
+
+
+def detect_image(image_buffer, output_format, img_size=EXPECTED_IMG_SIZE):
+    """Ein einzelnes Bild dekodieren, erkennen und als Response-Dict zurückgeben.
+
+    Wirft OSError (auch UnidentifiedImageError) bei unlesbaren Bilddaten und QueueFullError
+    (eine InferenceRejectedError, 429 mit Retry-After), wenn die Warteschlange des Micro-Batchers voll ist.
+    """
+    # Dekodieren (bei JPEG per DCT-Skalierung nahe der Zielgröße), Letterbox und
+    # Normalisierung in einem Schritt in einen wiederverwendeten Float-Puffer;
+    # ratio und pad für die Rückrechnung der Boxen
+    with METRICS.stage("preprocess"):
+        img_tensor, ratio, pad, original_size = preprocess_image(BufferReader(image_buffer), img_size)
+    # Optional: Auf CPU/GPU verschieben, falls MODEL.device bekannt ist
+    # if hasattr(MODEL, 'device'):
+    #    img_tensor = img_tensor.to(MODEL.device)
+
+    if BATCHER is not None:
+        # Der Tensor ist der Puffer dieses Threads; er bleibt gültig, bis das Ergebnis da ist
+        det = BATCHER.submit(img_tensor).result()
+    else:
+        log.debug("Führe Inferenz mit YOLOv5 Modell '%s' und Tensor-Input aus", MODEL_VARIANT_NAME)
+        det = detect(img_tensor)[0]
+
+    log.debug("Objekterkennung erfolgreich, %d Objekte gefunden", len(det))
+    with METRICS.stage("postprocess"):
+        return to_response(det, ratio, pad, original_size, output_format)
+
+
+def parse_img_size(value, from_query=False):
+    """Angefragte Eingabegröße: None -> EXPECTED_IMG_SIZE, aus JSON nur eine Ganzzahl (kein bool),
+    aus der Query nur Ziffern ohne führende Null; alles andere -> None (ungültig, 400)."""
+    if value is None:
+        return EXPECTED_IMG_SIZE
+    if from_query:
+        if isinstance(value, str) and value.isascii() and value.isdigit() and value == str(int(value)):
+            return int(value)
+        return None
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
 
 def handle(event, context):
+    """Einstiegspunkt: GET auf METRICS_PATH liefert die Metriken, alles andere ist ein Erkennungs-Request."""
+    if getattr(event, 'path', None) == METRICS_PATH and getattr(event, 'method', 'GET') == 'GET':
+        return METRICS.render(), 200, {"Content-Type": METRICS_CONTENT_TYPE}
+    request = METRICS.start_request()
+    sample_request()
+    response = handle_request(event, context)
+    server_timing = METRICS.finish_request(request, response_status(response))
+    return add_headers(response, {"Server-Timing": server_timing}) if SERVER_TIMING and server_timing else response
+
+
+def handle_request(event, context):
     global MODEL, non_max_suppression
     if MODEL is None or non_max_suppression is None:
-        print("handle() aufgerufen, aber YOLOv5 MODELL oder NMS-Funktion ist None.", flush=True)
+        log.error("handle() aufgerufen, aber YOLOv5 MODELL oder NMS-Funktion ist None.")
         return json.dumps({"error": "YOLOv5 Modell oder NMS ist nicht verfügbar."}), 500
+    # Frist ab Eingang des Requests, nicht erst ab Beginn der Inferenz
+    deadline = request_deadline(getattr(event, 'headers', None), REQUEST_TIMEOUT_S)
     try:
+        # Bild kommt entweder roh (application/octet-stream, image/*), als
+        # multipart/form-data-Upload oder wie bisher Base64-kodiert in JSON.
         request_body_data = None
-        if hasattr(event, 'body'):
-            request_body_data = event.body
-            if isinstance(event.body, bytes):
-                request_body_data = event.body.decode('utf-8')
-            elif not isinstance(event.body, str):
-                request_body_data = str(event.body)
-        elif isinstance(event, str):
-            request_body_data = event
-        elif isinstance(event, bytes):
-            request_body_data = event.decode('utf-8')
-        else:
-            return json.dumps({"error": "Interner Fehler: Unerwartetes Event-Format."}), 500
+        image_buffers = None # gesetzt bei mehreren Bildern pro Request
+        with METRICS.stage("read"):
+            if hasattr(event, 'body'):
+                request_body_data = event.body
+                if not isinstance(request_body_data, (bytes, bytearray, str)):
+                    request_body_data = str(request_body_data)
+            elif isinstance(event, (bytes, str)):
+                request_body_data = event
+            else:
+                return json.dumps({"error": "Interner Fehler: Unerwartetes Event-Format."}), 500
 
         if request_body_data is None:
              return json.dumps({"error": "Interner Fehler: Request Body konnte nicht extrahiert werden."}), 500
 
-        input_data = json.loads(request_body_data)
-
-        if 'image' not in input_data or not isinstance(input_data['image'], str):
-            return json.dumps({"error": "JSON muss Schlüssel 'image' mit einem Base64-kodierten String enthalten."}), 400
-
-        base64_image_string = input_data['image']
-        if not base64_image_string:
-             return json.dumps({"error": "Base64-kodierter Bildstring darf nicht leer sein."}), 400
-
-        image_bytes = base64.b64decode(base64_image_string)
-        img_pil = Image.open(BytesIO(image_bytes)).convert('RGB')
-
-        img_tensor = preprocess_transform(img_pil).unsqueeze(0)
-        # Optional: Auf CPU/GPU verschieben, falls MODEL.device bekannt ist
-        # if hasattr(MODEL, 'device'):
-        #    img_tensor = img_tensor.to(MODEL.device)
-
-        print(f"Führe Inferenz mit YOLOv5 Modell '{MODEL_VARIANT_NAME}' und Tensor-Input aus...", flush=True)
-        
-        with torch.no_grad(): # Wichtig für Inferenz
-            raw_predictions = MODEL(img_tensor)[0] # MODEL(img_tensor) gibt bei DetectionModel oft (prediction, None) oder (prediction, augment_output) zurück
-                                                # oder direkt die rohen Head-Outputs, je nach interner Logik.
-                                                # Wir nehmen an, das erste Element ist das relevante.
-                                                # Wenn MODEL ein AutoShape-Objekt wäre, wäre results = MODEL(img_tensor) direkt ein Detections-Objekt.
-                                                # Da type(MODEL) als DetectionModel geloggt wurde, gehen wir von roheren Outputs aus.
-
-        print(f"Roh-Vorhersagen erhalten, Typ: {type(raw_predictions)}. Führe Non-Max Suppression durch...", flush=True)
-
-        # Wende Non-Max Suppression an
-        # Parameter für NMS (können angepasst werden, dies sind gängige Defaults)
-        conf_thres = 0.25  # Konfidenz-Schwellenwert
-        iou_thres = 0.45   # IoU-Schwellenwert für NMS
-        classes = None     # Filtere nach bestimmten Klassen (None für alle)
-        agnostic_nms = False # Klassen-agnostisches NMS
-        max_det = 1000     # Maximale Anzahl Detektionen pro Bild
-
-        # non_max_suppression erwartet eine Liste von Tensoren oder einen einzelnen Tensor
-        # Der Output von MODEL(img_tensor) ist hier etwas unklar, basierend auf dem Fehler.
-        # Wenn raw_predictions bereits die NMS-Liste ist, ist das gut.
-        # Wenn raw_predictions die rohen Head-Outputs sind, muss NMS darauf angewendet werden.
-        # Die `DetectionModel.forward` gibt die rohen Head-Outputs zurück.
-        # Wir müssen NMS darauf anwenden.
-        
-        # pred ist eine Liste von Tensoren, für jedes Bild im Batch einen Tensor
-        # Da wir nur ein Bild haben, nehmen wir pred[0]
-        pred = non_max_suppression(raw_predictions, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
-        
-        output_detections = []
-        if pred[0] is not None and len(pred[0]):
-            # pred[0] ist ein Tensor der Form (num_detections, 6)
-            # Spalten: x1, y1, x2, y2, conf, cls
-            # Klassennamen holen wir aus MODEL.names (oder MODEL.module.names, falls vorhanden)
-            class_names_map = MODEL.module.names if hasattr(MODEL, 'module') and hasattr(MODEL.module, 'names') else MODEL.names
-
-            for detection in pred[0]: # Iteriere über jede Detektion
-                coords = detection[:4].tolist()
-                confidence = detection[4].item()
-                class_id = int(detection[5].item())
-                
-                output_detections.append({
-                    "xmin": round(coords[0], 2),
-                    "ymin": round(coords[1], 2),
-                    "xmax": round(coords[2], 2),
-                    "ymax": round(coords[3], 2),
-                    "confidence": round(confidence, 4),
-                    "class_id": class_id,
-                    "name": class_names_map[class_id] if class_id < len(class_names_map) else "unknown"
-                })
-        
-        print(f"Objekterkennung erfolgreich, {len(output_detections)} Objekte gefunden.", flush=True)
-        return json.dumps({"detections": output_detections}), 200
+        content_type = get_content_type(event)
+        upload_type = media_type(content_type)
+        if debug_enabled(log):
+            log.debug("Request erhalten, Content-Type '%s'", upload_type, extra=body_summary(request_body_data))
+
+        # Ausgabeformat: "objects" (Standard, Liste von Dicts), "columns" (eine Liste pro Feld)
+        # oder "array" (kompakte Zeilen in ARRAY_COLUMNS-Reihenfolge); per Query oder JSON-Feld
+        query = getattr(event, 'query', None) or {}
+        output_format = query.get('format')
+        # Eingabegröße (imgsz) per Query oder JSON-Feld, sonst EXPECTED_IMG_SIZE
+        requested_size = parse_img_size(query.get('imgsz'), from_query=True)
+
+        with METRICS.stage("decode"):
+            if upload_type == "application/octet-stream" or upload_type.startswith("image/"):
+                # Rohes Bild direkt aus dem Request-Puffer, ohne String- oder Base64-Umweg
+                if not isinstance(request_body_data, (bytes, bytearray)) or not request_body_data:
+                    return json.dumps({"error": "Binärer Request Body darf nicht leer sein."}), 400
+                image_buffer = request_body_data
+            elif upload_type == "multipart/form-data":
+                if not isinstance(request_body_data, (bytes, bytearray)):
+                    return json.dumps({"error": "multipart/form-data erwartet einen binären Request Body."}), 400
+                try:
+                    # Mehrere Dateien unter dem Feld "images", sonst ein einzelnes Bild
+                    image_buffers = extract_multipart_files(request_body_data, content_type, field_name="images")
+                    image_buffer = None if image_buffers else \
+                        extract_multipart_file(request_body_data, content_type, field_name="image")
+                except ValueError as ve:
+                    return json.dumps({"error": str(ve)}), 400
+                if not image_buffers and (image_buffer is None or not len(image_buffer)):
+                    return json.dumps({"error": "multipart/form-data muss ein Datei-Feld 'image' oder 'images' enthalten."}), 400
+            else:
+                # json.loads verarbeitet bytes direkt, kein vorheriges decode('utf-8') nötig
+                input_data = json.loads(request_body_data)
+
+                if isinstance(input_data, dict) and 'images' in input_data:
+                    images = input_data['images']
+                    if not isinstance(images, list) or not images or not all(isinstance(i, str) for i in images):
+                        return json.dumps({"error": "'images' muss eine nicht-leere Liste von Base64-kodierten Strings sein."}), 400
+                    # Vor dem Dekodieren begrenzen, damit zu große Requests keine Arbeit verursachen
+                    if len(images) > MAX_IMAGES_PER_REQUEST:
+                        return json.dumps({"error": f"Höchstens {MAX_IMAGES_PER_REQUEST} Bilder pro Request erlaubt."}), 400
+                    image_buffers = []
+                    for base64_image_string in images:
+                        try:
+                            image_buffers.append(base64.b64decode(base64_image_string, validate=True))
+                        except (binascii.Error, ValueError):
+                            image_buffers.append(None) # wird in detect_images als Fehler pro Bild gemeldet
+                elif not isinstance(input_data, dict) or 'image' not in input_data or not isinstance(input_data['image'], str):
+                    return json.dumps({"error": "JSON muss Schlüssel 'image' (Base64-String) oder 'images' (Liste davon) enthalten."}), 400
+                else:
+                    base64_image_string = input_data['image']
+                    if not base64_image_string:
+                         return json.dumps({"error": "Base64-kodierter Bildstring darf nicht leer sein."}), 400
 
+                    try:
+                        image_buffer = base64.b64decode(base64_image_string, validate=True)
+                    except (binascii.Error, ValueError): # ValueError auch bei Nicht-ASCII-Zeichen
+                        return json.dumps({"error": "Ungültiger Base64-kodierter Bildstring."}), 400
+                output_format = input_data.get('format', output_format)
+                if 'imgsz' in input_data:
+                    requested_size = parse_img_size(input_data['imgsz'])
+
+        output_format = output_format or "objects"
+        if output_format not in OUTPUT_FORMATS:
+            return json.dumps({"error": f"Unbekanntes Ausgabeformat '{output_format}' (erlaubt: {', '.join(OUTPUT_FORMATS)})."}), 400
+
+        if requested_size not in IMG_SIZES:
+            return json.dumps({"error": f"Ungültige Eingabegröße imgsz (erlaubt: {', '.join(map(str, IMG_SIZES))})."}), 400
+
+        # multipart: die Dateien liegen bereits als Ausschnitte des Bodies vor
+        if image_buffers and len(image_buffers) > MAX_IMAGES_PER_REQUEST:
+            return json.dumps({"error": f"Höchstens {MAX_IMAGES_PER_REQUEST} Bilder pro Request erlaubt."}), 400
+
+        # Unter Last kann die Policy eine kleinere Größe als die angefragte wählen
+        img_size = RESOLUTION_POLICY.acquire(requested_size)
+        if img_size != requested_size:
+            log.debug("Last hoch (%s), imgsz %d -> %d", RESOLUTION_POLICY.stats(), requested_size, img_size)
+        start_time = time.perf_counter()
+        latency_ms = None
+        try:
+            if image_buffers:
+                response = EXECUTOR.run(METRICS.queued(detect_images), image_buffers, output_format, img_size, deadline=deadline)
+            else:
+                try:
+                    response = EXECUTOR.run(METRICS.queued(detect_image), image_buffer, output_format, img_size, deadline=deadline)
+                except OSError: # umfasst UnidentifiedImageError und abgeschnittene Dateien
+                    return json.dumps({"error": "Bilddaten konnten nicht gelesen werden."}), 400
+            latency_ms = (time.perf_counter() - start_time) * 1000.0
+        finally:
+            RESOLUTION_POLICY.release(latency_ms)
+
+        response["imgsz"] = img_size
+        with METRICS.stage("serialize"):
+            return json.dumps(response), 200
+
+    except InferenceRejectedError as rejected:
+        # Einzelne Ablehnungen nur im DEBUG-Log, die Anzahl steht in den Metriken
+        log.debug("Request abgelehnt (%d): %s, Executor: %s", rejected.status, rejected, EXECUTOR.stats())
+        return rejected_response(rejected)
     except json.JSONDecodeError:
-        print(f"Fehler beim Parsen des JSON-Inputs. Verwendeter Body (Anfang): {str(request_body_data)[:200]}...", flush=True)
-        print(traceback.format_exc(), flush=True)
+        log.warning("Fehler beim Parsen des JSON-Inputs", exc_info=True, extra=body_summary(request_body_data))
         return json.dumps({"error": "Ungültiger JSON Input."}), 400
     except AttributeError as ae:
-        print(f"AttributeError in handle(): {ae}", flush=True)
-        print(traceback.format_exc(), flush=True)
+        log.exception("AttributeError in handle(): %s", ae)
         return json.dumps({"error": "Interner Fehler bei der Verarbeitung des Request-Events."}), 500
     except Exception as e:
-        print(f"Ein unerwarteter Fehler ist in handle() aufgetreten: {e}", flush=True)
-        print(traceback.format_exc(), flush=True)
-        return json.dumps({"error": "Interner Serverfehler bei der Verarbeitung."}), 500
\ No newline at end of file
+        log.exception("Ein unerwarteter Fehler ist in handle() aufgetreten: %s", e)
+        return json.dumps({"error": "Interner Serverfehler bei der Verarbeitung."}), 500
+
+if MODEL is not None and BATCH_MAX_SIZE > 1:
+    BATCHER = MicroBatcher(detect_batched, max_batch_size=BATCH_MAX_SIZE, window_ms=BATCH_WINDOW_MS,
+                           max_queue=BATCH_MAX_QUEUE, name="yolo-batcher", metrics=METRICS)
+    register_batcher(METRICS, BATCHER)
+    log.info(f"Micro-Batching aktiv: max. Batchgröße={BATCH_MAX_SIZE}, Fenster={BATCH_WINDOW_MS} ms, "
+             f"max. Warteschlange={BATCH_MAX_QUEUE}")
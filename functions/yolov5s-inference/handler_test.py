@@ -1,10 +1,415 @@
+import base64
+import json
+from io import BytesIO
+
+import torch
+from PIL import Image
+
+from . import handler
 from .handler import handle
+from .frozen_model import freeze_detection_model, load_frozen_model, save_frozen_model
+from .image_upload import BufferReader, extract_multipart_file, extract_multipart_files, media_type
+from .nms import non_max_suppression
+from .postprocessing import ARRAY_COLUMNS, build_class_name_table, scale_boxes_to_original, serialize_detections
+from .preprocessing import LETTERBOX_FILL, letterbox_params, preprocess_image
+from .resolution_policy import ResolutionPolicy
 
 # Test your handler here
 
 # To disable testing, you can set the build_arg `TEST_ENABLED=false` on the CLI or in your stack.yml
 # https://docs.openfaas.com/reference/yaml/#function-build-args-build-args
 
-def test_handle():
-    # assert handle("input") == "input"
-    pass
+
+def _jpeg_bytes(size=(32, 24)):
+    buffer = BytesIO()
+    Image.new("RGB", size, (200, 10, 10)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class FakeEvent:
+    def __init__(self, body, content_type="application/json", query=None, path="/", method="POST"):
+        self.body = body
+        self.headers = {"Content-Type": content_type}
+        self.query = query or {}
+        self.path = path
+        self.method = method
+
+
+def _multipart(fields, boundary="----grenze"):
+    body = b""
+    for name, filename, content in fields:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def test_buffer_reader_decodes_image_without_copying_body():
+    jpeg = _jpeg_bytes()
+
+    img = Image.open(BufferReader(memoryview(jpeg))).convert("RGB")
+
+    assert img.size == (32, 24)
+
+
+def test_extract_multipart_file_returns_image_field():
+    jpeg = _jpeg_bytes()
+    body, content_type = _multipart([("note", None, b"hallo"), ("image", "bild.jpg", jpeg)])
+
+    part = extract_multipart_file(body, content_type)
+
+    assert isinstance(part, memoryview)
+    assert bytes(part) == jpeg
+
+
+def test_extract_multipart_file_falls_back_to_first_file_part():
+    body, content_type = _multipart([("upload", "bild.jpg", b"\x00\x01\r\n\x02")])
+
+    assert bytes(extract_multipart_file(body, content_type)) == b"\x00\x01\r\n\x02"
+
+
+def test_extract_multipart_file_does_not_match_filename_parameter():
+    body, content_type = _multipart([("file", "image", b"falsch"), ("image", "bild.jpg", b"richtig")])
+
+    assert bytes(extract_multipart_file(body, content_type)) == b"richtig"
+    assert [bytes(part) for part in extract_multipart_files(body, content_type, field_name="image")] == [b"richtig"]
+
+
+def test_media_type_ignores_parameters():
+    assert media_type("Multipart/Form-Data; boundary=abc") == "multipart/form-data"
+
+
+def test_letterbox_params_keep_aspect_ratio():
+    assert letterbox_params(320, 160, 640) == (2.0, (640, 320), (0, 160))
+
+
+def test_preprocess_image_letterboxes_into_buffer():
+    buffer = BytesIO()
+    Image.new("RGB", (1600, 800), (255, 0, 0)).save(buffer, format="JPEG", quality=95)
+
+    tensor, ratio, pad, original_size = preprocess_image(BytesIO(buffer.getvalue()), 640)
+
+    assert tensor.shape == (1, 3, 640, 640)
+    assert original_size == (1600, 800) and ratio == 0.4 and pad == (0, 160)
+    assert torch.allclose(tensor[0, :, 0, 0], torch.full((3,), LETTERBOX_FILL / 255.0))
+    assert tensor[0, 0, 320, 320] > 0.9 and tensor[0, 1, 320, 320] < 0.1
+
+
+def test_preprocess_image_reuses_buffer_and_refills_padding():
+    wide, tall = BytesIO(), BytesIO()
+    Image.new("RGB", (200, 100), (0, 0, 0)).save(wide, format="PNG")
+    Image.new("RGB", (100, 200), (0, 0, 0)).save(tall, format="PNG")
+
+    first = preprocess_image(BytesIO(wide.getvalue()), 64)[0]
+    second = preprocess_image(BytesIO(tall.getvalue()), 64)[0]
+
+    assert first.data_ptr() == second.data_ptr()
+    # Oben links war beim breiten Bild Padding, beim hohen ebenfalls (linker Rand)
+    assert torch.allclose(second[0, :, 32, 0], torch.full((3,), LETTERBOX_FILL / 255.0))
+    assert torch.allclose(second[0, :, 0, 32], torch.zeros(3))
+
+
+def test_scale_boxes_to_original_inverts_letterbox():
+    # Box (10, 20)-(110, 70) im 320x160-Original liegt nach Letterbox auf 640 bei (20, 200)-(220, 300)
+    det = torch.tensor([[20.0, 200.0, 220.0, 300.0, 0.9, 1.0]])
+
+    scaled = scale_boxes_to_original(det, 2.0, (0, 160), (320, 160))
+
+    assert torch.allclose(scaled[0, :4], torch.tensor([10.0, 20.0, 110.0, 70.0]))
+
+
+def test_serialize_detections_formats_agree():
+    det = torch.tensor([[1.234, 2.345, 3.456, 4.567, 0.87654, 1.0],
+                        [5.0, 6.0, 7.0, 8.0, 0.5, 7.0]])
+    names = ["person", "bicycle"]
+
+    objects = serialize_detections(det, names, "objects")["detections"]
+    columns = serialize_detections(det, names, "columns")["detections"]
+    array = serialize_detections(det, names, "array")
+
+    assert objects[0] == {"xmin": 1.23, "ymin": 2.35, "xmax": 3.46, "ymax": 4.57,
+                          "confidence": 0.8765, "class_id": 1, "name": "bicycle"}
+    assert objects[1]["name"] == "unknown"
+    assert columns["xmin"] == [1.23, 5.0] and columns["name"] == ["bicycle", "unknown"]
+    assert array["detections"][0] == [1.23, 2.35, 3.46, 4.57, 0.8765, 1]
+    assert array["columns"] == ARRAY_COLUMNS
+
+
+def test_build_class_name_table_from_dict():
+    assert build_class_name_table({0: "person", 2: "car"}) == ["person", "unknown", "car"]
+
+
+def test_extract_multipart_files_keeps_order():
+    body, content_type = _multipart([("images", "a.jpg", b"AAA"), ("format", None, b"array"),
+                                     ("images", "b.jpg", b"BB")])
+
+    assert [bytes(part) for part in extract_multipart_files(body, content_type)] == [b"AAA", b"BB"]
+
+
+class _FakeDetector:
+    """Liefert pro Bild eine Detektion, deren Klasse den Batch-Index kodiert."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, img_batch):
+        self.batch_sizes.append(img_batch.shape[0])
+        return (img_batch,)
+
+    @staticmethod
+    def nms(raw, *args, **kwargs):
+        return [torch.tensor([[10.0, 10.0, 100.0, 100.0, 0.5, float(i)]]) for i in range(raw.shape[0])]
+
+
+def test_detect_images_runs_one_batch_and_maps_errors_back(monkeypatch):
+    detector = _FakeDetector()
+    monkeypatch.setattr(handler, "MODEL", detector)
+    monkeypatch.setattr(handler, "non_max_suppression", detector.nms)
+    monkeypatch.setattr(handler, "CLASS_NAMES", ["person", "bicycle"])
+
+    response = handler.detect_images([_jpeg_bytes((64, 48)), b"kein bild", _jpeg_bytes((32, 32))], "array")
+
+    assert detector.batch_sizes == [2]
+    first, broken, last = response["results"]
+    assert broken == {"error": "Bilddaten konnten nicht gelesen werden."}
+    assert first["image_size"] == [64, 48] and last["image_size"] == [32, 32]
+    assert first["detections"][0][5] == 0 and last["detections"][0][5] == 1
+
+
+def test_detect_batched_stacks_requests_into_one_forward_pass(monkeypatch):
+    detector = _FakeDetector()
+    monkeypatch.setattr(handler, "MODEL", detector)
+    monkeypatch.setattr(handler, "non_max_suppression", detector.nms)
+
+    dets = handler.detect_batched([torch.zeros((1, 3, 64, 64)) for _ in range(3)])
+
+    assert detector.batch_sizes == [3]
+    assert [det[0, 5].item() for det in dets] == [0, 1, 2]
+
+
+def _raw_prediction(rows, num_classes=3):
+    """(1, N, 5 + nc) aus Zeilen (cx, cy, w, h, obj, cls, cls_conf)."""
+    pred = torch.zeros((1, len(rows), 5 + num_classes))
+    for i, (cx, cy, w, h, obj, cls, cls_conf) in enumerate(rows):
+        pred[0, i, :5] = torch.tensor([cx, cy, w, h, obj])
+        pred[0, i, 5 + cls] = cls_conf
+    return pred
+
+
+def test_standalone_nms_suppresses_per_image_and_class():
+    first = _raw_prediction([(50, 50, 20, 20, 0.9, 0, 1.0), (51, 50, 20, 20, 0.8, 0, 1.0),
+                             (51, 50, 20, 20, 0.8, 1, 1.0), (200, 200, 10, 10, 0.2, 0, 1.0)])
+    second = _raw_prediction([(51, 50, 20, 20, 0.7, 0, 1.0), (0, 0, 0, 0, 0.0, 0, 0.0),
+                              (0, 0, 0, 0, 0.0, 0, 0.0), (0, 0, 0, 0, 0.0, 0, 0.0)])
+
+    dets = non_max_suppression(torch.cat([first, second]), 0.25, 0.45)
+
+    # Bild 1: überlappende Box gleicher Klasse fällt weg, andere Klasse bleibt, zu unsichere Box fehlt
+    assert torch.allclose(dets[0][:, 4], torch.tensor([0.9, 0.8]))
+    assert dets[0][:, 5].tolist() == [0, 1]
+    assert dets[0][0, :4].tolist() == [40, 40, 60, 60]
+    # Bild 2 wird nicht von Boxen aus Bild 1 unterdrückt
+    assert len(dets[1]) == 1
+    assert len(non_max_suppression(first, 0.25, 0.45, agnostic=True)[0]) == 1
+    assert non_max_suppression(first, 0.25, 0.45, classes=[1])[0][:, 5].tolist() == [1]
+
+
+class _TinyDetect(torch.nn.Module):
+    """Detect-Kopf wie in YOLOv5: Grid und Anker-Grid werden aus der Eingabegröße gebaut und zwischengespeichert."""
+
+    def __init__(self, channels, num_classes, stride, anchors=((1.0, 1.5), (2.0, 1.0))):
+        super().__init__()
+        self.no, self.na, self.stride = 5 + num_classes, len(anchors), stride
+        self.dynamic = False  # wie YOLOv5: Grid nur neu bauen, wenn sich die Größe ändert
+        self.grid = self.anchor_grid = torch.empty(0)
+        self.register_buffer("anchors", torch.tensor(anchors))
+        self.m = torch.nn.Conv2d(channels, self.na * self.no, 1)
+
+    def _make_grid(self, nx, ny):
+        yv, xv = torch.meshgrid(torch.arange(ny), torch.arange(nx), indexing="ij")
+        grid = torch.stack((xv, yv), 2).expand(1, self.na, ny, nx, 2).float() - 0.5
+        anchor_grid = (self.anchors * self.stride).view(1, self.na, 1, 1, 2).expand(1, self.na, ny, nx, 2)
+        return grid, anchor_grid
+
+    def forward(self, x):
+        x = self.m(x)
+        bs, _, ny, nx = x.shape
+        x = x.view(bs, self.na, self.no, ny, nx).permute(0, 1, 3, 4, 2).contiguous()
+        if self.dynamic or self.grid.shape[2:4] != x.shape[2:4]:
+            self.grid, self.anchor_grid = self._make_grid(nx, ny)
+        xy, wh, conf = x.sigmoid().split((2, 2, self.no - 4), 4)
+        xy = (xy * 2 + self.grid) * self.stride
+        wh = (wh * 2) ** 2 * self.anchor_grid
+        return torch.cat((xy, wh, conf), 4).view(bs, self.na * nx * ny, self.no), x
+
+
+class _TinyDetector(torch.nn.Module):
+    """Conv+BN und Detect-Kopf mit YOLOv5-Ausgabeform ((B, N, 5 + nc), Zusatzausgaben)."""
+
+    def __init__(self, num_classes=3):
+        super().__init__()
+        torch.manual_seed(0)
+        self.conv = torch.nn.Conv2d(3, 8, 3, stride=8, padding=1)
+        self.bn = torch.nn.BatchNorm2d(8)
+        self.bn.running_mean.uniform_(-0.5, 0.5)
+        self.bn.running_var.uniform_(0.5, 2.0)
+        self.detect = _TinyDetect(8, num_classes, stride=8)
+
+    def forward(self, x):
+        return self.detect(self.bn(self.conv(x)).relu())
+
+
+def test_frozen_model_matches_eager_model(tmp_path):
+    eager = _TinyDetector().eval()
+    path = str(tmp_path / "tiny.torchscript")
+
+    save_frozen_model(freeze_detection_model(_TinyDetector(), imgsz=64), path, {0: "a", 1: "b", 2: "c"}, 8, 64)
+    frozen, meta = load_frozen_model(path)
+
+    assert meta["names"] == ["a", "b", "c"] and meta["stride"] == 8 and meta["imgsz"] == 64
+    # Auch abweichend von der Export-Größe: das Grid darf nicht aus dem Trace stammen
+    for size, width in ((64, 64), (32, 32), (96, 64)):
+        x = torch.rand((2, 3, size, width))
+        with torch.no_grad():
+            expected, actual = eager(x)[0], frozen(x)[0]
+        assert actual.shape == expected.shape
+        assert torch.allclose(actual, expected, atol=1e-5)
+
+
+def test_resolution_policy_steps_down_with_queue_depth_and_latency():
+    policy = ResolutionPolicy([320, 416, 512, 640], queue_depths=[1, 2], latency_ms=[100, 200, 300], latency_window=3)
+
+    assert policy.acquire(640) == 640
+    assert policy.acquire(640) == 512  # ein weiterer Request läuft
+    assert policy.acquire(416) == 320  # zwei laufen, Obergrenze ist die angefragte Größe
+    for _ in range(3):
+        policy.release(250.0)
+    assert policy.stats() == {"in_flight": 0, "median_latency_ms": 250.0}
+    assert policy.acquire(640) == 416  # Latenz-Median über zwei Schwellen
+    policy.release()
+
+    assert ResolutionPolicy([320, 640]).acquire(320) == 320
+
+
+def test_detect_batched_groups_requests_by_input_size(monkeypatch):
+    detector = _FakeDetector()
+    monkeypatch.setattr(handler, "MODEL", detector)
+    monkeypatch.setattr(handler, "non_max_suppression", detector.nms)
+
+    dets = handler.detect_batched([torch.zeros((1, 3, 64, 64)), torch.zeros((1, 3, 32, 32)), torch.zeros((1, 3, 64, 64))])
+
+    assert sorted(detector.batch_sizes) == [1, 2]
+    assert [det[0, 5].item() for det in dets] == [0, 0, 1]
+
+
+def _install_fake_detector(monkeypatch):
+    detector = _FakeDetector()
+    monkeypatch.setattr(handler, "MODEL", detector)
+    monkeypatch.setattr(handler, "non_max_suppression", detector.nms)
+    monkeypatch.setattr(handler, "CLASS_NAMES", ["person", "bicycle"])
+    monkeypatch.setattr(handler, "BATCHER", None)
+    return detector
+
+
+def _call(event):
+    body, status = handle(event, None)[:2]
+    return json.loads(body), status
+
+
+def test_handle_rejects_too_many_json_images_before_decoding(monkeypatch):
+    _install_fake_detector(monkeypatch)
+    monkeypatch.setattr(handler, "MAX_IMAGES_PER_REQUEST", 2)
+    decoded = []
+    monkeypatch.setattr(handler.base64, "b64decode", lambda data, validate=False: decoded.append(data))
+    image = base64.b64encode(_jpeg_bytes((32, 32))).decode("ascii")
+
+    body, status = _call(FakeEvent(json.dumps({"images": [image] * 3})))
+
+    assert status == 400 and "Höchstens 2 Bilder" in body["error"]
+    assert decoded == []
+
+
+def test_handle_truncated_image_returns_400(monkeypatch):
+    _install_fake_detector(monkeypatch)
+
+    body, status = _call(FakeEvent(_jpeg_bytes((64, 48))[:200], content_type="image/jpeg"))
+
+    assert status == 400
+    assert body == {"error": "Bilddaten konnten nicht gelesen werden."}
+
+
+def test_handle_invalid_base64_image_returns_400(monkeypatch):
+    _install_fake_detector(monkeypatch)
+
+    body, status = _call(FakeEvent(json.dumps({"image": "kein base64!"})))
+
+    assert status == 400
+    assert body == {"error": "Ungültiger Base64-kodierter Bildstring."}
+
+
+def test_handle_accepts_raw_binary_and_multipart_uploads(monkeypatch):
+    _install_fake_detector(monkeypatch)
+    jpeg = _jpeg_bytes((64, 48))
+    multipart_body, multipart_type = _multipart([("note", None, b"hallo"), ("image", "bild.jpg", jpeg)])
+
+    for event in (FakeEvent(jpeg, content_type="application/octet-stream"),
+                  FakeEvent(jpeg, content_type="image/jpeg"),
+                  FakeEvent(multipart_body, content_type=multipart_type)):
+        body, status = _call(event)
+        assert status == 200
+        assert body["image_size"] == [64, 48] and body["imgsz"] == 640
+        assert body["detections"][0]["name"] == "person"
+
+
+def test_handle_multipart_images_field_returns_results_per_image(monkeypatch):
+    detector = _install_fake_detector(monkeypatch)
+    body, content_type = _multipart([("images", "a.jpg", _jpeg_bytes((64, 48))),
+                                     ("images", "b.jpg", _jpeg_bytes((32, 32)))])
+
+    body, status = _call(FakeEvent(body, content_type=content_type))
+
+    assert status == 200 and detector.batch_sizes == [2]
+    assert [result["image_size"] for result in body["results"]] == [[64, 48], [32, 32]]
+
+
+def test_handle_json_image_and_images_with_format_and_imgsz(monkeypatch):
+    _install_fake_detector(monkeypatch)
+    encoded = base64.b64encode(_jpeg_bytes()).decode("ascii")
+
+    single, status = _call(FakeEvent(json.dumps({"image": encoded, "format": "array", "imgsz": 320})))
+    assert status == 200
+    assert single["imgsz"] == 320 and single["columns"] == ARRAY_COLUMNS
+
+    # Query-Parameter gelten, solange der JSON-Body sie nicht überschreibt
+    batch, status = _call(FakeEvent(json.dumps({"images": [encoded, "%%%"], "imgsz": 416}),
+                                    query={"format": "columns", "imgsz": "320"}))
+    assert status == 200 and batch["imgsz"] == 416
+    assert batch["results"][0]["detections"]["name"] == ["person"]
+    assert "error" in batch["results"][1]
+
+
+def test_handle_rejects_unknown_imgsz_and_format(monkeypatch):
+    _install_fake_detector(monkeypatch)
+    jpeg = _jpeg_bytes()
+
+    body, status = _call(FakeEvent(jpeg, content_type="image/jpeg", query={"imgsz": "333"}))
+    assert status == 400 and "imgsz" in body["error"]
+
+    body, status = _call(FakeEvent(jpeg, content_type="image/jpeg", query={"format": "xml"}))
+    assert status == 400 and "Ausgabeformat" in body["error"]
+
+
+def test_handle_rejects_imgsz_that_is_not_a_plain_integer(monkeypatch):
+    _install_fake_detector(monkeypatch)
+    jpeg = _jpeg_bytes()
+    encoded = base64.b64encode(jpeg).decode("ascii")
+
+    for query_size in ("0640", "640.7", "+640", " 640"):
+        body, status = _call(FakeEvent(jpeg, content_type="image/jpeg", query={"imgsz": query_size}))
+        assert status == 400 and "imgsz" in body["error"], query_size
+    for json_size in (640.7, 640.0, True, "640"):
+        body, status = _call(FakeEvent(json.dumps({"image": encoded, "imgsz": json_size})))
+        assert status == 400 and "imgsz" in body["error"], json_size
+
+    body, status = _call(FakeEvent(jpeg, content_type="image/jpeg", query={"imgsz": "320"}))
+    assert status == 200 and body["imgsz"] == 320
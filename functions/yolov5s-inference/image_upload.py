@@ -0,0 +1,124 @@
+import io
+from email.message import Message
+
+
+class BufferReader(io.RawIOBase):
+    """Lesbare, seekbare Datei-Sicht auf einen Puffer (bytes, memoryview) ohne Kopie.
+
+    PIL liest daraus nur die Abschnitte, die es tatsächlich braucht; der
+    Request-Body selbst wird weder dekodiert noch kopiert.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        else:
+            raise ValueError(f"Ungültiges whence: {whence}")
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def get_content_type(event):
+    """Content-Type-Header des Events (leer, wenn nicht vorhanden)."""
+    headers = getattr(event, "headers", None) or {}
+    return headers.get("Content-Type") or headers.get("content-type") or ""
+
+
+def media_type(content_type):
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def _content_type_param(content_type, name):
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.strip().lower() == name:
+            return value.strip().strip('"')
+    return None
+
+
+def iter_multipart_parts(body, content_type):
+    """Liefert (Header-Block als Text, Inhalt als memoryview-Slice) je Teil eines multipart-Bodys."""
+    boundary = _content_type_param(content_type, "boundary")
+    if not boundary:
+        raise ValueError("multipart/form-data ohne boundary-Parameter")
+
+    view = memoryview(body)
+    delimiter = b"--" + boundary.encode("latin-1")
+    pos = body.find(delimiter)
+    while pos != -1:
+        part_start = pos + len(delimiter)
+        if body[part_start:part_start + 2] == b"--":
+            break  # Schluss-Delimiter
+        part_start += 2  # CRLF nach dem Delimiter
+        header_end = body.find(b"\r\n\r\n", part_start)
+        if header_end == -1:
+            break
+        next_pos = body.find(b"\r\n" + delimiter, header_end + 4)
+        if next_pos == -1:
+            break
+
+        headers = bytes(view[part_start:header_end]).decode("latin-1")
+        yield headers, view[header_end + 4:next_pos]
+        pos = next_pos + 2
+
+
+def form_field(headers):
+    """(name, filename) aus dem Content-Disposition-Header eines Teils; fehlende Parameter sind None.
+
+    Die Parameter werden wie in E-Mail-Headern geparst, `name` und `filename`
+    werden also nicht verwechselt (ein Teil mit filename="image" heißt nicht "image").
+    """
+    message = Message()
+    for line in headers.split("\r\n"):
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "content-disposition":
+            message["Content-Disposition"] = value.strip()
+            break
+    return message.get_param("name", header="Content-Disposition"), \
+        message.get_param("filename", header="Content-Disposition")
+
+
+def extract_multipart_file(body, content_type, field_name="image"):
+    """Sucht in einem multipart/form-data-Body das Feld `field_name`.
+
+    Gibt den Inhalt als memoryview-Slice des Bodys zurück (keine Kopie).
+    Fehlt das Feld, wird der erste Teil mit Dateinamen genommen; gibt es
+    keinen, ist das Ergebnis None.
+    """
+    fallback = None
+    for headers, content in iter_multipart_parts(body, content_type):
+        name, filename = form_field(headers)
+        if name == field_name:
+            return content
+        if fallback is None and filename is not None:
+            fallback = content
+    return fallback
+
+
+def extract_multipart_files(body, content_type, field_name="images"):
+    """Alle Teile mit dem Feldnamen `field_name` in Body-Reihenfolge (memoryview-Slices)."""
+    return [content for headers, content in iter_multipart_parts(body, content_type)
+            if form_field(headers)[0] == field_name]
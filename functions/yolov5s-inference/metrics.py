@@ -0,0 +1,265 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Obergrenzen der Histogramm-Buckets in Sekunden (le), +Inf kommt implizit dazu
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Buckets für Einträge pro Micro-Batch
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Schritte des aktuellen Requests für Server-Timing; der Executor kopiert den Kontext in seine Worker,
+# der Micro-Batcher trägt gemeinsame Schritte über shared_timings() nach
+_CURRENT_TIMINGS = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Kumulatives Histogramm mit festen Buckets, wie es Prometheus erwartet."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(le, kumulierte Anzahl), ...] einschließlich +Inf."""
+        total, result = 0, []
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _format_le(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def add_headers(response, headers):
+    """Ergänzt eine Handler-Antwort (str, (Body, Status) oder (Body, Status, Header)) um Header."""
+    if not headers:
+        return response
+    if isinstance(response, tuple):
+        body, status = response[0], response[1]
+        merged = dict(response[2]) if len(response) > 2 else {}
+    else:
+        body, status, merged = response, 200, {}
+    merged.update(headers)
+    return body, status, merged
+
+
+def response_status(response):
+    return response[1] if isinstance(response, tuple) and len(response) > 1 else 200
+
+
+@contextmanager
+def shared_timings(contexts):
+    """Schritte, die für mehrere Requests gemeinsam laufen (Micro-Batch), bei jedem dieser Requests vermerken.
+
+    `contexts` sind die beim Einreihen kopierten Kontexte der Requests; ihre
+    Schrittlisten erhalten die im Block gemessenen Schritte, die Histogramme
+    zählen den gemeinsamen Schritt dagegen nur einmal.
+    """
+    timings = []
+    token = _CURRENT_TIMINGS.set(timings)
+    try:
+        yield
+    finally:
+        _CURRENT_TIMINGS.reset(token)
+        for context in contexts:
+            request_timings = context.get(_CURRENT_TIMINGS)
+            if request_timings is not None:
+                request_timings.extend(timings)
+
+
+def register_executor(metrics, executor):
+    """Warteschlange, Auslastung und Ablehnungen eines InferenceExecutor als Metriken anmelden."""
+    metrics.register_value("executor_queue_depth", "Wartende Aufträge im Inferenz-Executor.",
+                           executor.queue_depth)
+    metrics.register_value("executor_busy_workers", "Gerade rechnende Worker des Inferenz-Executors.",
+                           lambda: executor.stats()["busy"])
+    metrics.register_value("executor_rejected_total", "Wegen voller Warteschlange abgelehnte Requests (429).",
+                           lambda: executor.stats()["rejected"], "counter")
+    metrics.register_value("executor_expired_total", "Wegen abgelaufener Frist verworfene Requests (503).",
+                           lambda: executor.stats()["expired"], "counter")
+
+
+def register_batcher(metrics, batcher):
+    """Warteschlange, Batchgrößen und Wartezeiten eines MicroBatcher als Metriken anmelden.
+
+    Die Histogramme batch_size und batch_wait_seconds füllt der Batcher selbst,
+    wenn er mit metrics=... erzeugt wurde.
+    """
+    metrics.register_histogram("batch_size", "Einträge pro Micro-Batch.", BATCH_SIZE_BUCKETS)
+    metrics.register_histogram("batch_wait_seconds",
+                               "Längste Wartezeit eines Eintrags bis zum Start seines Micro-Batches.")
+    metrics.register_value("batcher_queue_depth", "Wartende Einträge im Micro-Batcher.", batcher.queue_depth)
+    metrics.register_value("batcher_batches_total", "Verarbeitete Micro-Batches.",
+                           lambda: batcher.stats()["batches"], "counter")
+    metrics.register_value("batcher_items_total", "In Micro-Batches verarbeitete Einträge.",
+                           lambda: batcher.stats()["items"], "counter")
+    metrics.register_value("batcher_rejected_total", "Wegen voller Batch-Warteschlange abgelehnte Requests (429).",
+                           lambda: batcher.stats()["rejected"], "counter")
+    metrics.register_value("batcher_last_batch_size", "Einträge im zuletzt verarbeiteten Micro-Batch.",
+                           lambda: batcher.stats()["last_batch_size"])
+    metrics.register_value("batcher_last_max_wait_seconds",
+                           "Längste Wartezeit eines Eintrags im zuletzt verarbeiteten Micro-Batch.",
+                           lambda: batcher.stats()["last_max_wait_ms"] / 1000.0)
+
+
+class Metrics:
+    """Leichtgewichtige Instrumentierung: Histogramme je Verarbeitungsschritt im Speicher.
+
+    stage(name) misst einen Abschnitt mit time.perf_counter() und trägt die
+    Dauer in das Histogramm des Schritts ein, zusätzlich in die Liste des
+    laufenden Requests (für den Server-Timing-Header). render() liefert alles
+    im Prometheus-Textformat, zusammen mit Ladezeit, Bereitschaft und den
+    über register_value() und register_histogram() angemeldeten Werten. Mit
+    enabled=False sind alle Messungen No-ops.
+    """
+
+    def __init__(self, prefix="inference", enabled=True, buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._requests = Histogram(self.buckets)
+        self._responses = {}
+        self._values = {} # Name -> (Typ, Hilfetext, Wert oder Funktion ohne Argumente)
+        self._histograms = {} # Name -> (Hilfetext, Histogram)
+        self.load_seconds = None
+        self.ready = False
+
+    def set_loaded(self, seconds, ready):
+        """Kaltstart: Dauer des Modell-Ladens und ob das Modell bereit ist."""
+        self.load_seconds = seconds
+        self.ready = bool(ready)
+
+    def register_value(self, name, help_text, value, metric_type="gauge"):
+        """Zusätzlicher Gauge oder Counter; `value` ist eine Zahl oder eine Funktion, die beim Abruf gelesen wird."""
+        self._values[name] = (metric_type, help_text, value)
+
+    def register_histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """Zusätzliches Histogramm mit eigenen Buckets (z. B. Batchgrößen), gefüllt über observe_value()."""
+        self._histograms[name] = (help_text, Histogram(buckets))
+
+    def observe_value(self, name, value):
+        """Trägt einen Wert in ein über register_histogram() angemeldetes Histogramm ein."""
+        if not self.enabled or name not in self._histograms:
+            return
+        with self._lock:
+            self._histograms[name][1].observe(value)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        timings = _CURRENT_TIMINGS.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def queued(self, fn):
+        """Umhüllt fn so, dass die Wartezeit bis zum Start als Schritt "queue" gemessen wird."""
+        if not self.enabled:
+            return fn
+        enqueued = time.perf_counter()
+
+        def run(*args):
+            self.observe("queue", time.perf_counter() - enqueued)
+            return fn(*args)
+        return run
+
+    def start_request(self):
+        """Beginnt die Messung eines Requests; Rückgabewert an finish_request() übergeben."""
+        if not self.enabled:
+            return None
+        timings = []
+        return time.perf_counter(), timings, _CURRENT_TIMINGS.set(timings)
+
+    def finish_request(self, request, status):
+        """Beendet die Messung und gibt den Server-Timing-Wert des Requests zurück ("" wenn aus)."""
+        if request is None:
+            return ""
+        start, timings, token = request
+        _CURRENT_TIMINGS.reset(token)
+        total = time.perf_counter() - start
+        with self._lock:
+            self._requests.observe(total)
+            self._responses[str(status)] = self._responses.get(str(status), 0) + 1
+        entries = [f"{stage};dur={seconds * 1000.0:.2f}" for stage, seconds in timings]
+        entries.append(f"total;dur={total * 1000.0:.2f}")
+        return ", ".join(entries)
+
+    def render(self):
+        """Alle Metriken im Prometheus-Textformat (Version 0.0.4)."""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_model_ready 1, wenn das Modell geladen und bereit ist.",
+            f"# TYPE {p}_model_ready gauge",
+            f"{p}_model_ready {int(self.ready)}",
+        ]
+        if self.load_seconds is not None:
+            lines += [
+                f"# HELP {p}_model_load_seconds Dauer des Modell-Ladens beim Kaltstart.",
+                f"# TYPE {p}_model_load_seconds gauge",
+                f"{p}_model_load_seconds {self.load_seconds:.6f}",
+            ]
+        for name, (metric_type, help_text, value) in sorted(self._values.items()):
+            value = value() if callable(value) else value
+            lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} {metric_type}", f"{p}_{name} {value}"]
+
+        with self._lock:
+            stages = {name: (h.cumulative(), h.sum, h.count) for name, h in sorted(self._stages.items())}
+            requests = (self._requests.cumulative(), self._requests.sum, self._requests.count)
+            responses = sorted(self._responses.items())
+            histograms = [(name, help_text, (h.cumulative(), h.sum, h.count))
+                          for name, (help_text, h) in sorted(self._histograms.items())]
+
+        lines += [f"# HELP {p}_responses_total Beantwortete Requests nach HTTP-Status.",
+                  f"# TYPE {p}_responses_total counter"]
+        lines += [f'{p}_responses_total{{status="{status}"}} {count}' for status, count in responses]
+
+        lines += [f"# HELP {p}_request_duration_seconds Gesamtdauer eines Requests im Handler.",
+                  f"# TYPE {p}_request_duration_seconds histogram"]
+        lines += self._histogram_lines(f"{p}_request_duration_seconds", "", *requests)
+
+        lines += [f"# HELP {p}_stage_duration_seconds Dauer je Verarbeitungsschritt.",
+                  f"# TYPE {p}_stage_duration_seconds histogram"]
+        for name, values in stages.items():
+            lines += self._histogram_lines(f"{p}_stage_duration_seconds", f'stage="{name}",', *values)
+
+        for name, help_text, values in histograms:
+            lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} histogram"]
+            lines += self._histogram_lines(f"{p}_{name}", "", *values)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(metric, labels, cumulative, total, count):
+        lines = [f'{metric}_bucket{{{labels}le="{_format_le(bound)}"}} {n}' for bound, n in cumulative]
+        plain = f"{{{labels.rstrip(',')}}}" if labels else ""
+        lines.append(f"{metric}_sum{plain} {total:.6f}")
+        lines.append(f"{metric}_count{plain} {count}")
+        return lines
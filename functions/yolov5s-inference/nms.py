@@ -0,0 +1,60 @@
+import torch
+import torchvision
+
+# Maximale Anzahl Kandidaten pro Bild, die in die NMS gehen (wie in YOLOv5)
+MAX_NMS = 30000
+
+
+def xywh2xyxy(x):
+    """(Mitte x, Mitte y, Breite, Höhe) -> (x1, y1, x2, y2)."""
+    y = torch.empty_like(x)
+    half_w, half_h = x[:, 2] / 2, x[:, 3] / 2
+    y[:, 0] = x[:, 0] - half_w
+    y[:, 1] = x[:, 1] - half_h
+    y[:, 2] = x[:, 0] + half_w
+    y[:, 3] = x[:, 1] + half_h
+    return y
+
+
+def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.45, classes=None, agnostic=False, max_det=300):
+    """Eigenständige NMS für rohe YOLOv5-Ausgaben (B, N, 5 + nc), ohne das YOLOv5-Repo.
+
+    Entspricht utils.general.non_max_suppression mit multi_label=False und ohne
+    Merge-NMS, filtert aber alle Bilder des Batches gemeinsam und ruft
+    torchvision.ops.batched_nms nur einmal auf (Gruppe = Bild und Klasse).
+    Gibt pro Bild einen (n, 6)-Tensor [x1, y1, x2, y2, conf, cls] zurück,
+    absteigend nach Konfidenz sortiert.
+    """
+    if isinstance(prediction, (list, tuple)):
+        prediction = prediction[0]
+    batch_size, _, width = prediction.shape
+    num_classes = width - 5
+
+    # Kandidaten aller Bilder auf einmal: Objektkonfidenz über dem Schwellenwert
+    image_idx, anchor_idx = (prediction[..., 4] > conf_thres).nonzero(as_tuple=True)
+    x = prediction[image_idx, anchor_idx]
+
+    # conf = obj_conf * cls_conf, nur die beste Klasse pro Box
+    conf, cls = (x[:, 5:] * x[:, 4:5]).max(1)
+    keep = conf > conf_thres
+    if classes is not None:
+        keep &= (cls[:, None] == torch.tensor(classes, device=cls.device)).any(1)
+    image_idx, x, conf, cls = image_idx[keep], x[keep], conf[keep], cls[keep]
+
+    counts = torch.bincount(image_idx, minlength=batch_size)
+    if len(counts) and counts.max() > MAX_NMS:
+        # Selten: pro Bild nur die MAX_NMS konfidentesten Boxen behalten
+        order = conf.argsort(descending=True)
+        order = order[image_idx[order].argsort(stable=True)]
+        starts = torch.cumsum(counts, 0) - counts
+        rank = torch.arange(len(order), device=order.device) - starts[image_idx[order]]
+        order = order[rank < MAX_NMS]
+        image_idx, x, conf, cls = image_idx[order], x[order], conf[order], cls[order]
+
+    boxes = xywh2xyxy(x[:, :4])
+    groups = image_idx if agnostic else image_idx * num_classes + cls
+    keep = torchvision.ops.batched_nms(boxes, conf, groups, iou_thres)  # absteigend nach conf
+
+    det = torch.cat((boxes[keep], conf[keep, None], cls[keep, None].to(boxes.dtype)), 1)
+    image_idx = image_idx[keep]
+    return [det[image_idx == i][:max_det] for i in range(batch_size)]
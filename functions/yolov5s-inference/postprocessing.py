@@ -0,0 +1,60 @@
+import torch
+
+# Spaltenreihenfolge des kompakten Array-Formats
+ARRAY_COLUMNS = ["xmin", "ymin", "xmax", "ymax", "confidence", "class_id"]
+OUTPUT_FORMATS = ("objects", "columns", "array")
+
+
+def build_class_name_table(names):
+    """Wandelt MODEL.names (dict oder Liste) in eine Liste, indiziert über class_id."""
+    if isinstance(names, dict):
+        table = ["unknown"] * (max(names) + 1 if names else 0)
+        for class_id, name in names.items():
+            table[int(class_id)] = name
+        return table
+    return list(names)
+
+
+def scale_boxes_to_original(det, ratio, pad, original_size):
+    """Rechnet xyxy-Boxen aus dem Letterbox-Raum in Pixel des Originalbilds zurück."""
+    det = det.clone()
+    pad_left, pad_top = pad
+    width, height = original_size
+    det[:, [0, 2]] = ((det[:, [0, 2]] - pad_left) / ratio).clamp_(0, width)
+    det[:, [1, 3]] = ((det[:, [1, 3]] - pad_top) / ratio).clamp_(0, height)
+    return det
+
+
+def serialize_detections(det, class_names, fmt="objects"):
+    """Serialisiert ein (N, 6)-Tensor [x1, y1, x2, y2, conf, cls] spaltenweise.
+
+    Gerundet wird für alle Detektionen auf einmal (in float64, damit die
+    Werte nach tolist() exakt gerundet bleiben); danach folgt pro Spalte
+    genau ein tolist(), statt .item() pro Detektion.
+    """
+    det = det.double()
+    boxes = (torch.round(det[:, :4] * 100) / 100).tolist()
+    confidences = (torch.round(det[:, 4] * 10000) / 10000).tolist()
+    class_ids = det[:, 5].to(torch.int64).tolist()
+    num_names = len(class_names)
+
+    if fmt == "array":
+        return {
+            "columns": ARRAY_COLUMNS,
+            "detections": [box + [conf, cls] for box, conf, cls in zip(boxes, confidences, class_ids)],
+            "names": {str(cls): class_names[cls] if cls < num_names else "unknown" for cls in set(class_ids)},
+        }
+
+    names = [class_names[cls] if cls < num_names else "unknown" for cls in class_ids]
+    if fmt == "columns":
+        xmin, ymin, xmax, ymax = (list(col) for col in zip(*boxes)) if boxes else ([], [], [], [])
+        return {"detections": {
+            "xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax,
+            "confidence": confidences, "class_id": class_ids, "name": names,
+        }}
+
+    return {"detections": [
+        {"xmin": box[0], "ymin": box[1], "xmax": box[2], "ymax": box[3],
+         "confidence": conf, "class_id": cls, "name": name}
+        for box, conf, cls, name in zip(boxes, confidences, class_ids, names)
+    ]}
@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+# Grauwert, mit dem YOLOv5 beim Letterboxing auffüllt
+LETTERBOX_FILL = 114
+_INV_255 = np.float32(1.0 / 255.0)
+
+_thread_local = threading.local()
+
+
+def letterbox_params(width, height, size):
+    """Skalierungsfaktor, skalierte Größe und Padding (links, oben) für ein size x size-Letterbox."""
+    ratio = min(size / width, size / height)
+    new_width, new_height = max(1, round(width * ratio)), max(1, round(height * ratio))
+    pad_left = round((size - new_width) / 2 - 0.1)
+    pad_top = round((size - new_height) / 2 - 0.1)
+    return ratio, (new_width, new_height), (pad_left, pad_top)
+
+
+def decode_for_size(fp, size):
+    """Öffnet ein Bild und dekodiert es nur so groß, wie das Letterbox es braucht.
+
+    Bei JPEGs skaliert draft() schon beim Dekodieren über die DCT (1/2, 1/4,
+    1/8), sodass Handy-Fotos nicht in voller Auflösung entpackt werden. Gibt
+    das RGB-Bild und die Größe des Originals zurück.
+    """
+    img = Image.open(fp)
+    original_size = img.size
+    if img.format == "JPEG":
+        _, target_size, _ = letterbox_params(*original_size, size)
+        img.draft("RGB", target_size)
+    return img.convert("RGB"), original_size
+
+
+def batch_buffer(size, batch=1):
+    """Wiederverwendbarer (batch, 3, size, size)-Float-Puffer, einer pro Thread und Größe.
+
+    Wächst bei Bedarf und wird danach für kleinere Batches als Sicht
+    weiterverwendet.
+    """
+    buffers = getattr(_thread_local, "buffers", None)
+    if buffers is None:
+        buffers = _thread_local.buffers = {}
+    buffer = buffers.get(size)
+    if buffer is None or buffer.shape[0] < batch:
+        buffer = buffers[size] = torch.full((batch, 3, size, size), LETTERBOX_FILL / 255.0)
+    return buffer[:batch]
+
+
+def preprocess_into(fp, size, out):
+    """Dekodiert, skaliert und schreibt ein Bild letterboxed in `out` (3, size, size).
+
+    Ein einziges Resize direkt auf die Zielgröße, danach wird das uint8-Array
+    in einem Durchgang (Umwandlung nach float32 und Skalierung auf [0, 1])
+    direkt in den Float-Puffer geschrieben, ohne PIL->Tensor->Normalize-Kette.
+
+    Gibt (ratio, pad, original_size) zurück.
+    """
+    img, original_size = decode_for_size(fp, size)
+    ratio, (new_width, new_height), (pad_left, pad_top) = letterbox_params(*original_size, size)
+    if img.size != (new_width, new_height):
+        img = img.resize((new_width, new_height), Image.BILINEAR, reducing_gap=3.0)
+
+    fill = LETTERBOX_FILL / 255.0
+    # Nur die Randstreifen neu füllen, die Bildfläche wird gleich überschrieben
+    out[:, :pad_top, :].fill_(fill)
+    out[:, pad_top + new_height:, :].fill_(fill)
+    out[:, :, :pad_left].fill_(fill)
+    out[:, :, pad_left + new_width:].fill_(fill)
+
+    # numpy()-Sicht teilt den Speicher mit dem Tensor
+    target = out.numpy()[:, pad_top:pad_top + new_height, pad_left:pad_left + new_width]
+    np.multiply(np.asarray(img).transpose(2, 0, 1), _INV_255, out=target)
+    return ratio, (pad_left, pad_top), original_size
+
+
+def preprocess_image(fp, size):
+    """Wie preprocess_into(), aber in den (1, 3, size, size)-Puffer des aufrufenden Threads.
+
+    Der zurückgegebene Tensor wird beim nächsten Aufruf im selben Thread
+    überschrieben. Gibt (Tensor, ratio, pad, original_size) zurück.
+    """
+    tensor = batch_buffer(size, 1)
+    ratio, pad, original_size = preprocess_into(fp, size, tensor[0])
+    return tensor, ratio, pad, original_size
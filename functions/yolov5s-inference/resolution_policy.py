@@ -0,0 +1,59 @@
+import threading
+from collections import deque
+
+
+def parse_sizes(value):
+    """Kommagetrennte Größen wie "640,320" -> [320, 640] (sortiert, ohne Duplikate)."""
+    return sorted({int(part) for part in value.split(",") if part.strip()})
+
+
+def parse_thresholds(value):
+    """Kommagetrennte Schwellenwerte -> sortierte Float-Liste; leer -> [] (Kriterium aus)."""
+    return sorted(float(part) for part in value.split(",") if part.strip())
+
+
+class ResolutionPolicy:
+    """Wählt unter Last automatisch eine kleinere Eingabegröße.
+
+    Jede überschrittene Schwelle in `queue_depths` (gleichzeitig laufende
+    Requests außer dem aktuellen) bzw. `latency_ms` (Median der letzten
+    `latency_window` Inferenzen) senkt die Auflösung um eine Stufe aus
+    `sizes`; es zählt das stärkere der beiden Kriterien. Die angefragte Größe
+    ist die Obergrenze, nach oben wird nie gewechselt.
+    """
+
+    def __init__(self, sizes, queue_depths=(), latency_ms=(), latency_window=20):
+        self.sizes = sorted(sizes, reverse=True)
+        self.queue_depths = sorted(queue_depths)
+        self.latency_ms = sorted(latency_ms)
+        self._latencies = deque(maxlen=max(1, int(latency_window)))
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, requested_size):
+        """Meldet einen Request an und gibt die zu verwendende Größe zurück; danach release() aufrufen."""
+        with self._lock:
+            depth = self._in_flight
+            self._in_flight += 1
+            latency = self._median_latency()
+
+        steps = max(sum(depth >= t for t in self.queue_depths),
+                    sum(latency >= t for t in self.latency_ms) if latency is not None else 0)
+        candidates = [size for size in self.sizes if size <= requested_size] or [requested_size]
+        return candidates[min(steps, len(candidates) - 1)]
+
+    def release(self, latency_ms=None):
+        with self._lock:
+            self._in_flight -= 1
+            if latency_ms is not None:
+                self._latencies.append(latency_ms)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": self._in_flight, "median_latency_ms": self._median_latency()}
+
+    def _median_latency(self):
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[len(ordered) // 2]
@@ -0,0 +1,314 @@
+# Optionaler Multi-Modell-Host: lädt die Handler von logreg-inference,
+# distilbert-finetuned-inference und yolov5s-inference in EINEN Python-Prozess und stellt
+# sie wie das Gateway unter /function/<FUNKTION>[/Unterpfad] bereit. Statt drei Containern
+# mit je eigenem Interpreter, torch-Import und Thread-Pool teilen sich die Modelle eine
+# torch-Laufzeit mit gemeinsamem Thread-Budget:
+#   - Intra-Op-Threads pro Forward-Pass: THREAD_BUDGET // FORWARD_SLOTS, Inter-Op-Threads: 1
+#   - höchstens FORWARD_SLOTS Forward-Passes von DistilBERT und YOLO gleichzeitig (die Handler
+#     rufen ihr Modell über FORWARD_GATE auf, der Host setzt dort eine gemeinsame Semaphore),
+#     damit sich die torch-Modelle nicht gegenseitig die Kerne wegnehmen
+# Modelle werden erst mit dem ersten Request geladen (PRELOAD "1" lädt alle beim Start) und
+# nach MODEL_IDLE_TIMEOUT ohne Request wieder entladen: Executor, Micro-Batcher und
+# Log-Writer werden beendet, die Module verworfen und der Heap an das System zurückgegeben.
+#
+# Jede Funktion wird wie im Container als eigenes Paket importiert (relative Importe wie
+# "from .metrics import ..." funktionieren), aber unter einem eigenen Namen, weil alle drei
+# im Template "function" heißen. Beim Import gilt die environment-Sektion aus <FUNKTION>.yml
+# (falls PyYAML installiert ist) über der Umgebung des Hosts, INFERENCE_THREADS setzt der Host.
+# Diese Umgebung bekommt das Paket als Attribut ENVIRONMENT, die Handler lesen ihre
+# Konfiguration daraus; os.environ des Host-Prozesses bleibt unverändert.
+# Die Modell-Artefakte müssen wie für den Build im jeweiligen Funktionsordner liegen.
+#
+# Verwendung: python host/model_host.py
+#   HOST_MODELS         Komma-Liste der Funktionen (Standard: alle drei)
+#   PRELOAD             "1" lädt alle Modelle beim Start (Standard "0": beim ersten Request)
+#   MODEL_IDLE_TIMEOUT  Entladen nach dieser Zeit ohne Request, z. B. "10m" ("0" = nie, Standard "10m")
+#   THREAD_BUDGET       Threads für alle Modelle zusammen (Standard: CPU-Limit der cgroup)
+#   FORWARD_SLOTS       gleichzeitige torch-Forward-Passes (Standard "1")
+#   PORT, BIND_ADDRESS  Standard 8080 auf 0.0.0.0
+# Zusätzlich: GET /healthz und GET /host/status (geladene Modelle, Ladezeiten, Speicher).
+# Events und Antworten wie im Template baut template_server.py (auch für ml-tests/local_gateway.py).
+import ctypes
+import gc
+import importlib
+import importlib.machinery
+import importlib.util
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from template_server import TemplateRequestHandler, TemplateServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FUNCTIONS_DIR = os.path.abspath(os.path.join(ROOT, "functions"))
+ALL_MODELS = ("logreg-inference", "distilbert-finetuned-inference", "yolov5s-inference")
+TORCH_MODELS = ("distilbert-finetuned-inference", "yolov5s-inference")
+
+
+def load_shared_module(name):
+    """Lädt ein gemeinsames Modul der Funktionen (in allen Funktionsordnern identisch) für den Host."""
+    spec = importlib.util.spec_from_file_location(f"model_host_{name}",
+                                                  os.path.join(FUNCTIONS_DIR, "logreg-inference", f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Dauer-Parser, CPU-Limit und JSON-Logging wie in den Funktionen
+inference_executor = load_shared_module("inference_executor")
+log_pipeline = load_shared_module("log_pipeline")
+parse_duration = inference_executor.parse_duration
+container_cpu_limit = inference_executor.container_cpu_limit
+log = log_pipeline.configure_logging("model_host")
+
+HOST_MODELS = [name.strip() for name in os.environ.get("HOST_MODELS", ",".join(ALL_MODELS)).split(",") if name.strip()]
+PRELOAD = os.environ.get("PRELOAD", "0") == "1"
+MODEL_IDLE_TIMEOUT_S = parse_duration(os.environ.get("MODEL_IDLE_TIMEOUT", "10m")) or 0
+THREAD_BUDGET = int(os.environ.get("THREAD_BUDGET", "0")) or container_cpu_limit()
+FORWARD_SLOTS = max(1, int(os.environ.get("FORWARD_SLOTS", "1")))
+INTRA_OP_THREADS = max(1, THREAD_BUDGET // FORWARD_SLOTS)
+# Gemeinsame Begrenzung der Forward-Passes aller torch-Modelle (ersetzt FORWARD_GATE der Handler)
+FORWARD_GATE = threading.BoundedSemaphore(FORWARD_SLOTS)
+# Das Thread-Budget von torch ist prozessweit und wird nur einmal gesetzt
+_TORCH_LOCK = threading.Lock()
+
+
+def memory_mb():
+    """RSS des Prozesses in MB (Linux, /proc/self/status), sonst None."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+def release_heap():
+    """Gibt freie Heap-Seiten von glibc an das System zurück (sonst bleibt der RSS nach dem Entladen hoch)."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass # keine glibc (z. B. musl, macOS)
+
+
+def function_environment(function_name, functions_dir=FUNCTIONS_DIR):
+    """environment-Sektion aus <FUNKTION>.yml neben dem Funktionsordner als Dict (leer ohne Datei oder PyYAML)."""
+    path = os.path.join(os.path.dirname(functions_dir), f"{function_name}.yml")
+    try:
+        import yaml
+        with open(path, encoding="utf-8") as f:
+            stack = yaml.safe_load(f) or {}
+    except (ImportError, OSError) as e:
+        log.warning(f"{function_name}: keine Umgebung aus '{path}' ({e})")
+        return {}
+    function = (stack.get("functions") or {}).get(function_name) or {}
+    return {str(key): str(value) for key, value in (function.get("environment") or {}).items()}
+
+
+class ModelSlot:
+    """Eine Funktion im Host: lädt ihren Handler beim ersten Zugriff und entlädt ihn, wenn er ruht.
+
+    environment ergänzt die Umgebung der Funktion (Host-Umgebung, darüber <FUNKTION>.yml).
+    """
+
+    def __init__(self, function_name, functions_dir=FUNCTIONS_DIR, environment=None):
+        self.name = function_name
+        self.function_dir = os.path.join(functions_dir, function_name)
+        if not os.path.isdir(self.function_dir):
+            raise ValueError(f"Unbekannte Funktion '{function_name}'")
+        self.package = "hosted_" + function_name.replace("-", "_")
+        self.environment = {**os.environ, **function_environment(function_name, functions_dir),
+                            **(environment or {}), "INFERENCE_THREADS": str(INTRA_OP_THREADS)}
+        self.handler = None
+        self.in_flight = 0
+        self.last_used = None
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Handler für einen Request; lädt das Modell bei Bedarf. Danach release() aufrufen."""
+        with self._lock:
+            if self.handler is None:
+                self._load()
+            self.in_flight += 1
+            self.last_used = time.monotonic()
+            return self.handler
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
+    def peek(self):
+        """Geladener Handler oder None, ohne zu laden (für Metrik-Abfragen)."""
+        return self.handler
+
+    def evict_if_idle(self, idle_timeout_s):
+        with self._lock:
+            if self.handler is None or self.in_flight or time.monotonic() - self.last_used < idle_timeout_s:
+                return False
+            self._unload()
+            return True
+
+    def _load(self):
+        start = time.perf_counter()
+        memory_before = memory_mb()
+        if self.name in TORCH_MODELS:
+            configure_torch_runtime()
+        spec = importlib.machinery.ModuleSpec(self.package, None, is_package=True)
+        spec.submodule_search_locations = [self.function_dir]
+        package = importlib.util.module_from_spec(spec)
+        package.ENVIRONMENT = self.environment
+        sys.modules[self.package] = package
+        try:
+            handler = importlib.import_module(self.package + ".handler")
+        except BaseException:
+            self._drop_modules()
+            raise
+        if hasattr(handler, "FORWARD_GATE"):
+            handler.FORWARD_GATE = FORWARD_GATE
+        self.handler = handler
+        self.loads += 1
+        self.load_seconds = time.perf_counter() - start
+        log.info(f"{self.name} geladen in {self.load_seconds:.2f} s, RSS {memory_before} -> {memory_mb()} MB")
+
+    def _unload(self):
+        handler, self.handler = self.handler, None
+        memory_before = memory_mb()
+        # Erst den Batcher (er wartet auf Requests aus den Executor-Threads), dann den Executor
+        for name in ("BATCHER", "EXECUTOR"):
+            component = getattr(handler, name, None)
+            if component is not None:
+                component.shutdown()
+        function_log_pipeline = sys.modules.get(self.package + ".log_pipeline")
+        if function_log_pipeline is not None:
+            function_log_pipeline.shutdown_logging(self.package)
+        del handler
+        self._drop_modules()
+        release_heap()
+        self.evictions += 1
+        log.info(f"{self.name} entladen, RSS {memory_before} -> {memory_mb()} MB")
+
+    def _drop_modules(self):
+        for module_name in [name for name in sys.modules if name == self.package or name.startswith(self.package + ".")]:
+            del sys.modules[module_name]
+
+    def status(self):
+        return {
+            "loaded": self.handler is not None,
+            "in_flight": self.in_flight,
+            "idle_seconds": None if self.last_used is None else round(time.monotonic() - self.last_used, 1),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+        }
+
+
+_TORCH_CONFIGURED = False
+
+
+def configure_torch_runtime():
+    """Eine torch-Laufzeit für alle Modelle: Thread-Budget einmal setzen, bevor das erste torch-Modell lädt.
+
+    torch wird erst mit dem ersten torch-Modell importiert, ein Host, der bisher nur
+    logreg bedient hat, bleibt so klein wie der logreg-Container.
+    """
+    global _TORCH_CONFIGURED
+    with _TORCH_LOCK:
+        if _TORCH_CONFIGURED:
+            return
+        _TORCH_CONFIGURED = True
+        import torch
+        torch.set_num_threads(INTRA_OP_THREADS)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Nur vor der ersten parallelen Operation erlaubt
+    log.info(f"torch {torch.__version__}: {INTRA_OP_THREADS} Intra-Op-Threads x {FORWARD_SLOTS} Forward-Slots "
+             f"(Budget {THREAD_BUDGET}), 1 Inter-Op-Thread")
+
+
+def evict_idle_models(slots, idle_timeout_s, stop):
+    interval = min(30.0, max(1.0, idle_timeout_s / 4))
+    while not stop.wait(interval):
+        for slot in slots.values():
+            try:
+                slot.evict_if_idle(idle_timeout_s)
+            except Exception as e: # Entladen darf den Host nicht beenden
+                log.exception(f"{slot.name}: Entladen fehlgeschlagen ({e})")
+
+
+def make_request_handler(slots):
+
+    class HostRequestHandler(TemplateRequestHandler):
+        def route(self, url):
+            if url.path == "/host/status":
+                return self.send(json.dumps(self._status()), 200, {})
+            parts = url.path.split("/", 3)
+            slot = slots.get(parts[2]) if len(parts) > 2 and parts[1] == "function" else None
+            if slot is None:
+                return self.not_found(url)
+            event = self.read_event(url, "/" + parts[3] if len(parts) > 3 else "/")
+            metrics_path = slot.environment.get("METRICS_PATH", "/metrics")
+            if event.method == "GET" and event.path == metrics_path and slot.peek() is None:
+                # Scrapes sollen ein entladenes Modell nicht wieder laden
+                return self.send(b"# TYPE inference_model_ready gauge\ninference_model_ready 0\n", 200,
+                                 {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+            try:
+                handler = slot.acquire()
+            except Exception as e:
+                log.exception(f"{slot.name}: Laden fehlgeschlagen ({e})")
+                return self.send(json.dumps({"error": f"Modell konnte nicht geladen werden: {e}"}), 503, {})
+            try:
+                response = self.call_handler(handler, event)
+            finally:
+                slot.release()
+            self.send(*response)
+
+        def _status(self):
+            return {
+                "models": {name: slot.status() for name, slot in slots.items()},
+                "thread_budget": THREAD_BUDGET,
+                "intra_op_threads": INTRA_OP_THREADS,
+                "forward_slots": FORWARD_SLOTS,
+                "idle_timeout_seconds": MODEL_IDLE_TIMEOUT_S,
+                "rss_mb": memory_mb(),
+            }
+
+    return HostRequestHandler
+
+
+def serve(port=8080, host="0.0.0.0"):
+    slots = {name: ModelSlot(name) for name in HOST_MODELS}
+    if PRELOAD:
+        for slot in slots.values():
+            slot.acquire()
+            slot.release()
+    stop = threading.Event()
+    if MODEL_IDLE_TIMEOUT_S > 0:
+        threading.Thread(target=evict_idle_models, args=(slots, MODEL_IDLE_TIMEOUT_S, stop),
+                         name="model-eviction", daemon=True).start()
+    server = TemplateServer((host, port), make_request_handler(slots))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0)) # Container-Stopp wie Strg+C
+    log.info(f"Host bereit unter http://{host}:{server.server_port}/function/<FUNKTION> für {', '.join(slots)}, "
+             f"RSS {memory_mb()} MB")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve(int(os.environ.get("PORT", "8080")), os.environ.get("BIND_ADDRESS", "0.0.0.0"))
@@ -0,0 +1,176 @@
+import glob
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+import model_host
+
+LOGREG = "logreg-inference"
+
+# Funktion ohne Modell: meldet, wann sie im FORWARD_GATE war
+GATED_HANDLER = '''import contextlib
+import json
+import time
+
+FORWARD_GATE = contextlib.nullcontext()
+
+
+def handle(event, context):
+    with FORWARD_GATE:
+        start = time.monotonic()
+        time.sleep(0.05)
+        end = time.monotonic()
+    return json.dumps({"start": start, "end": end}), 200
+'''
+
+
+def _write_logreg_function(functions_dir):
+    """Kopiert logreg-inference mit einem frisch trainierten, gefalteten Modell nach functions_dir."""
+    source = os.path.join(model_host.FUNCTIONS_DIR, LOGREG)
+    target = functions_dir / LOGREG
+    target.mkdir(parents=True)
+    for path in glob.glob(os.path.join(source, "*.py")):
+        if not path.endswith("_test.py"):
+            shutil.copy(path, target)
+
+    spec = importlib.util.spec_from_file_location("model_host_test_fused_model", target / "fused_model.py")
+    fused_model = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(fused_model)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 8)) * 10 + 50
+    y = (X[:, 1] + rng.normal(size=200) > 50).astype(int)
+    scaler = StandardScaler().fit(X)
+    clf = LogisticRegression(max_iter=1000).fit(scaler.transform(X), y)
+    fused_model.save_fused_model(target / "logistic_diabetes_model.npz", scaler, clf)
+    return X
+
+
+@pytest.fixture
+def serve_slots():
+    """Startet einen TemplateServer auf einem freien Port; liefert eine Funktion slots -> Basis-URL."""
+    servers, all_slots = [], []
+
+    def start(slots):
+        server = model_host.TemplateServer(("127.0.0.1", 0), model_host.make_request_handler(slots))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        all_slots.extend(slots.values())
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    for slot in all_slots:
+        slot.evict_if_idle(0)
+
+
+def _request(url, payload=None):
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=30) as response:
+            return response.status, response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+def _loaded_modules(slot):
+    return [name for name in sys.modules if name == slot.package or name.startswith(slot.package + ".")]
+
+
+def test_host_loads_logreg_on_first_request_and_routes(tmp_path, serve_slots):
+    functions_dir = tmp_path / "functions"
+    X = _write_logreg_function(functions_dir)
+    slot = model_host.ModelSlot(LOGREG, str(functions_dir))
+    url = serve_slots({LOGREG: slot})
+
+    status, body = _request(f"{url}/function/{LOGREG}/metrics")
+    assert status == 200 and "inference_model_ready 0" in body
+    assert slot.peek() is None and slot.loads == 0
+
+    status, body = _request(f"{url}/function/{LOGREG}", {"features": X[0].tolist()})
+    assert status == 200 and json.loads(body)["prediction"] in (0, 1)
+    assert slot.loads == 1 and slot.peek() is not None
+
+    status, body = _request(f"{url}/function/{LOGREG}/metrics")
+    assert status == 200 and "inference_model_ready 1" in body
+    assert _request(f"{url}/function/unbekannt", {"features": [1]})[0] == 404
+    status, body = _request(f"{url}/host/status")
+    assert status == 200 and json.loads(body)["models"][LOGREG]["loaded"] is True
+
+
+def test_host_evicts_idle_model_and_reloads_on_next_request(tmp_path, serve_slots):
+    functions_dir = tmp_path / "functions"
+    X = _write_logreg_function(functions_dir)
+    slot = model_host.ModelSlot(LOGREG, str(functions_dir))
+    url = serve_slots({LOGREG: slot})
+    stop = threading.Event()
+    evictor = threading.Thread(target=model_host.evict_idle_models, args=({LOGREG: slot}, 0.2, stop), daemon=True)
+
+    assert _request(f"{url}/function/{LOGREG}", {"features": X[0].tolist()})[0] == 200
+    evictor.start()
+    try:
+        for _ in range(60):
+            if slot.peek() is None:
+                break
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        evictor.join(timeout=5)
+
+    assert slot.peek() is None and slot.evictions == 1
+    assert _loaded_modules(slot) == []
+    status, body = _request(f"{url}/function/{LOGREG}", {"features": X[1].tolist()})
+    assert status == 200 and "prediction" in json.loads(body)
+    assert slot.loads == 2
+
+
+def test_slot_environment_reaches_handler_without_touching_os_environ(tmp_path, serve_slots):
+    functions_dir = tmp_path / "functions"
+    _write_logreg_function(functions_dir)
+    environ_before = dict(os.environ)
+    slot = model_host.ModelSlot(LOGREG, str(functions_dir), environment={"INFERENCE_MAX_QUEUE": "7"})
+    serve_slots({LOGREG: slot})
+
+    handler = slot.acquire()
+    slot.release()
+
+    assert handler.INFERENCE_MAX_QUEUE == 7
+    assert handler.ENV["INFERENCE_THREADS"] == str(model_host.INTRA_OP_THREADS)
+    assert dict(os.environ) == environ_before
+
+
+def test_hosted_functions_share_forward_gate(tmp_path, serve_slots):
+    functions_dir = tmp_path / "functions"
+    for name in ("gate-a", "gate-b"):
+        (functions_dir / name).mkdir(parents=True)
+        (functions_dir / name / "handler.py").write_text(GATED_HANDLER, encoding="utf-8")
+    slots = {name: model_host.ModelSlot(name, str(functions_dir)) for name in ("gate-a", "gate-b")}
+    url = serve_slots(slots)
+
+    results = []
+    threads = [threading.Thread(target=lambda name=name: results.append(_request(f"{url}/function/{name}", {})))
+               for name in ("gate-a", "gate-b") * 3]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    handlers = [slot.peek() for slot in slots.values()]
+    assert all(handler.FORWARD_GATE is model_host.FORWARD_GATE for handler in handlers)
+    assert [status for status, _ in results] == [200] * 6
+    intervals = [json.loads(body) for _, body in results]
+    peak = max(sum(other["start"] < interval["start"] < other["end"] for other in intervals) + 1
+               for interval in intervals)
+    assert peak <= model_host.FORWARD_SLOTS
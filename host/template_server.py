@@ -0,0 +1,99 @@
+# HTTP-Seite des OpenFaaS-Templates python3-http-debian für lokale Läufe ohne Watchdog:
+# jede Anfrage wird als Event (body, headers, method, query, path) an handle() einer
+# Funktion übergeben und deren Antwort wie im Template gesendet. Gemeinsame Grundlage von
+# host/model_host.py (mehrere Funktionen in einem Prozess) und ml-tests/local_gateway.py
+# (eine Funktion); die beiden legen nur fest, welcher Pfad zu welcher Funktion gehört.
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class Event:
+    def __init__(self, body, headers, method, query, path):
+        self.body = body
+        self.headers = headers
+        self.method = method
+        self.query = query
+        self.path = path
+
+
+class Context:
+    def __init__(self):
+        self.hostname = os.environ.get("HOSTNAME", "localhost")
+
+
+def format_response(response):
+    """Antwort von handle() wie im Template: None, str, (Body, Status) oder (Body, Status, Header)."""
+    if response is None:
+        return b"", 200, {}
+    if isinstance(response, dict): # Form des python3-http-Templates
+        return response.get("body", ""), response.get("statusCode", 200), response.get("headers", {})
+    if isinstance(response, tuple):
+        return response[0], response[1], dict(response[2]) if len(response) > 2 else {}
+    return response, 200, {}
+
+
+class TemplateRequestHandler(BaseHTTPRequestHandler):
+    """Beantwortet GET /healthz selbst und reicht alle anderen Anfragen an route(url) weiter.
+
+    Unterklassen implementieren route(); read_event() baut das Event für einen
+    Unterpfad, call_handler() ruft handle() auf wie der Watchdog, send() schreibt
+    die Antwort.
+    """
+
+    protocol_version = "HTTP/1.1" # Keep-Alive, damit Lastgeneratoren Verbindungen wiederverwenden
+    # Header und Body gehen in zwei Writes raus; mit Nagle plus Delayed ACK kostet das ~40 ms pro Antwort
+    disable_nagle_algorithm = True
+    context = Context()
+
+    def route(self, url):
+        raise NotImplementedError
+
+    def read_event(self, url, path):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return Event(body, dict(self.headers), self.command, dict(parse_qsl(url.query)), path)
+
+    def call_handler(self, handler, event):
+        """(Body, Status, Header) von handler.handle(); unbehandelte Fehler wie beim Watchdog als 500."""
+        try:
+            return format_response(handler.handle(event, self.context))
+        except Exception as e:
+            return json.dumps({"error": str(e)}), 500, {}
+
+    def send(self, body, status, headers):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, str(value))
+        if not any(name.lower() == "content-type" for name in headers):
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_found(self, url):
+        self.send(json.dumps({"error": f"Funktion nicht gefunden: {url.path}"}), 404, {})
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        if url.path == "/healthz":
+            return self.send(b"OK", 200, {})
+        self.route(url)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass # Zugriffslog würde Messungen verfälschen; die Funktionen loggen selbst
+
+
+class TemplateServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Vom Client abgebrochene Verbindungen (z. B. Timeout im Lastgenerator) sind kein Serverfehler
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
@@ -0,0 +1,65 @@
+# Vergleicht die transformers-Pipeline mit dem direkten Tokenizer-+-Modell-Pfad
+# (torch_backend.TorchSequenceClassifier) auf kurzen SST-2-Sätzen, ein Satz pro Aufruf
+# wie im Handler ohne Batching.
+#
+# Verwendung: python benchmark_distilbert_direct.py <MODELLVERZEICHNIS> [ANZAHL_SÄTZE]
+import json
+import os
+import statistics
+import sys
+import time
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "functions", "distilbert-finetuned-inference"))
+from torch_backend import TorchSequenceClassifier
+
+PAYLOAD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads", "distilbert_payloads.json")
+
+if len(sys.argv) < 2:
+    print("Verwendung: python benchmark_distilbert_direct.py <MODELLVERZEICHNIS> [ANZAHL_SÄTZE]")
+    sys.exit(1)
+
+model_dir = sys.argv[1]
+num_texts = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+with open(PAYLOAD_FILE, encoding="utf-8") as f:
+    texts = [payload["text"] for payload in json.load(f)][:num_texts]
+
+torch.set_num_threads(int(os.environ.get("INFERENCE_THREADS", "2")))
+model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+candidates = {
+    "pipeline": pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, device=-1),
+    "direkt": TorchSequenceClassifier(model, tokenizer),
+}
+
+
+def run(classify):
+    latencies = []
+    outputs = []
+    for text in texts:
+        start = time.perf_counter()
+        outputs.append(classify(text)[0])
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return latencies, outputs
+
+
+results = {}
+for name, classify in candidates.items():
+    run(classify)  # Aufwärmen
+    results[name] = run(classify)
+
+for name, (latencies, _) in results.items():
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{name:>8}: Mittelwert {statistics.mean(latencies):.2f} ms, p50 {statistics.median(latencies):.2f} ms, "
+          f"p95 {p95:.2f} ms ({len(latencies)} Sätze)")
+
+mismatches = sum(a["label"] != b["label"] or abs(a["score"] - b["score"]) > 1e-4
+                 for a, b in zip(results["pipeline"][1], results["direkt"][1]))
+print(f"Abweichende Ergebnisse: {mismatches}")
+speedup = statistics.mean(results["pipeline"][0]) / statistics.mean(results["direkt"][0])
+print(f"Beschleunigung direkt vs. Pipeline: {speedup:.2f}x")
@@ -0,0 +1,358 @@
+# Benchmark der drei Handler ohne Gateway: importiert function.handler direkt und ruft
+# handle() mit einem nachgebauten Event auf, gespeist aus den Korpora in payloads/
+# (logreg-Features, SST-2-Sätze und IMDb-Reviews, die Testbilder).
+#
+# Modi pro Funktion:
+#   single      ein Payload pro Request, nacheinander
+#   batched     BATCH_SIZE Payloads pro Request ({"instances"}, {"texts"}, {"images"}), nacheinander
+#   concurrent  ein Payload pro Request aus CONCURRENCY Threads gleichzeitig
+# Gemessen werden Durchsatz (Requests/s und Einträge/s), p50/p95/p99 der Latenz,
+# Kaltstart (Import des Handlers inkl. Modell-Laden, dazu die Ladezeit aus den
+# Handler-Metriken) und der Spitzenwert des RSS. Jeder Modus läuft in einem eigenen
+# Prozess mit dem Container-Layout ./function, damit Kaltstart und Speicher nicht
+# vom vorherigen Modus abhängen. Die Modell-Artefakte müssen im Funktionsordner liegen.
+#
+# Baselines: --save-baseline schreibt die Ergebnisse nach baselines/<FUNKTION>.json.
+# Existiert eine Baseline, wird jeder Lauf damit verglichen; überschreitet eine Kennzahl
+# ihre Schwelle (relative Abweichung, siehe DEFAULT_THRESHOLDS und DEFAULT_MIN_DELTA, in
+# der Baseline-Datei unter "thresholds" bzw. "min_delta" pro Funktion anpassbar), endet
+# das Skript mit Exit-Code 1. Als Regression zählt nur, was im Median UND im besten der
+# REPEATS Läufe über der Schwelle liegt; einzelne verrauschte Läufe lösen den Gate nicht aus.
+# Antworten mit Status 200 und {"error": ...} im Body (so meldet logreg Eingabefehler)
+# zählen als Fehler ("200-error").
+#
+# Verwendung: python benchmark_handlers.py [FUNKTION ...] [--save-baseline]
+#   FUNKTION: logreg-inference, distilbert-finetuned-inference, yolov5s-inference (Standard: alle)
+#   Umgebungsvariablen: MODES (single,batched,concurrent), REQUESTS (pro Modus, sonst
+#   funktionsabhängig), CONCURRENCY (4), BATCH_SIZE (16, bei YOLO höchstens 8), REPEATS (5),
+#   BASELINE_DIR, CORPUS (.ndjson/.rec aus build_corpus.py statt der Payloads in payloads/)
+import base64
+import json
+import math
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from payload_corpus import PayloadCorpus
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PAYLOAD_DIR = os.path.join(ROOT, "ml-tests", "payloads")
+BASELINE_DIR = os.environ.get("BASELINE_DIR", os.path.join(ROOT, "ml-tests", "baselines"))
+MODES = [mode.strip() for mode in os.environ.get("MODES", "single,batched,concurrent").split(",") if mode.strip()]
+CONCURRENCY = int(os.environ.get("CONCURRENCY", "4"))
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "16"))
+# Korpus-Datei (build_corpus.py) statt der JSON-Payloads
+CORPUS = os.environ.get("CORPUS")
+# Läufe (Prozesse) pro Modus; Kennzahlen sind der Median über die Läufe
+REPEATS = int(os.environ.get("REPEATS", "5"))
+WARMUP_REQUESTS = 5
+
+# Requests pro Modus, falls REQUESTS nicht gesetzt ist
+DEFAULT_REQUESTS = {
+    "logreg-inference": 2000,
+    "distilbert-finetuned-inference": 200,
+    "yolov5s-inference": 30,
+}
+# Erlaubte relative Verschlechterung gegenüber der Baseline je Kennzahl
+# (Durchsatz: Rückgang, alle anderen: Anstieg)
+# Tail-Latenzen schwanken zwischen Läufen auf demselben Stand stark (p99 bei wenigen Requests
+# ist praktisch das Maximum), daher großzügiger als Durchsatz und Median
+DEFAULT_THRESHOLDS = {
+    "requests_per_s": 0.25,
+    "p50_ms": 0.25,
+    "p95_ms": 0.50,
+    "p99_ms": 1.50,
+    "cold_start_s": 0.35,
+    "peak_rss_mb": 0.10,
+}
+# Absolute Abweichungen darunter gelten nicht als Regression (Messrauschen bei sehr kleinen Werten)
+DEFAULT_MIN_DELTA = {
+    "p50_ms": 0.1,
+    "p95_ms": 0.2,
+    "p99_ms": 0.5,
+    "cold_start_s": 0.1,
+    "peak_rss_mb": 5.0,
+}
+HIGHER_IS_BETTER = {"requests_per_s"}
+SINGLE_KEYS = {"logreg-inference": "features", "distilbert-finetuned-inference": "text", "yolov5s-inference": "image"}
+BATCH_KEYS = {"logreg-inference": "instances", "distilbert-finetuned-inference": "texts", "yolov5s-inference": "images"}
+
+
+class FakeEvent:
+    def __init__(self, body, content_type="application/json"):
+        self.body = body
+        self.headers = {"Content-Type": content_type}
+        self.path = "/"
+        self.method = "POST"
+        self.query = {}
+
+
+def _json_body(payload):
+    return json.dumps(payload).encode("utf-8")
+
+
+def load_corpus(function_name, limit=None):
+    """Die Payload-Einträge einer Funktion (Features, Texte bzw. Base64-Bilder).
+
+    Mit CORPUS wird eine Korpus-Datei aus build_corpus.py per mmap gelesen, und zwar
+    nur die ersten `limit` Einträge statt des ganzen Korpus.
+    """
+    if CORPUS:
+        corpus = PayloadCorpus(CORPUS)
+        records = (corpus[index] for index in range(min(len(corpus), limit or len(corpus))))
+        if corpus.content_type != "application/json": # rohe Bilder
+            return [base64.b64encode(record).decode("ascii") for record in records]
+        key = SINGLE_KEYS[function_name]
+        return [json.loads(record)[key] for record in records]
+    if function_name == "logreg-inference":
+        with open(os.path.join(PAYLOAD_DIR, "logreg-payloads.json"), encoding="utf-8") as f:
+            return [payload["features"] for payload in json.load(f)]
+    if function_name == "distilbert-finetuned-inference":
+        with open(os.path.join(PAYLOAD_DIR, "distilbert_payloads.json"), encoding="utf-8") as f:
+            sst2 = [payload["text"] for payload in json.load(f)]
+        with open(os.path.join(PAYLOAD_DIR, "imdb_payload_texte.txt"), encoding="utf-8") as f:
+            imdb = [line.strip() for line in f if line.strip()]
+        # Abwechselnd kurze SST-2-Sätze und lange IMDb-Reviews, damit auch kurze Läufe beide sehen
+        mixed = [text for pair in zip(sst2, imdb) for text in pair]
+        return mixed + sst2[len(imdb):] + imdb[len(sst2):]
+    if function_name == "yolov5s-inference":
+        with open(os.path.join(PAYLOAD_DIR, "base64_payload.json"), encoding="utf-8") as f:
+            images = [payload["image"] for payload in json.load(f)]
+        with open(os.path.join(PAYLOAD_DIR, "test.jpg"), "rb") as f:
+            images.append(base64.b64encode(f.read()).decode("ascii"))
+        return images
+    raise ValueError(f"Unbekannte Funktion '{function_name}'")
+
+
+def build_bodies(function_name, mode, corpus):
+    """Request-Bodies eines Modus als Liste von (Body, Anzahl Einträge)."""
+    single_key, batch_key = SINGLE_KEYS[function_name], BATCH_KEYS[function_name]
+    if mode != "batched":
+        return [(_json_body({single_key: entry}), 1) for entry in corpus]
+    batch_size = min(BATCH_SIZE, 8) if function_name == "yolov5s-inference" else BATCH_SIZE
+    bodies = []
+    for start in range(0, len(corpus), batch_size):
+        batch = corpus[start:start + batch_size]
+        if len(batch) < batch_size: # Korpus reicht nicht für einen vollen Batch: von vorn auffüllen
+            batch = (batch + corpus * batch_size)[:batch_size]
+        bodies.append((_json_body({batch_key: batch}), len(batch)))
+    return bodies
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-Rank-Perzentil einer aufsteigend sortierten Liste."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 # Linux: KiB
+
+
+def worker(function_name, mode, num_requests, result_path):
+    """Läuft im Kindprozess: Handler importieren (Kaltstart), Modus abspielen, Ergebnis als JSON schreiben."""
+    workdir = tempfile.mkdtemp()
+    os.symlink(os.path.abspath(os.path.join(ROOT, "functions", function_name)), os.path.join(workdir, "function"))
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+
+    start = time.perf_counter()
+    from function import handler
+    cold_start_s = time.perf_counter() - start
+    rss_after_load_mb = peak_rss_mb()
+
+    batch_size = BATCH_SIZE if mode == "batched" else 1
+    bodies = build_bodies(function_name, mode, load_corpus(function_name, (num_requests + WARMUP_REQUESTS) * batch_size))
+    statuses = {}
+    latencies = []
+    lock = threading.Lock()
+
+    def call(index):
+        body, _ = bodies[index % len(bodies)]
+        request_start = time.perf_counter()
+        response = handler.handle(FakeEvent(body), None)
+        elapsed_ms = (time.perf_counter() - request_start) * 1000.0
+        status = response[1] if isinstance(response, tuple) and len(response) > 1 else 200
+        body = response[0] if isinstance(response, tuple) else response
+        if status == 200 and isinstance(body, str) and body.startswith('{"error"'):
+            status = "200-error" # Fehler im Body bei Status 200 (logreg)
+        with lock:
+            latencies.append(elapsed_ms)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    for index in range(WARMUP_REQUESTS):
+        call(index)
+    latencies.clear()
+    statuses.clear()
+
+    start = time.perf_counter()
+    if mode == "concurrent":
+        counter = iter(range(num_requests))
+        counter_lock = threading.Lock()
+
+        def client():
+            while True:
+                with counter_lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                call(index)
+        threads = [threading.Thread(target=client) for _ in range(CONCURRENCY)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        for index in range(num_requests):
+            call(index)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    items = sum(bodies[index % len(bodies)][1] for index in range(num_requests))
+    result = {
+        "requests": num_requests,
+        "concurrency": CONCURRENCY if mode == "concurrent" else 1,
+        "items_per_request": items / num_requests,
+        "statuses": statuses,
+        "requests_per_s": num_requests / elapsed,
+        "items_per_s": items / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "cold_start_s": cold_start_s,
+        "model_load_s": handler.METRICS.load_seconds,
+        "rss_after_load_mb": rss_after_load_mb,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    with open(result_path, "w") as f:
+        json.dump(result, f)
+
+
+def run_mode(function_name, mode, num_requests):
+    """REPEATS Läufe in je einem neuen Prozess; Zahlen als Median, Status-Zähler summiert.
+
+    Unter "best" steht zusätzlich der beste Wert jeder Kennzahl über die Läufe.
+    """
+    runs = []
+    for _ in range(max(1, REPEATS)):
+        with tempfile.NamedTemporaryFile(suffix=".json") as result:
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", function_name, mode, str(num_requests), result.name],
+                env={**os.environ, "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING")},
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if process.returncode != 0:
+                raise RuntimeError(process.stderr.decode(errors="replace")[-2000:])
+            runs.append(json.load(open(result.name)))
+    merged = {"runs": len(runs), "statuses": {}}
+    for run in runs:
+        for status, count in run.pop("statuses").items():
+            merged["statuses"][status] = merged["statuses"].get(status, 0) + count
+    merged["best"] = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if run[key] is not None]
+        merged[key] = statistics.median(values) if values else None
+        if values:
+            merged["best"][key] = max(values) if key in HIGHER_IS_BETTER else min(values)
+    return merged
+
+
+def compare(results, baseline):
+    """Liste der Überschreitungen (Modus, Kennzahl, Baseline, aktuell, Abweichung, Schwelle)."""
+    thresholds = {**DEFAULT_THRESHOLDS, **baseline.get("thresholds", {})}
+    min_delta = {**DEFAULT_MIN_DELTA, **baseline.get("min_delta", {})}
+    regressions = []
+    for mode, current in results.items():
+        previous = baseline.get("modes", {}).get(mode)
+        if previous is None:
+            continue
+        for metric, threshold in thresholds.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (old - new) / old if metric in HIGHER_IS_BETTER else (new - old) / old
+            if change <= threshold or abs(new - old) < min_delta.get(metric, 0.0):
+                continue
+            # Auch der beste Lauf muss schlechter sein, sonst war es Rauschen in einzelnen Läufen
+            best = current.get("best", {}).get(metric, new)
+            best_change = (old - best) / old if metric in HIGHER_IS_BETTER else (best - old) / old
+            if best_change > threshold:
+                regressions.append((mode, metric, old, new, change, threshold))
+    return regressions
+
+
+def print_result(mode, result):
+    errors = sum(count for status, count in result["statuses"].items() if status != "200")
+    print(f"  {mode:10s} {result['requests_per_s']:9.1f} req/s {result['items_per_s']:9.1f} Einträge/s  "
+          f"p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms  "
+          f"Kaltstart {result['cold_start_s']:6.2f} s  RSS max {result['peak_rss_mb']:7.1f} MB"
+          + (f"  Fehler {errors}: {result['statuses']}" if errors else ""))
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    save_baseline = "--save-baseline" in sys.argv[1:]
+    function_names = args or list(DEFAULT_REQUESTS)
+    for name in function_names:
+        if name not in DEFAULT_REQUESTS:
+            print(f"Unbekannte Funktion '{name}' (erlaubt: {', '.join(DEFAULT_REQUESTS)})")
+            sys.exit(2)
+
+    failed = False
+    for function_name in function_names:
+        num_requests = int(os.environ.get("REQUESTS", DEFAULT_REQUESTS[function_name]))
+        print(f"{function_name}: {num_requests} Requests pro Modus")
+        results = {}
+        for mode in MODES:
+            try:
+                results[mode] = run_mode(function_name, mode, num_requests)
+            except RuntimeError as error:
+                print(f"  {mode}: FEHLER\n{error}")
+                failed = True
+                continue
+            print_result(mode, results[mode])
+            if set(results[mode]["statuses"]) - {"200"}:
+                failed = True # Fehlerantworten verfälschen die Messung (z. B. fehlendes Modell)
+
+        baseline_path = os.path.join(BASELINE_DIR, f"{function_name}.json")
+        baseline = None
+        if os.path.exists(baseline_path):
+            with open(baseline_path, encoding="utf-8") as f:
+                baseline = json.load(f)
+        if save_baseline:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            # Angepasste Schwellen einer vorhandenen Baseline bleiben erhalten; gespeichert werden nur
+            # Abweichungen von den Standardwerten, damit geänderte Standards auch alte Baselines erreichen
+            previous = baseline or {}
+            with open(baseline_path, "w", encoding="utf-8") as f:
+                json.dump({"function": function_name, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                           "thresholds": {metric: value for metric, value in previous.get("thresholds", {}).items()
+                                          if DEFAULT_THRESHOLDS.get(metric) != value},
+                           "min_delta": {metric: value for metric, value in previous.get("min_delta", {}).items()
+                                         if DEFAULT_MIN_DELTA.get(metric) != value},
+                           "modes": results}, f, indent=2)
+            print(f"  Baseline gespeichert: {baseline_path}")
+        elif baseline is not None:
+            regressions = compare(results, baseline)
+            for mode, metric, old, new, change, threshold in regressions:
+                print(f"  REGRESSION {mode}/{metric}: {old:.2f} -> {new:.2f} "
+                      f"({(new - old) / old * 100:+.1f} %; erlaubt sind {threshold * 100:.0f} % Verschlechterung)")
+            if regressions:
+                failed = True
+            else:
+                print("  Keine Regression gegenüber der Baseline")
+        else:
+            print("  Keine Baseline vorhanden (anlegen mit --save-baseline)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], sys.argv[3], int(sys.argv[4]), sys.argv[5])
+    else:
+        main()
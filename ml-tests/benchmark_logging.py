@@ -0,0 +1,108 @@
+# Durchsatz eines Handlers mit verschiedenen Log-Konfigurationen (log_pipeline.py):
+# Logging aus, Standard (INFO), DEBUG mit 1 % Sampling, DEBUG für jeden Request mit
+# Bodies, sowie zum Vergleich das bisherige synchrone print(..., flush=True) von Body
+# und Ergebnis pro Request.
+#
+# Jede Konfiguration läuft in einem eigenen Prozess (die Log-Einstellungen werden beim
+# Import gelesen), mit dem Container-Layout ./function als Arbeitsverzeichnis. stdout
+# geht wie im Container in eine Pipe, die hier nur geleert wird. Die Modell-Artefakte
+# müssen im Funktionsordner liegen (training/train_logreg.py bzw. train_destilbert.py).
+#
+# Verwendung: python benchmark_logging.py [FUNKTION] [ANZAHL_REQUESTS]
+#   FUNKTION: logreg-inference (Standard) oder distilbert-finetuned-inference
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Wiederholungen pro Konfiguration (jeweils neuer Prozess), berichtet wird der Median
+REPEATS = int(os.environ.get("REPEATS", "3"))
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PAYLOAD_FILES = {
+    "logreg-inference": "logreg-payloads.json",
+    "distilbert-finetuned-inference": "distilbert_payloads.json",
+}
+CONFIGS = [
+    ("aus (LOG_LEVEL=ERROR)", {"LOG_LEVEL": "ERROR"}),
+    ("Standard (INFO)", {"LOG_LEVEL": "INFO"}),
+    ("DEBUG, 1 % gesampelt", {"LOG_LEVEL": "DEBUG", "LOG_SAMPLE_RATE": "0.01"}),
+    ("DEBUG, alle Requests + Bodies", {"LOG_LEVEL": "DEBUG", "LOG_SAMPLE_RATE": "1", "LOG_BODIES": "1"}),
+    ("bisher: print(flush=True)", {"LOG_LEVEL": "ERROR", "LEGACY_PRINT": "1"}),
+]
+
+
+class FakeEvent:
+    def __init__(self, body):
+        self.body = body
+        self.headers = {"Content-Type": "application/json"}
+        self.path = "/"
+        self.method = "POST"
+        self.query = {}
+
+
+def worker(function_name, num_requests, result_path):
+    """Läuft im Kindprozess: Handler importieren, Payloads abspielen, Ergebnis als JSON schreiben."""
+    workdir = tempfile.mkdtemp()
+    os.symlink(os.path.abspath(os.path.join(ROOT, "functions", function_name)), os.path.join(workdir, "function"))
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    from function import handler
+
+    with open(os.path.join(ROOT, "ml-tests", "payloads", PAYLOAD_FILES[function_name]), encoding="utf-8") as f:
+        bodies = [json.dumps(payload).encode("utf-8") for payload in json.load(f)]
+
+    def call(body):
+        if os.environ.get("LEGACY_PRINT") == "1":
+            print("BODY:", body, flush=True)
+            response = handler.handle(FakeEvent(body), None)
+            print(f"Ergebnis: {response}", flush=True)
+            return response
+        return handler.handle(FakeEvent(body), None)
+
+    for body in bodies[:50]:  # Aufwärmen
+        call(body)
+    start = time.perf_counter()
+    for i in range(num_requests):
+        call(bodies[i % len(bodies)])
+    elapsed = time.perf_counter() - start
+    with open(result_path, "w") as f:
+        json.dump({"requests_per_s": num_requests / elapsed}, f)
+
+
+def main():
+    function_name = sys.argv[1] if len(sys.argv) > 1 else "logreg-inference"
+    num_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    if function_name not in PAYLOAD_FILES:
+        print(f"Unbekannte Funktion '{function_name}' (erlaubt: {', '.join(PAYLOAD_FILES)})")
+        sys.exit(1)
+
+    print(f"{function_name}, {num_requests} Requests pro Konfiguration, Median aus {REPEATS} Läufen")
+    baseline = None
+    for label, env in CONFIGS:
+        runs = []
+        for _ in range(REPEATS):
+            with tempfile.NamedTemporaryFile(suffix=".json") as result:
+                process = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", function_name, str(num_requests), result.name],
+                    env={**os.environ, **env}, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                if process.returncode != 0:
+                    print(f"{label}: FEHLER\n{process.stderr.decode(errors='replace')[-2000:]}")
+                    break
+                runs.append(json.load(open(result.name))["requests_per_s"])
+        if not runs:
+            continue
+        requests_per_s = statistics.median(runs)
+        baseline = baseline or requests_per_s
+        log_mb = len(process.stdout) / 1e6
+        print(f"{label:32s} {requests_per_s:9.0f} req/s  {1e6 / requests_per_s:8.1f} us/Request  "
+              f"{requests_per_s / baseline * 100:5.1f} %  Log {log_mb:7.2f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    else:
+        main()
@@ -0,0 +1,73 @@
+# Mikrobenchmark der YOLO-Vorverarbeitung: bisheriger Pfad
+# (Image.open().convert('RGB') + transforms.Compose([Resize, ToTensor])) gegen
+# preprocessing.preprocess_image (JPEG-draft, ein Resize, vorab angelegter Puffer).
+#
+# Verwendung: python benchmark_yolo_preprocess.py [BILD ...]
+# Ohne Argumente: payloads/test.jpg plus synthetische Handy-Fotos (12 und 48 Megapixel).
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "functions", "yolov5s-inference"))
+from preprocessing import preprocess_image
+
+IMG_SIZE = 640
+REPEATS = int(os.environ.get("REPEATS", "20"))
+
+legacy_transform = transforms.Compose([
+    transforms.Resize((IMG_SIZE, IMG_SIZE)),
+    transforms.ToTensor(),
+])
+
+
+def legacy(data):
+    img = Image.open(BytesIO(data)).convert("RGB")
+    return legacy_transform(img).unsqueeze(0)
+
+
+def optimized(data):
+    return preprocess_image(BytesIO(data), IMG_SIZE)[0]
+
+
+def synthetic_jpeg(width, height):
+    # Rauschen plus Verlauf, damit der JPEG-Decoder realistisch viel zu tun hat
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def measure(fn, data):
+    fn(data)  # Aufwärmen
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(data)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(timings)
+
+
+if len(sys.argv) > 1:
+    images = {os.path.basename(path): open(path, "rb").read() for path in sys.argv[1:]}
+else:
+    here = os.path.dirname(os.path.abspath(__file__))
+    images = {
+        "test.jpg": open(os.path.join(here, "payloads", "test.jpg"), "rb").read(),
+        "synthetisch 4032x3024": synthetic_jpeg(4032, 3024),
+        "synthetisch 8000x6000": synthetic_jpeg(8000, 6000),
+    }
+
+for name, data in images.items():
+    size = Image.open(BytesIO(data)).size
+    before = measure(legacy, data)
+    after = measure(optimized, data)
+    print(f"{name} ({size[0]}x{size[1]}, {len(data) / 1e6:.1f} MB): "
+          f"bisher {before:.1f} ms, neu {after:.1f} ms, Faktor {before / after:.1f}x")
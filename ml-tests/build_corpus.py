@@ -0,0 +1,158 @@
+# Baut ein Payload-Korpus (payload_corpus.py) aus einer oder mehreren Quellen, Eintrag für
+# Eintrag gestreamt statt als JSON-Array im Speicher:
+#   *.csv                Diabetes-Datensatz -> {"features": [8 Merkmale]} (wie convert_diabetes_to_json.py)
+#   *.txt                ein Text pro Zeile (z. B. IMDb-Reviews) -> {"text": ...}
+#   *.json               vorhandene Payload-Datei (JSON-Array), ein Eintrag pro Element
+#   Bilder / Ordner      *.jpg, *.jpeg, *.png -> {"image": Base64} bzw. mit --raw-images die
+#                        Bilddatei selbst (nur .rec, Content-Type image/jpeg bzw. image/png)
+# Bilder werden in einem Prozess-Pool (WORKERS, Standard: Anzahl CPUs) kodiert und in der
+# Reihenfolge der Eingabe geschrieben; höchstens 4 Aufträge pro Worker sind gleichzeitig
+# unterwegs, damit auch große Bildordner nicht komplett im Speicher landen.
+#
+# Verwendung: python build_corpus.py AUSGABE.ndjson|AUSGABE.rec EINGABE [EINGABE ...]
+#             [--raw-images] [--max-side PIXEL]
+#   --max-side verkleinert Bilder vorab auf höchstens PIXEL (längste Seite) und speichert sie
+#   als JPEG (Qualität 90), z. B. 1280 für Handyfotos; ohne die Option bleiben die Bilddaten
+#   unverändert.
+# Beispiele:
+#   python build_corpus.py payloads/logreg.rec diabetes.csv
+#   python build_corpus.py payloads/distilbert.ndjson payloads/distilbert_payloads.json payloads/imdb_payload_texte.txt
+#   python build_corpus.py payloads/yolo.rec "Bilder für yolov5s" payloads/test.jpg --raw-images --max-side 1280
+import base64
+import collections
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from payload_corpus import CorpusWriter, corpus_format
+
+WORKERS = int(os.environ.get("WORKERS", str(os.cpu_count() or 1)))
+NUM_FEATURES = 8 # Schwangerschaften, Glukose, Blutdruck, Hautdicke, Insulin, BMI, Stammbaum-Funktion, Alter
+IMAGE_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+
+def _compact(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def diabetes_records(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None) # Kopfzeile
+        for row_number, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            try:
+                yield _compact({"features": [float(value) for value in row[:NUM_FEATURES]]})
+            except ValueError as e:
+                print(f"Warnung: Zeile {row_number} übersprungen ({e})")
+
+
+def text_records(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield _compact({"text": line.strip()})
+
+
+def json_records(path):
+    with open(path, encoding="utf-8") as f:
+        for payload in json.load(f):
+            yield _compact(payload)
+
+
+def encode_image(job):
+    """Läuft im Worker-Prozess: Bild lesen, optional verkleinern, als Eintrag kodieren."""
+    path, raw, max_side = job
+    with open(path, "rb") as f:
+        data = f.read()
+    if max_side:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((max_side, max_side)) # nur verkleinern, nie vergrößern
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, format="JPEG", quality=90)
+            data = buffer.getvalue()
+    if raw:
+        return data
+    return _compact({"image": base64.b64encode(data).decode("ascii")})
+
+
+def image_paths(inputs):
+    for path in inputs:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.splitext(name)[1].lower() in IMAGE_TYPES:
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def image_records(paths, raw, max_side, workers):
+    """Kodiert Bilder parallel und liefert sie in Eingabereihenfolge, mit begrenzter Zahl offener Aufträge."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for path in paths:
+            pending.append(pool.submit(encode_image, (path, raw, max_side)))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main():
+    args = sys.argv[1:]
+    raw_images = "--raw-images" in args
+    if raw_images:
+        args.remove("--raw-images")
+    max_side = None
+    if "--max-side" in args:
+        position = args.index("--max-side")
+        max_side = int(args[position + 1])
+        del args[position:position + 2]
+    if len(args) < 2:
+        print("Verwendung: python build_corpus.py AUSGABE.ndjson|AUSGABE.rec EINGABE [EINGABE ...] "
+              "[--raw-images] [--max-side PIXEL]")
+        sys.exit(1)
+    output, inputs = args[0], args[1:]
+    corpus_format(output) # prüft die Endung vor der Arbeit
+
+    images = list(image_paths(path for path in inputs
+                              if os.path.isdir(path) or os.path.splitext(path)[1].lower() in IMAGE_TYPES))
+    others = [path for path in inputs if not os.path.isdir(path) and os.path.splitext(path)[1].lower() not in IMAGE_TYPES]
+    if images and others:
+        print("Bilder und andere Quellen nicht in einem Korpus mischen")
+        sys.exit(1)
+
+    content_type = "application/json"
+    if images and raw_images:
+        # Ein Korpus hat einen Content-Type; --max-side speichert alles als JPEG
+        types = {"image/jpeg"} if max_side else {IMAGE_TYPES[os.path.splitext(path)[1].lower()] for path in images}
+        if len(types) != 1:
+            print("--raw-images braucht einheitliche Bildformate (oder --max-side, das alles als JPEG speichert)")
+            sys.exit(1)
+        content_type = types.pop()
+
+    start = time.perf_counter()
+    with CorpusWriter(output, content_type=content_type, metadata={"sources": inputs}) as writer:
+        if images:
+            for record in image_records(images, raw_images, max_side, WORKERS):
+                writer.append(record)
+        for path in others:
+            extension = os.path.splitext(path)[1].lower()
+            readers = {".csv": diabetes_records, ".txt": text_records, ".json": json_records}
+            if extension not in readers:
+                raise ValueError(f"Unbekannte Quelle '{path}' (erlaubt: .csv, .txt, .json, Bilder, Ordner)")
+            for record in readers[extension](path):
+                writer.append(record)
+    size_mb = os.path.getsize(output) / 1e6
+    print(f"{len(writer)} Einträge nach '{output}' geschrieben ({size_mb:.2f} MB, "
+          f"{time.perf_counter() - start:.2f} s, Content-Type {content_type})")
+
+
+if __name__ == "__main__":
+    main()
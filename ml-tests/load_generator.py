@@ -0,0 +1,450 @@
+# Open-Loop-Lastgenerator (asyncio) als Ersatz für k6 + Gateway bei Offline-Messungen.
+#
+# Die Szenarien (smoke, ramp-up, burst, realistic-soak) stehen deklarativ in
+# load_scenarios.json statt auskommentiert in den k6-Skripten. Requests werden nach
+# einem festen Ankunftsplan gesendet (konstant oder Poisson, Rate pro Stufe linear
+# interpoliert), unabhängig davon, ob frühere Antworten schon da sind. Die Latenz zählt
+# ab dem geplanten Startzeitpunkt, Wartezeit auf eine freie Verbindung oder einen
+# überlasteten Server ist also enthalten (keine "coordinated omission" wie bei k6-VUs
+# mit sleep(1)). Verbindungen werden per HTTP/1.1 Keep-Alive wiederverwendet.
+#
+# Ohne --url startet das Skript local_gateway.py für die Funktion auf einem freien Port;
+# mit --url (z. B. http://127.0.0.1:8080) läuft es gegen ein echtes Gateway.
+#
+# Ergebnisse unter results/<Zeitstempel>-<SZENARIO>-<FUNKTION>/:
+#   summary.json    Kennzahlen, Perzentile, Fehler, Schwellen aus dem Szenario
+#   timeseries.csv  pro Sekunde (nach geplantem Start): Sollrate, gesendet, ok, Fehler, Perzentile
+#   latency.hgrm    Perzentilverteilung im Textformat von HdrHistogram (plotbar mit dem HdrHistogram-Plotter)
+# Exit-Code 1, wenn eine Schwelle des Szenarios verletzt ist.
+#
+# Verwendung: python load_generator.py SZENARIO FUNKTION [--url URL] [--config DATEI]
+#   Umgebungsvariablen: UPLOAD_MODE (json/binary, nur YOLO), TIME_SCALE (Faktor für alle
+#   Stufendauern, z. B. 0.1), RATE_SCALE (Faktor für alle Raten), MAX_CONNECTIONS (64),
+#   SEED (1), CORPUS (.ndjson/.rec aus build_corpus.py statt "payloads"), RESULTS_DIR
+import asyncio
+import csv
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "functions", "logreg-inference"))
+from inference_executor import parse_duration
+from payload_corpus import FORMATS as CORPUS_FORMATS, PayloadCorpus
+
+UPLOAD_MODE = os.environ.get("UPLOAD_MODE", "json")
+TIME_SCALE = float(os.environ.get("TIME_SCALE", "1"))
+RATE_SCALE = float(os.environ.get("RATE_SCALE", "1"))
+MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", "64"))
+SEED = int(os.environ.get("SEED", "1"))
+# Korpus-Datei (build_corpus.py) statt der "payloads" aus der Konfiguration
+CORPUS = os.environ.get("CORPUS")
+RESULTS_DIR = os.environ.get("RESULTS_DIR", os.path.join(HERE, "results"))
+GATEWAY_START_TIMEOUT_S = 300 # Modell-Laden beim Kaltstart kann dauern
+REPORT_PERCENTILES = (50.0, 90.0, 95.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """Log-lineares Histogramm nach dem Vorbild von HdrHistogram.
+
+    Werte in Mikrosekunden; pro Zweierpotenz 2**(SUB_BITS - 1) Unter-Buckets,
+    der relative Fehler eines Perzentils liegt damit unter 1 %. Anders als ein
+    Prometheus-Histogramm mit festen Grenzen bleibt die Auflösung auch für
+    Ausreißer im Sekundenbereich erhalten.
+    """
+
+    SUB_BITS = 8
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.max = 0
+
+    def record(self, value_us):
+        value = max(1, int(value_us))
+        shift = max(0, value.bit_length() - self.SUB_BITS)
+        index = (shift, value >> shift)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value
+        self.sum_squares += value * value
+        self.max = max(self.max, value)
+
+    @staticmethod
+    def _bucket_value(index):
+        shift, mantissa = index
+        # höchster Wert des Buckets, wie HdrHistogram ("highestEquivalentValue")
+        return ((mantissa + 1) << shift) - 1
+
+    def value_at(self, percentile):
+        """Wert (µs), unter dem `percentile` Prozent der Einträge liegen."""
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(percentile / 100.0 * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0.0
+
+    def stddev(self):
+        if not self.total:
+            return 0.0
+        return math.sqrt(max(0.0, self.sum_squares / self.total - self.mean() ** 2))
+
+    def percentile_distribution(self, ticks_per_half_distance=5):
+        """[(Wert µs, Perzentil 0..1, kumulierte Anzahl)] in den Schritten von HdrHistogram."""
+        lines = []
+        percentile = 0.0
+        while self.total:
+            value = self.value_at(percentile)
+            count = sum(n for index, n in self.counts.items() if self._bucket_value(index) <= value)
+            lines.append((value, percentile / 100.0, min(count, self.total)))
+            if 100.0 / (100.0 - percentile) > self.total: # Auflösung der Stichprobe erreicht
+                break
+            half_distance = 2 ** (int(math.log2(100.0 / (100.0 - percentile))) + 1)
+            percentile += 100.0 / (half_distance * ticks_per_half_distance)
+        lines.append((self.max, 1.0, self.total))
+        return lines
+
+    def write_hgrm(self, path, unit_ratio=1000.0):
+        """Perzentilverteilung im .hgrm-Textformat (Werte in ms)."""
+        with open(path, "w") as f:
+            f.write(f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}\n\n")
+            for value, fraction, count in self.percentile_distribution():
+                inverse = f"{1.0 / (1.0 - fraction):14.2f}" if fraction < 1.0 else f"{'inf':>14}"
+                f.write(f"{value / unit_ratio:12.3f} {fraction:14.12f} {count:10d} {inverse}\n")
+            f.write(f"#[Mean    = {self.mean() / unit_ratio:12.3f}, StdDeviation   = {self.stddev() / unit_ratio:12.3f}]\n")
+            f.write(f"#[Max     = {self.max / unit_ratio:12.3f}, Total count    = {self.total:12d}]\n")
+            f.write(f"#[Buckets = {len(self.counts):12d}, SubBuckets     = {2 ** self.SUB_BITS:12d}]\n")
+
+
+def stage_plan(scenario):
+    """[(Startzeit s, Dauer s, Rate am Anfang, Rate am Ende)] mit TIME_SCALE/RATE_SCALE.
+
+    Wie bei k6 wird zwischen der Rate der vorherigen und der aktuellen Stufe linear
+    interpoliert; die erste Stufe beginnt mit "start_rate" (Standard: ihre eigene Rate).
+    """
+    stages = scenario["stages"]
+    previous = scenario.get("start_rate", stages[0]["rate"]) * RATE_SCALE
+    plan, start = [], 0.0
+    for stage in stages:
+        duration = parse_duration(stage["duration"]) * TIME_SCALE
+        rate = stage["rate"] * RATE_SCALE
+        plan.append((start, duration, previous, rate))
+        start += duration
+        previous = rate
+    return plan
+
+
+def arrival_offsets(plan, arrival, rng):
+    """Geplante Startzeiten (s ab Testbeginn) aller Requests.
+
+    Bildet die erwartete Anzahl N(t) = Integral der Rate ab und invertiert sie:
+    "constant" setzt einen Request bei jedem ganzzahligen N(t), "poisson" bei den
+    Summen exponentialverteilter Abstände (inhomogener Poisson-Prozess).
+    """
+    offsets = []
+    next_count = rng.expovariate(1.0) if arrival == "poisson" else 1.0
+    stage_base = 0.0
+    for start, duration, rate_start, rate_end in plan:
+        stage_total = (rate_start + rate_end) / 2.0 * duration
+        slope = (rate_end - rate_start) / duration if duration else 0.0
+        while next_count - stage_base <= stage_total:
+            k = next_count - stage_base
+            if abs(slope) < 1e-12:
+                t = k / rate_start
+            else:
+                t = (-rate_start + math.sqrt(max(0.0, rate_start ** 2 + 2.0 * slope * k))) / slope
+            offsets.append(start + min(max(t, 0.0), duration))
+            next_count += rng.expovariate(1.0) if arrival == "poisson" else 1.0
+        stage_base += stage_total
+    return offsets
+
+
+def target_rate_at(plan, t):
+    for start, duration, rate_start, rate_end in plan:
+        if start <= t < start + duration:
+            return rate_start + (rate_end - rate_start) * (t - start) / duration
+    return 0.0
+
+
+class ConnectionPool:
+    """Begrenzte Zahl wiederverwendeter HTTP/1.1-Verbindungen zu einem Host."""
+
+    def __init__(self, host, port, size):
+        self.host = host
+        self.port = port
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self.opened = 0
+
+    async def _connect(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, headers, body):
+        """(Status, Body, Sendezeitpunkt); wartet auf eine freie Verbindung, wenn alle belegt sind."""
+        async with self._slots:
+            reused = bool(self._idle)
+            connection = self._idle.pop() if reused else await self._connect()
+            try:
+                try:
+                    status, response_body, keep_alive, sent = await self._exchange(connection, method, path, headers, body)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    # Vom Server geschlossene Leerlauf-Verbindung: einmal mit neuer Verbindung wiederholen
+                    connection[1].close()
+                    connection = await self._connect()
+                    status, response_body, keep_alive, sent = await self._exchange(connection, method, path, headers, body)
+            except BaseException:
+                connection[1].close()
+                raise
+            if keep_alive:
+                self._idle.append(connection)
+            else:
+                connection[1].close()
+            return status, response_body, sent
+
+    async def _exchange(self, connection, method, path, headers, body):
+        reader, writer = connection
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        sent = asyncio.get_running_loop().time()
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status_line, *header_lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(status_line.split(" ", 2)[1])
+        response_headers = {}
+        for line in header_lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                response_headers[name.strip().lower()] = value.strip()
+        if "content-length" in response_headers:
+            response_body = await reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunks.append(await reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            response_body = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            response_body = await reader.read()
+            return status, response_body, False, sent
+        keep_alive = response_headers.get("connection", "").lower() != "close"
+        return status, response_body, keep_alive, sent
+
+
+def load_requests(function_config):
+    """(Bodies, Header) einer Funktion; pro Request wird zufällig ein Body gewählt wie in k6.
+
+    Korpus-Dateien (.ndjson, .rec aus build_corpus.py) werden per mmap gelesen, ein
+    Body erst beim Senden aus der Datei geholt; JSON-Arrays werden komplett geladen.
+    """
+    if UPLOAD_MODE == "binary" and not CORPUS:
+        if "binary" not in function_config:
+            raise ValueError("UPLOAD_MODE=binary wird für diese Funktion nicht unterstützt")
+        with open(os.path.join(HERE, function_config["binary"]["file"]), "rb") as f:
+            return [f.read()], {"Content-Type": function_config["binary"]["content_type"]}
+    path = CORPUS or os.path.join(HERE, function_config["payloads"])
+    if os.path.splitext(path)[1].lower() in CORPUS_FORMATS:
+        corpus = PayloadCorpus(path)
+        return corpus, {"Content-Type": corpus.content_type}
+    with open(path, encoding="utf-8") as f:
+        payloads = json.load(f)
+    if not payloads:
+        raise ValueError(f"'{path}' enthält keine Payloads")
+    return [json.dumps(payload).encode("utf-8") for payload in payloads], {"Content-Type": "application/json"}
+
+
+async def run_load(pool, path, bodies, headers, offsets, timeout_s, rng):
+    """Sendet nach Plan und liefert [(geplant s, Latenz ab Plan µs, Latenz ab Senden µs, Status)].
+
+    "Ab Senden" beginnt, wenn der Request auf einer Verbindung geschrieben wird; die
+    Differenz zu "ab Plan" ist Wartezeit auf eine freie Verbindung im Pool.
+    """
+    loop = asyncio.get_running_loop()
+    records = []
+    tasks = set()
+    begin = loop.time() + 0.05
+
+    async def one(offset, body):
+        scheduled = begin + offset
+        sent = None
+        try:
+            status, _, sent = await asyncio.wait_for(pool.request("POST", path, headers, body), timeout_s)
+            status = str(status)
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            status = "connection_error"
+        done = loop.time()
+        # ohne Antwort zählt die Zeit ab dem geplanten Start auch als Bedienzeit
+        records.append((offset, (done - scheduled) * 1e6, (done - (sent or scheduled)) * 1e6, status))
+
+    for offset in offsets:
+        delay = begin + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(one(offset, bodies[rng.randrange(len(bodies))]))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return records
+
+
+def summarize(records, plan, duration_s, thresholds):
+    latency, service = LatencyHistogram(), LatencyHistogram()
+    statuses = {}
+    for _, from_schedule_us, from_send_us, status in records:
+        latency.record(from_schedule_us)
+        service.record(from_send_us)
+        statuses[status] = statuses.get(status, 0) + 1
+    errors = sum(count for status, count in statuses.items() if status != "200")
+    summary = {
+        "requests": len(records),
+        "duration_s": duration_s,
+        "mean_rate": len(records) / duration_s if duration_s else 0.0,
+        "statuses": statuses,
+        "error_rate": errors / len(records) if records else 0.0,
+        "mean_ms": latency.mean() / 1000.0,
+        "max_ms": latency.max / 1000.0,
+    }
+    for percentile in REPORT_PERCENTILES:
+        summary[f"p{percentile:g}_ms"] = latency.value_at(percentile) / 1000.0
+        summary[f"service_p{percentile:g}_ms"] = service.value_at(percentile) / 1000.0
+    violations = []
+    for name, limit in thresholds.items():
+        if summary.get(name) is not None and summary[name] > limit:
+            violations.append(f"{name} = {summary[name]:.4g} > {limit}")
+    summary["thresholds"] = thresholds
+    summary["threshold_violations"] = violations
+    return summary, latency
+
+
+def write_timeseries(path, records, plan):
+    by_second = {}
+    for offset, from_schedule_us, _, status in records:
+        by_second.setdefault(int(offset), []).append((from_schedule_us, status))
+    total_seconds = int(math.ceil(sum(duration for _, duration, _, _ in plan)))
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["second", "target_rate", "sent", "ok", "errors", "p50_ms", "p90_ms", "p99_ms", "max_ms"])
+        for second in range(total_seconds):
+            entries = by_second.get(second, [])
+            histogram = LatencyHistogram()
+            for value, _ in entries:
+                histogram.record(value)
+            ok = sum(1 for _, status in entries if status == "200")
+            row = [second, f"{target_rate_at(plan, second + 0.5):.3f}", len(entries), ok, len(entries) - ok]
+            row += [f"{histogram.value_at(p) / 1000.0:.3f}" if entries else "" for p in (50, 90, 99)]
+            row.append(f"{histogram.max / 1000.0:.3f}" if entries else "")
+            writer.writerow(row)
+
+
+def start_local_gateway(function_name):
+    """Startet local_gateway.py auf einem freien Port und wartet, bis /healthz antwortet."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, "local_gateway.py"), function_name, str(port)],
+                               stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + GATEWAY_START_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"local_gateway.py beendet mit Code {process.returncode}")
+        try:
+            urllib.request.urlopen(f"{url}/healthz", timeout=1).read()
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("local_gateway.py ist nicht rechtzeitig bereit geworden")
+
+
+def main():
+    args = sys.argv[1:]
+    options = {}
+    for option in ("--url", "--config"):
+        if option in args:
+            position = args.index(option)
+            options[option] = args[position + 1]
+            del args[position:position + 2]
+    config_path = options.get("--config", os.path.join(HERE, "load_scenarios.json"))
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+    if len(args) != 2 or args[0] not in config["scenarios"] or args[1] not in config["functions"]:
+        print("Verwendung: python load_generator.py SZENARIO FUNKTION [--url URL] [--config DATEI]")
+        print(f"  Szenarien: {', '.join(config['scenarios'])}")
+        print(f"  Funktionen: {', '.join(config['functions'])}")
+        sys.exit(2)
+    scenario_name, function_name = args
+    scenario, function_config = config["scenarios"][scenario_name], config["functions"][function_name]
+
+    rng = random.Random(SEED)
+    plan = stage_plan(scenario)
+    offsets = arrival_offsets(plan, scenario.get("arrival", "constant"), rng)
+    duration_s = sum(duration for _, duration, _, _ in plan)
+    bodies, headers = load_requests(function_config)
+    timeout_s = parse_duration(function_config.get("timeout", "30s"))
+
+    gateway = None
+    url = options.get("--url")
+    if url is None:
+        gateway, url = start_local_gateway(function_name)
+    try:
+        target = urlsplit(url)
+        print(f"{scenario_name} gegen {url}/function/{function_name}: {len(offsets)} Requests in {duration_s:.0f} s "
+              f"({scenario.get('arrival', 'constant')})")
+        pool = ConnectionPool(target.hostname, target.port or 80, MAX_CONNECTIONS)
+        records = asyncio.run(run_load(pool, f"{target.path.rstrip('/')}/function/{function_name}",
+                                       bodies, headers, offsets, timeout_s, rng))
+    finally:
+        if gateway is not None:
+            gateway.terminate()
+            gateway.wait()
+
+    summary, latency = summarize(records, plan, duration_s, scenario.get("thresholds", {}))
+    summary.update({"scenario": scenario_name, "function": function_name, "url": url,
+                    "arrival": scenario.get("arrival", "constant"), "connections_opened": pool.opened})
+    run_dir = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{scenario_name}-{function_name}")
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    write_timeseries(os.path.join(run_dir, "timeseries.csv"), records, plan)
+    latency.write_hgrm(os.path.join(run_dir, "latency.hgrm"))
+
+    print(f"  Status: {summary['statuses']}, Fehlerrate {summary['error_rate'] * 100:.2f} %, "
+          f"{pool.opened} Verbindungen geöffnet")
+    print("  Latenz ab geplantem Start (ab Senden) in ms:")
+    for percentile in REPORT_PERCENTILES:
+        print(f"    p{percentile:<5g} {summary[f'p{percentile:g}_ms']:10.2f} ({summary[f'service_p{percentile:g}_ms']:.2f})")
+    print(f"    max    {summary['max_ms']:10.2f}")
+    print(f"  Ergebnisse: {run_dir}")
+    for violation in summary["threshold_violations"]:
+        print(f"  SCHWELLE VERLETZT: {violation}")
+    sys.exit(1 if summary["threshold_violations"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Lokaler Ersatz für OpenFaaS-Gateway und Watchdog: stellt handle() einer Funktion unter
+# /function/<FUNKTION> bereit, ohne Docker, faas-cli oder Gateway. Wie im Template
+# python3-http-debian wird ./function als Paket importiert und jede Anfrage als Event
+# (body, headers, method, query, path) an handle() übergeben; Unterpfade wie
+# /function/<FUNKTION>/metrics kommen als event.path "/metrics" an.
+#
+# Verwendung: python local_gateway.py FUNKTION [PORT]
+#   Standard-Port 8080 wie das Gateway; die Modell-Artefakte müssen im Funktionsordner liegen.
+#   Umgebungsvariablen der Funktion (z. B. aus der yml) werden einfach mitgegeben.
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Event, Antwortformat und HTTP-Seite des Templates teilt sich das Skript mit dem Multi-Modell-Host
+sys.path.insert(0, os.path.join(ROOT, "host"))
+from template_server import TemplateRequestHandler, TemplateServer
+
+
+def load_handler(function_name):
+    """Importiert functions/<FUNKTION>/handler.py mit dem Container-Layout ./function."""
+    function_dir = os.path.abspath(os.path.join(ROOT, "functions", function_name))
+    if not os.path.isdir(function_dir):
+        raise ValueError(f"Unbekannte Funktion '{function_name}'")
+    workdir = tempfile.mkdtemp()
+    os.symlink(function_dir, os.path.join(workdir, "function"))
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    from function import handler
+    return handler
+
+
+def make_request_handler(function_name, handler):
+    prefix = f"/function/{function_name}"
+
+    class FunctionRequestHandler(TemplateRequestHandler):
+        def route(self, url):
+            if url.path != prefix and not url.path.startswith(prefix + "/"):
+                return self.not_found(url)
+            event = self.read_event(url, url.path[len(prefix):] or "/")
+            self.send(*self.call_handler(handler, event))
+
+    return FunctionRequestHandler
+
+
+def serve(function_name, port=8080, host="127.0.0.1"):
+    handler = load_handler(function_name)
+    server = TemplateServer((host, port), make_request_handler(function_name, handler))
+    print(f"{function_name} bereit unter http://{host}:{server.server_port}/function/{function_name}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Verwendung: python local_gateway.py FUNKTION [PORT]")
+        sys.exit(1)
+    serve(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 8080)
@@ -0,0 +1,169 @@
+# Kompaktes Dateiformat für Payload-Korpora, ein Request-Body pro Eintrag.
+#
+# Zwei Varianten, gewählt über die Dateiendung:
+#   .ndjson  eine kompakte JSON-Zeile pro Eintrag (lesbar, mit jq/grep nutzbar)
+#   .rec     Kopf (MAGIC, Länge + JSON-Metadaten) und dann Einträge als uint32-Länge
+#            (little endian) + Bytes; Bilder können roh statt Base64 gespeichert werden
+# Zu jeder Datei gehört ein Index <Datei>.idx mit den Byte-Offsets aller Einträge und dem
+# Dateiende (uint64, little endian). PayloadCorpus liest Datei und Index per mmap, ein
+# Eintrag kostet damit nur einen Slice, ohne das ganze Korpus zu parsen oder zu laden.
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b"PLDCORP1"
+_LENGTH = struct.Struct("<I")
+FORMATS = {".ndjson": "ndjson", ".rec": "binary"}
+
+
+def corpus_format(path):
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unbekanntes Korpus-Format '{path}' (erlaubt: {', '.join(FORMATS)})")
+    return fmt
+
+
+def _write_index(path, offsets):
+    """Schreibt die Offsets als uint64 little endian (Plattformen mit anderer Byte-Reihenfolge tauschen vorher)."""
+    if sys.byteorder != "little":
+        offsets = array("Q", offsets)
+        offsets.byteswap()
+    with open(path, "wb") as f:
+        offsets.tofile(f)
+
+
+class CorpusWriter:
+    """Schreibt Einträge fortlaufend in eine .ndjson- oder .rec-Datei, der Index entsteht beim Schließen.
+
+    Datei und Index werden unter temporären Namen geschrieben und erst am Ende
+    umbenannt, ein abgebrochener Lauf hinterlässt also kein halbes Korpus.
+    """
+
+    def __init__(self, path, content_type="application/json", metadata=None):
+        self.path = path
+        self.format = corpus_format(path)
+        if self.format == "ndjson" and content_type != "application/json":
+            raise ValueError("NDJSON-Korpora enthalten nur JSON; rohe Binärdaten nur als .rec")
+        self.content_type = content_type
+        self._file = open(path + ".tmp", "wb")
+        self._offsets = array("Q")
+        self.count = 0
+        if self.format == "binary":
+            meta = json.dumps({"content_type": content_type, **(metadata or {})}).encode("utf-8")
+            self._file.write(MAGIC + _LENGTH.pack(len(meta)) + meta)
+
+    def __len__(self):
+        return self.count
+
+    def append(self, record):
+        """Hängt einen Eintrag an (bytes; bei NDJSON eine JSON-Zeile ohne Zeilenumbruch)."""
+        self._offsets.append(self._file.tell())
+        if self.format == "binary":
+            self._file.write(_LENGTH.pack(len(record)))
+            self._file.write(record)
+        else:
+            if b"\n" in record:
+                raise ValueError("NDJSON-Einträge dürfen keinen Zeilenumbruch enthalten")
+            self._file.write(record + b"\n")
+        self.count += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._offsets.append(self._file.tell())
+        self._file.close()
+        _write_index(self.path + ".idx.tmp", self._offsets)
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(self.path + ".idx.tmp", self.path + ".idx")
+
+    def abort(self):
+        self._file.close()
+        os.remove(self.path + ".tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class PayloadCorpus:
+    """Wahlfreier Lesezugriff auf ein Korpus per mmap: len(corpus), corpus[i] (bytes), Iteration.
+
+    Fehlt der Index, wird er einmal durch Überspringen der Einträge aufgebaut
+    (ohne JSON zu parsen) und neben der Datei abgelegt, wenn das möglich ist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = corpus_format(path)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                raise ValueError(f"Korpus '{path}' ist leer (keine Einträge)")
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.content_type = "application/json"
+        self.metadata = {}
+        data_start = 0
+        if self.format == "binary":
+            if self._data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"'{path}' ist keine Korpus-Datei (MAGIC fehlt)")
+            meta_length, = _LENGTH.unpack_from(self._data, len(MAGIC))
+            data_start = len(MAGIC) + _LENGTH.size + meta_length
+            self.metadata = json.loads(self._data[data_start - meta_length:data_start])
+            self.content_type = self.metadata.get("content_type", self.content_type)
+        self._offsets = self._load_index(data_start)
+        if not len(self):
+            raise ValueError(f"Korpus '{path}' enthält keine Einträge")
+
+    def _load_index(self, data_start):
+        index_path = self.path + ".idx"
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(self.path):
+            with open(index_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                    if sys.byteorder == "little":
+                        return view.cast("Q")
+        offsets = array("Q", self._scan(data_start))
+        try:
+            _write_index(index_path, offsets)
+        except OSError:
+            pass # nur lesbares Verzeichnis: Index bleibt im Speicher
+        return offsets
+
+    def _scan(self, position):
+        data, end = self._data, len(self._data)
+        while position < end:
+            yield position
+            if self.format == "binary":
+                position += _LENGTH.size + _LENGTH.unpack_from(data, position)[0]
+            else:
+                newline = data.find(b"\n", position)
+                position = end if newline < 0 else newline + 1
+        yield end
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        if self.format == "binary":
+            return self._data[start + _LENGTH.size:end]
+        return self._data[start:end].rstrip(b"\n")
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def json(self, index):
+        """Eintrag `index` als geparstes JSON (nur für JSON-Korpora)."""
+        return json.loads(self[index])
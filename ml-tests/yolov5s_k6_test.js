@@ -6,8 +6,23 @@ import { SharedArray } from "k6/data";
 const FUNCTION_NAME = "yolov5s-inference";
 const BASE_URL = "http://127.0.0.1:8080"; // OpenFaaS Gateway Endpoint
 const PAYLOAD_FILE = "payloads/base64_payload.json"; // Pfad zum Test-Dataset
+const IMAGE_FILE = "payloads/test.jpg"; // Rohbild für die binären Varianten
+
+// Upload-Variante: "json" (Base64 in JSON, Standard), "binary" (image/jpeg als
+// Request Body) oder "multipart" (multipart/form-data mit Feld "image").
+// Aufruf z.B.: k6 run -e UPLOAD_MODE=binary yolov5s_k6_test.js
+const UPLOAD_MODE = __ENV.UPLOAD_MODE || "json";
+// Optionale Eingabegröße (320/416/512/640), sonst entscheidet die Funktion
+// (Standard 640, unter Last ggf. kleiner; die tatsächliche Größe steht in "imgsz")
+const IMGSZ = __ENV.IMGSZ || "";
+
+// open(..., "b") ist nur im Init-Kontext erlaubt; ArrayBuffer passen nicht in ein SharedArray
+const imageBinary = UPLOAD_MODE === "json" ? null : open(`./${IMAGE_FILE}`, "b");
 
 const payloads = new SharedArray("yolo-data", function () {
+  if (UPLOAD_MODE !== "json") {
+    return []; // Base64-Payloads werden nur im JSON-Modus gebraucht
+  }
   try {
     return JSON.parse(open(`./${PAYLOAD_FILE}`));
   } catch (e) {
@@ -91,25 +106,38 @@ export let options = {
 };
 
 // Test-Implementierung
+function buildRequest() {
+  if (UPLOAD_MODE === "binary") {
+    return { body: imageBinary, headers: { "Content-Type": "image/jpeg" } };
+  }
+  if (UPLOAD_MODE === "multipart") {
+    // k6 setzt Content-Type inkl. boundary selbst
+    return { body: { image: http.file(imageBinary, "test.jpg", "image/jpeg") }, headers: {} };
+  }
+  const randomPayload = payloads[Math.floor(Math.random() * payloads.length)];
+  return {
+    body: JSON.stringify(randomPayload),
+    headers: { "Content-Type": "application/json" },
+  };
+}
+
 export default function () {
-  if (payloads.length === 0) {
+  if (UPLOAD_MODE === "json" && payloads.length === 0) {
     console.error("Keine Payloads geladen, überspringe Iteration.");
     return;
   }
 
-  const randomPayload = payloads[Math.floor(Math.random() * payloads.length)];
-  const payloadString = JSON.stringify(randomPayload);
+  const request = buildRequest();
 
-  const url = `${BASE_URL}/function/${FUNCTION_NAME}`;
+  const url = `${BASE_URL}/function/${FUNCTION_NAME}` + (IMGSZ ? `?imgsz=${IMGSZ}` : "");
   const params = {
-    headers: {
-      "Content-Type": "application/json",
-    },
+    headers: request.headers,
+    tags: { upload_mode: UPLOAD_MODE, imgsz: IMGSZ || "auto" },
     // Timeout für YOLO-Inferenz anpassen
     // timeout: '290s', // Sollte unter exec_timeout der Funktion liegen
   };
 
-  const res = http.post(url, payloadString, params);
+  const res = http.post(url, request.body, params);
 
   check(res, {
     "status is 200": (r) => r.status === 200,
@@ -0,0 +1,93 @@
+# export_distilbert_onnx.py
+# Exportiert das feinjustierte DistilBERT-Modell nach ONNX und erzeugt zusätzlich
+# eine dynamisch int8-quantisierte Variante. Beide Dateien landen im Modellverzeichnis
+# und werden vom Handler über INFERENCE_BACKEND=onnx bzw. onnx-int8 geladen.
+#
+# Verwendung: python export_distilbert_onnx.py [MODELLVERZEICHNIS] [PAYLOAD_DATEI]
+import json
+import os
+import sys
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+MODEL_DIR = sys.argv[1] if len(sys.argv) > 1 else "./models/distilbert_sst2"
+PAYLOAD_FILE = sys.argv[2] if len(sys.argv) > 2 else os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "ml-tests", "payloads", "distilbert_payloads.json")
+
+ONNX_PATH = os.path.join(MODEL_DIR, "model.onnx")
+ONNX_INT8_PATH = os.path.join(MODEL_DIR, "model-int8.onnx")
+
+MAX_LENGTH = 512
+PARITY_BATCH_SIZE = 32
+# Das quantisierte Modell wird nur behalten, wenn es auf den SST-2-Payloads
+# mindestens so oft dasselbe Label wie das PyTorch-Modell vorhersagt
+MIN_LABEL_AGREEMENT = float(os.environ.get("MIN_LABEL_AGREEMENT", "0.99"))
+
+print(f"Lade Modell und Tokenizer aus '{MODEL_DIR}'...")
+tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR)
+# Eager-Attention lässt sich mit variabler Sequenzlänge sauber tracen
+model = AutoModelForSequenceClassification.from_pretrained(MODEL_DIR, attn_implementation="eager").eval()
+
+# 1. ONNX-Export mit dynamischer Batch- und Sequenzlänge
+dummy = tokenizer(["Ein kurzer Satz.", "Ein etwas längerer Satz für die Beispiel-Eingabe."],
+                  padding=True, return_tensors="pt")
+with torch.inference_mode():
+    torch.onnx.export(
+        model,
+        (dummy["input_ids"], dummy["attention_mask"]),
+        ONNX_PATH,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+print(f"ONNX-Modell gespeichert: '{ONNX_PATH}' ({os.path.getsize(ONNX_PATH) / 1e6:.1f} MB)")
+
+# 2. Dynamische int8-Quantisierung der Gewichte (Aktivierungen werden zur Laufzeit quantisiert)
+quantize_dynamic(ONNX_PATH, ONNX_INT8_PATH, weight_type=QuantType.QInt8)
+print(f"Quantisiertes Modell gespeichert: '{ONNX_INT8_PATH}' ({os.path.getsize(ONNX_INT8_PATH) / 1e6:.1f} MB)")
+
+# 3. Paritätsprüfung auf den SST-2-Payloads
+with open(PAYLOAD_FILE, encoding="utf-8") as f:
+    texts = [payload["text"] for payload in json.load(f)]
+
+
+def torch_labels(batch):
+    enc = tokenizer(batch, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="pt")
+    with torch.inference_mode():
+        return model(input_ids=enc["input_ids"], attention_mask=enc["attention_mask"]).logits.argmax(-1).numpy()
+
+
+def onnx_labels(session, batch):
+    enc = tokenizer(batch, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="np")
+    feeds = {"input_ids": enc["input_ids"].astype(np.int64), "attention_mask": enc["attention_mask"].astype(np.int64)}
+    return session.run(["logits"], feeds)[0].argmax(-1)
+
+
+sessions = {name: ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+            for name, path in (("onnx", ONNX_PATH), ("onnx-int8", ONNX_INT8_PATH))}
+agreement = {name: 0 for name in sessions}
+for start in range(0, len(texts), PARITY_BATCH_SIZE):
+    batch = texts[start:start + PARITY_BATCH_SIZE]
+    reference = torch_labels(batch)
+    for name, session in sessions.items():
+        agreement[name] += int((onnx_labels(session, batch) == reference).sum())
+
+for name, matches in agreement.items():
+    print(f"Label-Übereinstimmung {name} vs. torch: {matches}/{len(texts)} ({matches / len(texts):.4f})")
+
+if agreement["onnx-int8"] / len(texts) < MIN_LABEL_AGREEMENT:
+    os.remove(ONNX_INT8_PATH)
+    print(f"FEHLER: Quantisiertes Modell unter der Schwelle {MIN_LABEL_AGREEMENT}, '{ONNX_INT8_PATH}' wurde entfernt.")
+    sys.exit(1)
+
+print("Paritätsprüfung bestanden.")
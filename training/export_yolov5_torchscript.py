@@ -0,0 +1,106 @@
+# export_yolov5_torchscript.py
+# Friert das YOLOv5-Modell offline ein: eager laden (torch.hub aus dem lokalen Repo),
+# Conv+BN fusionieren, tracen und als TorchScript-Graph (mit Klassennamen/Stride als
+# Metadaten) plus Gewichte als safetensors daneben speichern. Der Handler lädt im
+# Backend "torchscript" nur noch diese beiden Dateien (Gewichte per mmap) und die NMS
+# aus nms.py.
+#
+# Anschließend Paritätsprüfung: eager Modell + utils.general.non_max_suppression
+# gegen TorchScript + eigenständige NMS auf den Payload-Bildern, in mehreren Größen.
+#
+# Verwendung: python export_yolov5_torchscript.py [YOLOV5_REPO] [GEWICHTE] [AUSGABE] [BILD ...]
+import os
+import sys
+import time
+
+import torch
+import torchvision
+
+FUNCTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "functions", "yolov5s-inference")
+REPO_DIR = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else os.path.join(FUNCTION_DIR, "yolov5_local_repo"))
+WEIGHTS_PATH = sys.argv[2] if len(sys.argv) > 2 else os.path.join(REPO_DIR, "yolov5s.pt")
+OUTPUT_PATH = sys.argv[3] if len(sys.argv) > 3 else os.path.join(FUNCTION_DIR, "yolov5s.torchscript")
+IMAGES = sys.argv[4:] or [os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ml-tests", "payloads", "test.jpg")]
+
+IMG_SIZE = 640
+PARITY_SIZES = (640, 320)
+CONF_THRES, IOU_THRES, MAX_DET = 0.25, 0.45, 1000
+# Anteil der eager Detektionen, die das TorchScript-Modell mit gleicher Klasse
+# und IoU >= MIN_IOU wiederfinden muss; sonst wird das Artefakt verworfen
+MIN_DETECTION_AGREEMENT = float(os.environ.get("MIN_DETECTION_AGREEMENT", "0.99"))
+MIN_IOU = 0.95
+
+# Export-Helfer und Laufzeit-NMS liegen bei der Funktion, damit Export und Handler dasselbe Format teilen
+sys.path.insert(0, FUNCTION_DIR)
+from frozen_model import freeze_detection_model, load_frozen_model, save_frozen_model, weights_path
+from nms import non_max_suppression as standalone_nms
+from preprocessing import preprocess_image
+
+sys.path.insert(0, REPO_DIR)
+from utils.general import non_max_suppression as repo_nms
+
+
+def load_eager():
+    model = torch.hub.load(REPO_DIR, "custom", path=WEIGHTS_PATH, source="local", autoshape=False, trust_repo=True)
+    # hubconf.custom(autoshape=False) liefert ein DetectMultiBackend, das DetectionModel steckt in .model
+    if type(model).__name__ == "DetectMultiBackend":
+        model = model.model
+    return model.float().eval()
+
+
+print(f"Lade eager Modell aus '{REPO_DIR}' mit Gewichten '{WEIGHTS_PATH}'...")
+start = time.perf_counter()
+eager = load_eager()
+eager_load_s = time.perf_counter() - start
+
+# 1. Einfrieren (fuse() verändert das Modell in place, die Referenz ist eine frisch geladene Kopie)
+reference = load_eager()
+frozen = freeze_detection_model(eager, IMG_SIZE)
+save_frozen_model(frozen, OUTPUT_PATH, eager.names, eager.stride.max(), IMG_SIZE)
+print(f"TorchScript-Graph gespeichert: '{OUTPUT_PATH}' ({os.path.getsize(OUTPUT_PATH) / 1e6:.1f} MB), "
+      f"Gewichte: '{weights_path(OUTPUT_PATH)}' ({os.path.getsize(weights_path(OUTPUT_PATH)) / 1e6:.1f} MB)")
+
+start = time.perf_counter()
+frozen, meta = load_frozen_model(OUTPUT_PATH)
+frozen_load_s = time.perf_counter() - start
+print(f"Ladezeit: eager (torch.hub) {eager_load_s:.2f} s, TorchScript {frozen_load_s:.2f} s")
+
+
+# 2. Paritätsprüfung
+def detections(model, nms, tensor):
+    with torch.no_grad():
+        return nms(model(tensor)[0], CONF_THRES, IOU_THRES, None, False, max_det=MAX_DET)[0]
+
+
+def timed(model, tensor, repeats=10):
+    with torch.no_grad():
+        model(tensor)  # Aufwärmen
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(tensor)
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+total = matched = 0
+for path in IMAGES:
+    for size in PARITY_SIZES:
+        tensor = preprocess_image(path, size)[0].clone()
+        expected = detections(reference, repo_nms, tensor)
+        actual = detections(frozen, standalone_nms, tensor)
+        if len(expected) and len(actual):
+            iou = torchvision.ops.box_iou(expected[:, :4], actual[:, :4])
+            iou[expected[:, 5:6] != actual[:, 5][None]] = 0
+            matched += int((iou.max(1).values >= MIN_IOU).sum())
+        total += len(expected)
+        print(f"{os.path.basename(path)} @ {size}: eager {len(expected)} Detektionen, TorchScript {len(actual)}, "
+              f"Latenz eager {timed(reference, tensor):.1f} ms, TorchScript {timed(frozen, tensor):.1f} ms")
+
+agreement = matched / total if total else 1.0
+print(f"Übereinstimmung TorchScript vs. eager: {matched}/{total} ({agreement:.4f})")
+if agreement < MIN_DETECTION_AGREEMENT:
+    os.remove(OUTPUT_PATH)
+    os.remove(weights_path(OUTPUT_PATH))
+    print(f"FEHLER: Unter der Schwelle {MIN_DETECTION_AGREEMENT}, '{OUTPUT_PATH}' und die Gewichte wurden entfernt.")
+    sys.exit(1)
+
+print("Paritätsprüfung bestanden.")
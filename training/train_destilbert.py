@@ -16,7 +16,8 @@ os.makedirs(SAVE_DIRECTORY, exist_ok=True)
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
 model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
 
-# Speichere Tokenizer und Modell lokal im angegebenen Verzeichnis
+# Speichere Tokenizer und Modell lokal im angegebenen Verzeichnis. Die Gewichte landen
+# als model.safetensors, die der Handler per mmap einblendet (MMAP_WEIGHTS).
 tokenizer.save_pretrained(SAVE_DIRECTORY)
 model.save_pretrained(SAVE_DIRECTORY)
 
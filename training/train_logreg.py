@@ -1,4 +1,6 @@
 # train_diabetes.py
+import os
+import sys
 import joblib
 import numpy as np
 import pandas as pd
@@ -7,6 +9,10 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 
+# Export-Helfer liegen bei der Funktion, damit Export und Laufzeit dasselbe Format teilen
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "functions", "logreg-inference"))
+from fused_model import FusedLogisticModel, save_fused_model
+
 # 1. Daten laden und binär vorbereiten
 X, y_cont = load_diabetes(return_X_y=True)
 # Binarisierung: hoher vs. niedriger Wert (Median)
@@ -23,3 +29,13 @@ clf = LogisticRegression(max_iter=1000).fit(X_train_scaled, y_train)
 # 4. Speichern
 joblib.dump(clf, "logistic_diabetes_model.joblib")
 joblib.dump(scaler, "scaler.joblib")
+
+# 5. Gefaltetes NumPy-Artefakt für die Funktion (kein scikit-learn zur Laufzeit nötig)
+save_fused_model("logistic_diabetes_model.npz", scaler, clf)
+
+# Paritätsprüfung gegen die scikit-learn-Pipeline
+fused = FusedLogisticModel.load("logistic_diabetes_model.npz")
+X_test_scaled = scaler.transform(X_test)
+assert np.array_equal(fused.predict(X_test), clf.predict(X_test_scaled))
+assert np.allclose(fused.predict_proba(X_test), clf.predict_proba(X_test_scaled), rtol=0, atol=1e-12)
+print("Gefaltetes Modell nach 'logistic_diabetes_model.npz' exportiert, Parität geprüft.")